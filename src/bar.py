@@ -87,6 +87,12 @@ class BarGenerator(object):
         minutes = (int_time % 10000000) // 100000
         return hour2min + minutes
 
+    @staticmethod
+    def int_time_to_ms(int_time):
+        hour2min = (int_time // 10000000) * 60
+        minutes = (int_time % 10000000) // 100000
+        return (hour2min + minutes) * 60000 + int_time % 100000
+
     def process_bar_data(self, context, quote_type, quote, on_book):
         """generate bar from tick data, should be called at on_book interface
 
@@ -112,7 +118,25 @@ class BarGenerator(object):
 
         symbol = quote.symbol if quote_type == 0 else quote.ticker
         int_time = quote.int_time if quote_type == 0 else quote.exch_time
+        self.update_bar(context, symbol, int_time, quote, on_book)
+
+    def update_bar(self, context, symbol, int_time, quote, on_book):
+        """update bar of symbol with a tick whose symbol and time are already resolved, i.e. by `QuoteDispatcher`
+
+        Parameters
+        ----------
+        context : object
+        symbol : str
+        int_time : int
+        quote : object
+            tick quote, futures order statistic quotes should be filtered out by caller
+        on_book : object
+            call back function, should be on book
 
+        Returns
+        -------
+
+        """
         # first tick new bar
         if symbol not in self.bar_struct_map:
             bar_item = BarStruct()
@@ -0,0 +1,315 @@
+"""Throughput benchmark of bar, order, sync_order and position on replayed synthetic ticks
+
+Each scenario replays ticks through a strategy with `replay.Replayer` and reports ticks/sec,
+average nanoseconds of each callback and peak memory. Results can be saved as a baseline and
+later runs compared against it, a run slower or larger than the baseline beyond tolerance
+exits with 1.
+
+    python bench.py
+    python bench.py --save baseline.json
+    python bench.py --baseline baseline.json --tolerance 0.2
+    python bench.py futures_50 --profile
+    python bench.py --cold-start
+"""
+import argparse
+import json
+import platform
+import sys
+
+import numpy as np
+
+import replay  # installs stand-ins of my.sdp.api if missing
+from replay import Replayer, make_config, synthetic_ticks
+from perf import Profiler
+import coldstart
+
+from consts import BUY, SELL, OPEN, CLOSE
+from bar import BarGenerator
+from order import OrdMgr
+from position import PosMgrBase
+from sync_order import SyncOrder
+
+
+class BarFollower(object):
+    """futures strategy: bars from ticks, go long 1 lot when a bar rises by more than `threshold`, short 1
+    lot when it falls by more than `threshold`, flat bars do not trade"""
+
+    def __init__(self, bar_interval=1, threshold=0.0):
+        self.bar_interval = bar_interval
+        self.threshold = threshold
+
+    def on_init(self, context, config_type, config):
+        context.posmgr = PosMgrBase()
+        context.posmgr.init_position(config_type, config)
+        context.ordmgr = OrdMgr()
+        context.order = SyncOrder(context, config)
+        context.order.info = context.order.nil
+        context.bar_generator = BarGenerator(self.bar_interval)
+        context.pnl = 0.0
+
+    def on_book(self, context, quote_type, quote):
+        if quote_type == 3:
+            if quote.close - quote.open > self.threshold:
+                self.trade(context, quote.symbol, 1, quote.close)
+            elif quote.open - quote.close > self.threshold:
+                self.trade(context, quote.symbol, -1, quote.close)
+            return
+        context.posmgr.update_last_px(quote_type, quote)
+        context.bar_generator.process_bar_data(context, quote_type, quote, self.on_book)
+        context.pnl = context.posmgr.get_strategy_pnl_cash()
+
+    @staticmethod
+    def trade(context, symbol, target, price):
+        if context.order.active_orders:
+            for order in context.order.active_orders.values():
+                if order['symbol'] == symbol:
+                    return
+        posmgr = context.posmgr
+        long_pos = posmgr.get_long_position(symbol)
+        short_pos = posmgr.get_short_position(symbol)
+        net = long_pos - short_pos
+        if target > net:
+            direction, price = BUY, price * 1.01
+            open_close, size = (CLOSE, short_pos) if short_pos > 0 else \
+                (OPEN, target - net)
+        elif target < net:
+            direction, price = SELL, price * 0.99
+            open_close, size = (CLOSE, long_pos) if long_pos > 0 else \
+                (OPEN, net - target)
+        else:
+            return
+        order_id = context.order.send_single_order(symbol, price, size, direction, open_close)
+        if order_id > 0:
+            context.ordmgr.send_order(order_id, symbol, price, size, direction, open_close)
+
+    def on_response(self, context, response_type, response):
+        if response.order_id in context.ordmgr.orders:
+            context.ordmgr.on_response(response_type, response)
+        context.posmgr.update_position(response_type, response)
+        context.order.on_response(response_type, response)
+
+
+class StockRebalancer(object):
+    """stock strategy: every 10th tick of a stock, buy 100 below its first price, sell 100 above, at the
+    deepest level of book"""
+
+    def on_init(self, context, config_type, config):
+        context.posmgr = PosMgrBase()
+        context.posmgr.init_position(config_type, config)
+        context.order = SyncOrder(context, config)
+        context.order.info = context.order.nil
+        context.reference = {}
+        context.count = {}
+
+    def on_book(self, context, quote_type, quote):
+        posmgr = context.posmgr
+        posmgr.update_last_px(quote_type, quote)
+        symbol = quote.ticker
+        count = context.count.get(symbol, 0) + 1
+        context.count[symbol] = count
+        reference = context.reference.setdefault(symbol, quote.last_px)
+        if count % 10:
+            return
+        if quote.last_px < reference:
+            context.order.send_single_order(symbol, quote.ap_array[-1], 100, BUY,
+                                            OPEN)
+        elif quote.last_px > reference and posmgr.get_long_position(symbol) >= 100:
+            context.order.send_single_order(symbol, quote.bp_array[-1], 100, SELL,
+                                            CLOSE)
+
+    def on_response(self, context, response_type, response):
+        context.posmgr.update_position(response_type, response)
+        context.posmgr.update_cash_on_response(response_type, response)
+        context.order.on_response(response_type, response)
+
+
+class Quoter(object):
+    """market making: cancel and requote bid1/ask1 on every tick, skip the side beyond 5 lots"""
+
+    def on_init(self, context, config_type, config):
+        context.posmgr = PosMgrBase()
+        context.posmgr.init_position(config_type, config)
+        context.order = SyncOrder(context, config)
+        context.order.info = context.order.nil
+
+    def on_book(self, context, quote_type, quote):
+        posmgr = context.posmgr
+        order = context.order
+        symbol = quote.symbol
+        posmgr.update_last_px(quote_type, quote)
+        for order_id, active in list(order.active_orders.items()):
+            if active['symbol'] == symbol and not active['pending_cancel']:
+                order.cancel_single_order(order_id)
+        order.clear_delayed_orders(symbol)
+        long_pos = posmgr.get_long_position(symbol)
+        short_pos = posmgr.get_short_position(symbol)
+        net = long_pos - short_pos
+        if net < 5:
+            if short_pos > 0:
+                order.send_single_order(symbol, quote.bp_array[0], 1, BUY, CLOSE)
+            else:
+                order.send_single_order(symbol, quote.bp_array[0], 1, BUY, OPEN)
+        if net > -5:
+            if long_pos > 0:
+                order.send_single_order(symbol, quote.ap_array[0], 1, SELL, CLOSE)
+            else:
+                order.send_single_order(symbol, quote.ap_array[0], 1, SELL, OPEN)
+
+    def on_response(self, context, response_type, response):
+        context.posmgr.update_position(response_type, response)
+        context.order.on_response(response_type, response)
+
+
+"""Scenarios
+name: (strategy, n_symbols, n_ticks of each symbol, interval ms, quote_type, exch, multiple, yes_pos)
+"""
+SCENARIOS = {
+    'futures_1': (BarFollower, 1, 100000, 250, 0, 'SHFE', 10, 0),
+    'futures_50': (BarFollower, 50, 2000, 500, 0, 'SHFE', 10, 0),
+    'stocks_3000': (StockRebalancer, 3000, 40, 3000, 1, ('SSE', 'SZSE'), 1, 1000),
+    'quoting_cancels': (Quoter, 5, 10000, 500, 0, 'SHFE', 10, 0),
+}
+
+
+def profile_strategy(strategy, profiler):
+    """probe callbacks of strategy and entry points of modules it keeps in context"""
+    on_init = strategy.on_init
+
+    def instrumented_init(context, config_type, config):
+        on_init(context, config_type, config)
+        for value in list(vars(context).values()):
+            profiler.instrument(value)
+    strategy.on_init = instrumented_init
+    strategy.on_book = profiler.wrap_function(strategy.on_book, 'strategy.on_book')
+    strategy.on_response = profiler.wrap_function(strategy.on_response, 'strategy.on_response')
+    return strategy
+
+
+def run_scenario(name, scale=1.0, trace_memory=True, seed=0, profiler=None):
+    """run one scenario
+
+    Parameters
+    ----------
+    name : str
+        key of SCENARIOS
+    scale : float
+        multiplier of ticks of each symbol
+    trace_memory : bool
+        replay once more with tracemalloc for peak memory
+    seed : int
+    profiler : perf.Profiler or None
+        probe callbacks of the timed replay
+
+    Returns
+    -------
+    stats : dict
+        see `Replayer.run`, peak_memory_mb if traced
+
+    """
+    strategy, n_symbols, n_ticks, interval, quote_type, exch, multiple, yes_pos = SCENARIOS[name]
+    n_ticks = max(int(n_ticks * scale), 1)
+    symbols = ['{}{:04d}'.format(name[0], i) for i in range(n_symbols)]
+    if not isinstance(exch, str):
+        exch = [exch[i % len(exch)] for i in range(n_symbols)]
+    ticks = synthetic_ticks(n_symbols, n_ticks, seed=seed, interval=interval)
+
+    def replay_once(trace, profiler=None):
+        config = make_config(symbols, exch=exch, multiple=multiple, yes_pos=yes_pos, price=100.0)
+        instance = strategy() if profiler is None else profile_strategy(strategy(), profiler)
+        return Replayer(instance, config, ticks, symbols, quote_type=quote_type).run(trace_memory=trace)
+
+    stats = replay_once(False, profiler)
+    if trace_memory:
+        peak = replay_once(True).get('peak_memory')
+        if peak is not None:
+            stats['peak_memory_mb'] = peak / 1048576.0
+    return stats
+
+
+def compare(results, baseline, tolerance, cold_start=None):
+    """compare results with baseline, and stats of `coldstart.run` if given
+
+    Returns
+    -------
+    regressions : list
+        description of each regression
+
+    """
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            continue
+        if stats['ticks_per_sec'] < base['ticks_per_sec'] * (1 - tolerance):
+            regressions.append('{}: ticks_per_sec {:.0f} < baseline {:.0f}'.format(
+                name, stats['ticks_per_sec'], base['ticks_per_sec']))
+        if 'peak_memory_mb' in stats and 'peak_memory_mb' in base and \
+                stats['peak_memory_mb'] > base['peak_memory_mb'] * (1 + tolerance):
+            regressions.append('{}: peak_memory_mb {:.1f} > baseline {:.1f}'.format(
+                name, stats['peak_memory_mb'], base['peak_memory_mb']))
+    base = baseline.get('cold_start')
+    if cold_start is not None and base is not None:
+        for key in ('import_ms', 'on_book_first_us'):
+            if cold_start[key] > base[key] * (1 + tolerance):
+                regressions.append('cold_start: {} {:.1f} > baseline {:.1f}'.format(key, cold_start[key], base[key]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='throughput benchmark on replayed ticks')
+    parser.add_argument('scenarios', nargs='*', help='scenarios to run, all by default: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplier of ticks')
+    parser.add_argument('--save', help='save results as baseline json')
+    parser.add_argument('--baseline', help='compare with baseline json')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc replay')
+    parser.add_argument('--profile', action='store_true', help='print probes of callbacks, slows down the replay')
+    parser.add_argument('--cold-start', action='store_true', help='also measure import time and first callbacks')
+    args = parser.parse_args(argv)
+
+    names = args.scenarios or sorted(SCENARIOS)
+    results = {}
+    profiles = {}
+    print ('{:<18}{:>10}{:>12}{:>12}{:>14}{:>10}{:>10}{:>10}'.format(
+        'scenario', 'ticks', 'ticks/s', 'on_book ns', 'on_resp ns', 'orders', 'cancels', 'peak MB'))
+    for name in names:
+        if name not in SCENARIOS:
+            print ('unknown scenario {}'.format(name))
+            return 2
+        profiler = Profiler() if args.profile else None
+        stats = run_scenario(name, args.scale, not args.no_memory, profiler=profiler)
+        results[name] = stats
+        if profiler is not None:
+            profiles[name] = profiler.snapshot()
+        print ('{:<18}{:>10}{:>12.0f}{:>12.0f}{:>14.0f}{:>10}{:>10}{:>10}'.format(
+            name, stats['ticks'], stats['ticks_per_sec'], stats['on_book_ns'], stats['on_response_ns'],
+            stats['orders'], stats['cancels'],
+            '{:.1f}'.format(stats['peak_memory_mb']) if 'peak_memory_mb' in stats else '-'))
+    for name in sorted(profiles):
+        print ('\n[{}]\n{}'.format(name, Profiler.format(profiles[name])))
+    cold_start = None
+    if args.cold_start:
+        cold_start = coldstart.run()
+        print ('\n[cold_start]\n{}'.format(coldstart.format_stats(cold_start)))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'python': platform.python_version(), 'numpy': np.__version__, 'scale': args.scale,
+                'scenarios': results, 'cold_start': cold_start
+            }, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('scale', 1.0) != args.scale:
+            print ('scale {} differs from baseline scale {}'.format(args.scale, baseline.get('scale', 1.0)))
+        regressions = compare(results, baseline, args.tolerance, cold_start)
+        for regression in regressions:
+            print ('REGRESSION {}'.format(regression))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
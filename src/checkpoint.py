@@ -0,0 +1,659 @@
+"""Binary checkpoint and restore of position, order and bar state
+
+State of `PosMgrBase` and its `LotLedger`, `OrdMgr`, `SyncOrder` and `BarGenerator` is flattened into fixed layout
+numpy arrays and written as one `.npz` snapshot. Every N events the state is copied into plain rows on the
+calling thread, the rows are flattened into arrays and written to disk by a background thread, so a restarted
+strategy can restore the session state instead of only the start position from config.
+"""
+import os
+import threading
+
+import numpy as np
+
+from bar import BarStruct, InternalBar
+from lots import QTY, PRICE, OPEN_TIME
+from order import OrdMgr
+from position import InflightOrder
+from position_array import PosMgrArray
+
+"""Constants
+"""
+SNAPSHOT_VERSION = 1
+SYMBOL_DTYPE = 'U32'
+NONE_VALUE = -1
+
+ORDER_DTYPE = np.dtype([
+    ('order_id', 'i8'), ('symbol', SYMBOL_DTYPE), ('volume', 'i8'), ('price', 'f8'),
+    ('direction', 'i4'), ('open_close', 'i4'), ('investor_type', 'i4'), ('order_type', 'i4'),
+    ('time_in_force', 'i4'), ('last_px', 'f8'), ('last_qty', 'i8'), ('cum_qty', 'i8'),
+    ('cum_amount', 'f8'), ('pending_cancel', '?'), ('status', 'i4')
+])
+
+# orders in flight of cash tracking of position manager
+INFLIGHT_ORDER_DTYPE = np.dtype([
+    ('order_id', 'i8'), ('symbol', SYMBOL_DTYPE), ('price', 'f8'), ('size', 'i8'), ('direction', 'i4'),
+    ('open_close', 'i4'), ('cum_qty', 'i8')
+])
+
+DELAYED_ORDER_DTYPE = np.dtype([
+    ('symbol', SYMBOL_DTYPE), ('price', 'f8'), ('size', 'i8'), ('direction', 'i4'), ('open_close', 'i4'),
+    ('investor_type', 'i4'), ('order_type', 'i4'), ('time_in_force', 'i4')
+])
+
+# lots of LotLedger, side is LONG or SHORT
+LOT_DTYPE = np.dtype([
+    ('symbol', SYMBOL_DTYPE), ('side', 'i4'), ('yesterday', '?'), ('qty', 'i8'), ('price', 'f8'), ('open_time', 'i8')
+])
+
+LEDGER_DTYPE = np.dtype([
+    ('symbol', SYMBOL_DTYPE), ('realized', 'f8'), ('closed_qty', 'i8'), ('held_qty', 'i8'), ('holding_ms', 'i8')
+])
+
+BAR_DTYPE = np.dtype([
+    ('symbol', SYMBOL_DTYPE), ('bar_index', 'i8'), ('last_bar_time', 'i8'), ('open_vol', 'i8'),
+    ('open_notional', 'f8'), ('int_time', 'i8'), ('open', 'f8'), ('close', 'f8'), ('high', 'f8'),
+    ('low', 'f8'), ('volume', 'i8'), ('turnover', 'f8'), ('upper_limit', 'f8'), ('lower_limit', 'f8'),
+    ('open_interest', 'f8'), ('cur_bar_index', 'i8')
+])
+
+ORDER_KWARGS = ('investor_type', 'order_type', 'time_in_force')
+
+
+def _to_int(value):
+    return NONE_VALUE if value is None else int(value)
+
+
+def _from_int(value):
+    return None if value == NONE_VALUE else int(value)
+
+
+def flatten(rows):
+    """build arrays from rows copied by `capture_*`, done by the writer thread of `Checkpointer`
+
+    Parameters
+    ----------
+    rows : dict
+        name: (rows, dtype, shape), shape is None to keep the shape of rows
+
+    Returns
+    -------
+    arrays : dict
+        name: numpy.ndarray
+
+    """
+    arrays = {}
+    for name, (data, dtype, shape) in rows.items():
+        array = np.array(data, dtype=dtype)
+        arrays[name] = array if shape is None else array.reshape(shape)
+    return arrays
+
+
+def capture_position(posmgr):
+    """copy state of position manager into rows. `PosMgrArray` copies its matrices, `PosMgrBase` builds one row per
+    symbol
+
+    Parameters
+    ----------
+    posmgr : PosMgrBase
+
+    Returns
+    -------
+    rows : dict
+        name: (rows, dtype, shape)
+
+    """
+    if isinstance(posmgr, PosMgrArray):
+        symbols = list(posmgr.symbols)
+        matrix = posmgr.matrix.copy()
+        last_px = posmgr.last_px.copy()
+    else:
+        symbols = list(posmgr.position)
+        matrix = [[(p['pos'], p['notional'], p['yes_pos'], p['yes_notional']) for p in posmgr.position[symbol]]
+                  for symbol in symbols]
+        last_px = [posmgr.prices[symbol]['last_px'] for symbol in symbols]
+    accounts = list(posmgr.account)
+    return {
+        'position_symbols': (symbols, SYMBOL_DTYPE, None),
+        'position_matrix': (matrix, np.float64, (-1, 4, 4)),
+        'last_px': (last_px, np.float64, None),
+        'account_names': (accounts, SYMBOL_DTYPE, None),
+        'account_cash': ([(posmgr.account[account]['cash_available'], posmgr.account[account]['cash_asset'])
+                          for account in accounts], np.float64, (-1, 2)),
+        'posmgr_orders': ([(o.order_id, o.symbol, o.price, o.size, o.direction, o.open_close, o.cum_qty)
+                           for o in posmgr.orders.values()], INFLIGHT_ORDER_DTYPE, None),
+        'settled_pnl': (posmgr.settled_pnl, np.float64, None)
+    }
+
+
+def dump_position(posmgr):
+    """flatten position manager into arrays
+
+    Parameters
+    ----------
+    posmgr : PosMgrBase
+
+    Returns
+    -------
+    arrays : dict
+        name: numpy.ndarray
+
+    """
+    return flatten(capture_position(posmgr))
+
+
+def load_position(posmgr, arrays):
+    """restore position manager from arrays, `init_position` should be called before
+
+    Parameters
+    ----------
+    posmgr : PosMgrBase
+    arrays : dict
+        name: numpy.ndarray
+
+    Returns
+    -------
+    None
+
+    """
+    symbols = arrays['position_symbols'].tolist()
+    if isinstance(posmgr, PosMgrArray):
+        rows = np.array([posmgr.symbol_index[symbol] for symbol in symbols], dtype=np.intp)
+        posmgr.matrix[rows] = arrays['position_matrix']
+        posmgr.last_px[rows] = arrays['last_px']
+    else:
+        for symbol, matrix, last_px in zip(symbols, arrays['position_matrix'].tolist(), arrays['last_px'].tolist()):
+            posmgr.position[symbol] = [{
+                'pos': int(p[0]),
+                'notional': p[1],
+                'yes_pos': int(p[2]),
+                'yes_notional': p[3]
+            } for p in matrix]
+            posmgr.prices[symbol] = {"last_px": last_px}
+    # cash available has cash reserved for orders in flight, it is only restored along with these orders
+    has_orders = 'posmgr_orders' in arrays
+    for account, cash in zip(arrays['account_names'].tolist(), arrays['account_cash'].tolist()):
+        posmgr.account[account] = {
+            "cash_available": cash[0] if has_orders else posmgr.account[account]['cash_available'],
+            "cash_asset": cash[1]
+        }
+    if has_orders:
+        posmgr.orders = {}
+        for o in arrays['posmgr_orders'].tolist():
+            order = InflightOrder.__new__(InflightOrder)
+            order.order_id, order.symbol, order.price, order.size, order.direction, order.open_close, order.cum_qty = o
+            posmgr.orders[order.order_id] = order
+    posmgr.init_pnl()
+    # snapshots before settled pnl was saved have none
+    if 'settled_pnl' in arrays:
+        posmgr.settled_pnl = float(arrays['settled_pnl'])
+
+
+def capture_lot_ledger(ledger):
+    """copy lots and closed lot stats of `LotLedger` into rows
+
+    Parameters
+    ----------
+    ledger : LotLedger
+
+    Returns
+    -------
+    rows : dict
+        name: (rows, dtype, shape)
+
+    """
+    lots = []
+    for symbol, sides in ledger.lots.items():
+        for side, (yes_lots, today_lots) in enumerate(sides):
+            lots.extend((symbol, side, True, lot[QTY], lot[PRICE], lot[OPEN_TIME]) for lot in yes_lots)
+            lots.extend((symbol, side, False, lot[QTY], lot[PRICE], lot[OPEN_TIME]) for lot in today_lots)
+    return {
+        'lots': (lots, LOT_DTYPE, None),
+        'lot_stats': ([(symbol, ledger.realized[symbol], ledger.closed_qty[symbol], ledger.held_qty[symbol],
+                        ledger.holding_ms[symbol]) for symbol in ledger.lots], LEDGER_DTYPE, None),
+        'lot_now': (ledger.now, np.int64, None)
+    }
+
+
+def dump_lot_ledger(ledger):
+    """flatten lots and closed lot stats of `LotLedger` into arrays
+
+    Parameters
+    ----------
+    ledger : LotLedger
+
+    Returns
+    -------
+    arrays : dict
+        name: numpy.ndarray
+
+    """
+    return flatten(capture_lot_ledger(ledger))
+
+
+def load_lot_ledger(ledger, arrays):
+    """restore lots and closed lot stats of `LotLedger` from arrays
+
+    Parameters
+    ----------
+    ledger : LotLedger
+    arrays : dict
+        name: numpy.ndarray
+
+    Returns
+    -------
+    None
+
+    """
+    ledger.lots, ledger.realized, ledger.closed_qty, ledger.held_qty, ledger.holding_ms = {}, {}, {}, {}, {}
+    for symbol, realized, closed_qty, held_qty, holding_ms in arrays['lot_stats'].tolist():
+        ledger._init_symbol(symbol)
+        ledger.realized[symbol] = realized
+        ledger.closed_qty[symbol] = closed_qty
+        ledger.held_qty[symbol] = held_qty
+        ledger.holding_ms[symbol] = holding_ms
+    for symbol, side, yesterday, qty, price, open_time in arrays['lots'].tolist():
+        ledger.lots[symbol][side][0 if yesterday else 1].append([qty, price, open_time])
+    ledger.now = int(arrays['lot_now'])
+
+
+def capture_ordmgr(ordmgr):
+    """copy orders of `OrdMgr` into rows
+
+    Parameters
+    ----------
+    ordmgr : OrdMgr
+
+    Returns
+    -------
+    rows : dict
+        name: (rows, dtype, shape)
+
+    """
+    return {'ordmgr_orders': ([(
+        o.order_id, o.symbol, o.volume, o.price, o.direction, o.open_close, _to_int(o.investor_type),
+        _to_int(o.order_type), _to_int(o.time_in_force), o.last_px, o.last_qty, o.cum_qty, o.cum_amount,
+        o.pending_cancel, o.status
+    ) for o in ordmgr.orders.values()], ORDER_DTYPE, None)}
+
+
+def dump_ordmgr(ordmgr):
+    """flatten orders of `OrdMgr` into array
+
+    Parameters
+    ----------
+    ordmgr : OrdMgr
+
+    Returns
+    -------
+    arrays : dict
+        name: numpy.ndarray
+
+    """
+    return flatten(capture_ordmgr(ordmgr))
+
+
+def load_ordmgr(ordmgr, arrays):
+    """restore orders of `OrdMgr` from arrays
+
+    Parameters
+    ----------
+    ordmgr : OrdMgr
+    arrays : dict
+        name: numpy.ndarray
+
+    Returns
+    -------
+    None
+
+    """
+    ordmgr.orders = {}
+    for o in arrays['ordmgr_orders'].tolist():
+        order = OrdMgr.Order(o[0], o[1], o[2], o[3], o[4], o[5], _from_int(o[6]), _from_int(o[7]), _from_int(o[8]))
+        order.last_px, order.last_qty, order.cum_qty, order.cum_amount, order.pending_cancel, order.status = o[9:]
+        ordmgr.orders[order.order_id] = order
+
+
+def capture_sync_order(sync_order):
+    """copy active and delayed orders of `SyncOrder` into rows
+
+    Parameters
+    ----------
+    sync_order : SyncOrder
+
+    Returns
+    -------
+    rows : dict
+        name: (rows, dtype, shape)
+
+    """
+    active_orders = [(
+        o['order_id'], o['symbol'], o['size'], o['price'], o['direction'], o['open_close'],
+        _to_int(o['investor_type']), _to_int(o['order_type']), _to_int(o['time_in_force']), o['last_px'],
+        o['last_qty'], o['cum_qty'], o['cum_amount'], o['pending_cancel'], o['status']
+    ) for o in sync_order.active_orders.values()]
+    delayed_orders = [(
+        o['symbol'], o['price'], o['size'], o['direction'], o['open_close'],
+        _to_int(o['kwargs'].get('investor_type')), _to_int(o['kwargs'].get('order_type')),
+        _to_int(o['kwargs'].get('time_in_force'))
+    ) for delay_list in sync_order.delayed_orders.values() for o in delay_list]
+    return {
+        'sync_active_orders': (active_orders, ORDER_DTYPE, None),
+        'sync_delayed_orders': (delayed_orders, DELAYED_ORDER_DTYPE, None)
+    }
+
+
+def dump_sync_order(sync_order):
+    """flatten active and delayed orders of `SyncOrder` into arrays
+
+    Parameters
+    ----------
+    sync_order : SyncOrder
+
+    Returns
+    -------
+    arrays : dict
+        name: numpy.ndarray
+
+    """
+    return flatten(capture_sync_order(sync_order))
+
+
+def load_sync_order(sync_order, arrays):
+    """restore active and delayed orders of `SyncOrder` from arrays
+
+    Parameters
+    ----------
+    sync_order : SyncOrder
+    arrays : dict
+        name: numpy.ndarray
+
+    Returns
+    -------
+    None
+
+    """
+    sync_order._active_orders = {}
+    for o in arrays['sync_active_orders'].tolist():
+        sync_order._active_orders[o[0]] = {
+            "order_id": o[0], "symbol": o[1], "price": o[3], "size": o[2],
+            "direction": o[4], "open_close": o[5],
+            # kwargs
+            "investor_type": _from_int(o[6]), "order_type": _from_int(o[7]), "time_in_force": _from_int(o[8]),
+            # additional fields
+            "pending_cancel": o[13], "cum_amount": o[12], "cum_qty": o[11], "last_px": o[9],
+            "last_qty": o[10], "status": o[14]
+        }
+    sync_order._count_pending_cancels()
+    sync_order._delayed_orders = {}
+    for o in arrays['sync_delayed_orders'].tolist():
+        kwargs = dict((key, _from_int(value)) for key, value in zip(ORDER_KWARGS, o[5:]) if value != NONE_VALUE)
+        sync_order._delayed_orders.setdefault(o[0], []).append({
+            "symbol": o[0], "price": o[1], "size": o[2], "direction": o[3],
+            "open_close": o[4], "kwargs": kwargs,
+        })
+
+
+def capture_bar_generator(bar_generator):
+    """copy bar construction state of `BarGenerator` into rows
+
+    Parameters
+    ----------
+    bar_generator : BarGenerator
+
+    Returns
+    -------
+    rows : dict
+        name: (rows, dtype, shape)
+
+    """
+    bars = []
+    for symbol, item in bar_generator.bar_struct_map.items():
+        bar = item.cur_bar if item.cur_bar is not None else InternalBar()
+        bars.append((
+            symbol, item.bar_index, item.last_bar_time, item.open_vol, item.open_notional, bar.int_time,
+            bar.open, bar.close, bar.high, bar.low, bar.volume, bar.turnover, bar.upper_limit, bar.lower_limit,
+            bar.open_interest, bar.bar_index
+        ))
+    return {
+        'bar_interval': (bar_generator.bar_interval, None, None),
+        'bar_structs': (bars, BAR_DTYPE, None)
+    }
+
+
+def dump_bar_generator(bar_generator):
+    """flatten bar construction state of `BarGenerator` into arrays
+
+    Parameters
+    ----------
+    bar_generator : BarGenerator
+
+    Returns
+    -------
+    arrays : dict
+        name: numpy.ndarray
+
+    """
+    return flatten(capture_bar_generator(bar_generator))
+
+
+def load_bar_generator(bar_generator, arrays):
+    """restore bar construction state of `BarGenerator` from arrays
+
+    Parameters
+    ----------
+    bar_generator : BarGenerator
+    arrays : dict
+        name: numpy.ndarray
+
+    Returns
+    -------
+    None
+
+    """
+    bar_generator.bar_struct_map = {}
+    for b in arrays['bar_structs'].tolist():
+        item = BarStruct()
+        item.bar_index, item.last_bar_time, item.open_vol, item.open_notional = b[1:5]
+        bar = InternalBar()
+        bar.symbol = b[0] if b[5] else ''
+        (bar.int_time, bar.open, bar.close, bar.high, bar.low, bar.volume, bar.turnover, bar.upper_limit,
+         bar.lower_limit, bar.open_interest, bar.bar_index) = b[5:]
+        item.cur_bar = bar
+        bar_generator.bar_struct_map[b[0]] = item
+
+
+class Checkpointer(object):
+    """Take a snapshot every `interval` events and write it to `path` in a background thread
+
+    The calling thread only copies the state into rows, building arrays and writing the file are done by the
+    background thread. Copying `PosMgrBase` still costs one row per symbol (about 7 ms for 4000 symbols),
+    `PosMgrArray` copies its matrices and is recommended for large universes.
+
+    Attributes
+    ----------
+    path : str
+        snapshot file, i.e. 'st.ckpt.npz'
+    interval : int
+        number of events between two snapshots
+    posmgr, ordmgr, sync_order, bar_generator : object
+        components to checkpoint, None to skip. `posmgr.lot_ledger` is included if attached
+    last_error : Exception or None
+        error of the latest write, None once a write succeeds
+    write_errors : int
+        number of failed writes
+    """
+
+    def __init__(self, path, interval=1000, posmgr=None, ordmgr=None, sync_order=None, bar_generator=None):
+        self.path = path
+        self.interval = interval
+        self.posmgr = posmgr
+        self.ordmgr = ordmgr
+        self.sync_order = sync_order
+        self.bar_generator = bar_generator
+        self.events = 0
+        self._pending = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._writer = None
+        self.last_error = None
+        self.write_errors = 0
+
+    def on_event(self):
+        """count one event (tick or response), take a snapshot every `interval` events
+
+        Returns
+        -------
+        None
+
+        """
+        self.events += 1
+        if self.events >= self.interval:
+            self.events = 0
+            self.checkpoint()
+
+    def capture(self):
+        """copy state of all components into rows
+
+        Returns
+        -------
+        rows : dict
+            name: (rows, dtype, shape)
+
+        """
+        rows = {'version': (SNAPSHOT_VERSION, None, None)}
+        if self.posmgr is not None:
+            rows.update(capture_position(self.posmgr))
+            if self.posmgr.lot_ledger is not None:
+                rows.update(capture_lot_ledger(self.posmgr.lot_ledger))
+        if self.ordmgr is not None:
+            rows.update(capture_ordmgr(self.ordmgr))
+        if self.sync_order is not None:
+            rows.update(capture_sync_order(self.sync_order))
+        if self.bar_generator is not None:
+            rows.update(capture_bar_generator(self.bar_generator))
+        return rows
+
+    def snapshot(self):
+        """flatten state of all components into arrays
+
+        Returns
+        -------
+        arrays : dict
+            name: numpy.ndarray
+
+        """
+        return flatten(self.capture())
+
+    def checkpoint(self):
+        """copy the state now, the snapshot is built and written by background thread.
+        An older snapshot not written yet is replaced.
+
+        Returns
+        -------
+        last_error : Exception or None
+            error of the latest write
+
+        """
+        rows = self.capture()
+        with self._cond:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop)
+                self._writer.daemon = True
+                self._writer.start()
+            self._pending = rows
+            self._cond.notify()
+        return self.last_error
+
+    def _write_loop(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                rows, self._pending = self._pending, None
+            try:
+                self.write(self.path, flatten(rows))
+            except Exception as e:
+                # keep the writer alive, the next snapshot is tried again
+                self.last_error = e
+                self.write_errors += 1
+                print ("failed to write snapshot {}: {!r}".format(self.path, e))
+            else:
+                self.last_error = None
+
+    @staticmethod
+    def write(path, arrays):
+        """write snapshot atomically
+
+        Parameters
+        ----------
+        path : str
+        arrays : dict
+            name: numpy.ndarray
+
+        Returns
+        -------
+        None
+
+        """
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    def close(self):
+        """flush pending snapshot and stop background thread
+
+        Returns
+        -------
+        last_error : Exception or None
+            error of the latest write, None if the last snapshot was written
+
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        return self.last_error
+
+    def restore(self, path=None):
+        """restore all components from snapshot, `posmgr.init_position` should be called before
+
+        Parameters
+        ----------
+        path : str, optional
+            snapshot file, `self.path` by default
+
+        Returns
+        -------
+        restored : bool
+            False if there is no snapshot
+
+        """
+        path = self.path if path is None else path
+        if not os.path.exists(path):
+            return False
+        with np.load(path, allow_pickle=False) as data:
+            arrays = dict((key, data[key]) for key in data.files)
+        if int(arrays['version']) != SNAPSHOT_VERSION:
+            print ("snapshot version {} is not supported".format(int(arrays['version'])))
+            return False
+        if self.posmgr is not None and 'position_symbols' in arrays:
+            load_position(self.posmgr, arrays)
+            ledger = self.posmgr.lot_ledger
+            if ledger is not None:
+                if 'lots' in arrays:
+                    load_lot_ledger(ledger, arrays)
+                else:
+                    # snapshot without lots, reseed from the restored position
+                    ledger.attach(self.posmgr)
+        if self.ordmgr is not None and 'ordmgr_orders' in arrays:
+            load_ordmgr(self.ordmgr, arrays)
+        if self.sync_order is not None and 'sync_active_orders' in arrays:
+            load_sync_order(self.sync_order, arrays)
+        if self.bar_generator is not None and 'bar_structs' in arrays:
+            load_bar_generator(self.bar_generator, arrays)
+        return True
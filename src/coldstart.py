@@ -0,0 +1,161 @@
+"""Import time and first callback latency of a fresh interpreter
+
+Strategies are restarted often, so the time from process start to a warm `on_book` matters as much
+as steady state throughput. Each sample runs this module in a new python process, which imports
+the strategy side modules one by one, then replays a few synthetic ticks through `bench.BarFollower`
+and records the first call of each callback next to its steady state average. Samples are reduced
+to their medians.
+
+    python coldstart.py
+    python coldstart.py --repeat 11
+"""
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+
+try:
+    from time import perf_counter_ns
+except ImportError:
+    from time import perf_counter
+
+    def perf_counter_ns():
+        return int(perf_counter() * 1e9)
+
+"""Constants
+"""
+# strategy side modules in import order, harness modules (replay, bench) are not timed
+MODULES = ('consts', 'bar', 'order', 'position', 'sync_order', 'risk', 'lots', 'dispatch')
+CALLBACKS = ('on_init', 'on_book', 'on_response')
+
+
+class FirstCall(object):
+    """wrap callbacks of a strategy to record nanoseconds of their first call
+
+    Attributes
+    ----------
+    first_ns : dict
+        callback: nanoseconds of first call
+    """
+
+    def __init__(self, strategy):
+        self.strategy = strategy
+        self.first_ns = {}
+
+    def _call(self, name, *args):
+        func = getattr(self.strategy, name)
+        if name in self.first_ns:
+            return func(*args)
+        start = perf_counter_ns()
+        result = func(*args)
+        self.first_ns[name] = perf_counter_ns() - start
+        return result
+
+    def on_init(self, context, config_type, config):
+        return self._call('on_init', context, config_type, config)
+
+    def on_book(self, context, quote_type, quote):
+        return self._call('on_book', context, quote_type, quote)
+
+    def on_response(self, context, response_type, response):
+        return self._call('on_response', context, response_type, response)
+
+
+def measure(modules=MODULES, n_ticks=600):
+    """measure in the current process, only meaningful in a fresh interpreter
+
+    Parameters
+    ----------
+    modules : tuple
+        module names imported and timed in order
+    n_ticks : int
+        synthetic ticks of one futures contract replayed after imports
+
+    Returns
+    -------
+    stats : dict
+        `<module>_ms` import time of each module, api_ms for installing the api or its stand-ins,
+        import_ms in total, numpy_loaded if numpy was imported by the modules, `<callback>_first_us` and
+        `<callback>_mean_us` first call and steady state average of each callback
+
+    """
+    stats = {}
+    begin = start = perf_counter_ns()
+    import sim_api
+    sim_api.install_api()
+    stats['api_ms'] = (perf_counter_ns() - start) / 1e6
+    for name in modules:
+        start = perf_counter_ns()
+        importlib.import_module(name)
+        stats[name + '_ms'] = (perf_counter_ns() - start) / 1e6
+    stats['import_ms'] = (perf_counter_ns() - begin) / 1e6
+    stats['numpy_loaded'] = 'numpy' in sys.modules
+
+    from replay import Replayer, make_config, synthetic_ticks
+    from bench import BarFollower
+    strategy = FirstCall(BarFollower())
+    replayer = Replayer(strategy, make_config(['f0000'], exch='SHFE', multiple=10), synthetic_ticks(1, n_ticks),
+                        ['f0000'])
+    run_stats = replayer.run()
+    for name in CALLBACKS:
+        stats[name + '_first_us'] = strategy.first_ns.get(name, 0) / 1e3
+        stats[name + '_mean_us'] = run_stats[name + '_ns'] / 1e3
+    return stats
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2.0
+
+
+def run(repeat=5):
+    """measure in `repeat` fresh processes
+
+    Returns
+    -------
+    stats : dict
+        median of each value of `measure`, numpy_loaded if any sample loaded numpy
+
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, os.path.join(here, 'coldstart.py'), '--child'], cwd=here)
+        samples.append(json.loads(output.decode().strip().splitlines()[-1]))
+    stats = dict((key, median([sample[key] for sample in samples])) for key in samples[0] if key != 'numpy_loaded')
+    stats['numpy_loaded'] = any(sample['numpy_loaded'] for sample in samples)
+    return stats
+
+
+def format_stats(stats):
+    """format stats of `run` as text"""
+    lines = ['{:<20}{:>12}'.format('import', 'ms')]
+    for name in ('api', ) + MODULES:
+        if name + '_ms' in stats:
+            lines.append('{:<20}{:>12.2f}'.format(name, stats[name + '_ms']))
+    lines.append('{:<20}{:>12.2f}'.format('total', stats['import_ms']))
+    lines.append('numpy loaded by strategy modules: {}'.format(stats['numpy_loaded']))
+    lines.append('')
+    lines.append('{:<20}{:>12}{:>12}'.format('callback', 'first us', 'mean us'))
+    for name in CALLBACKS:
+        lines.append('{:<20}{:>12.1f}{:>12.1f}'.format(name, stats[name + '_first_us'], stats[name + '_mean_us']))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='import time and first callback latency of fresh processes')
+    parser.add_argument('--repeat', type=int, default=5, help='number of fresh processes')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        print (json.dumps(measure()))
+        return 0
+    print (format_stats(run(args.repeat)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
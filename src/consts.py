@@ -0,0 +1,52 @@
+"""Values of my.sdp.api enums resolved once at import
+
+Hot paths compare plain ints, i.e. `response.status == SUCCEED`, instead of looking up
+`OrderStatus.SUCCEED.value` through the enum on every call. Values come from the platform api,
+or from the stand-ins of `sim_api` where the api can not be imported, so modules importing
+constants load without the platform package.
+"""
+try:
+    from my.sdp.api import (Direction, OpenClose, OrderStatus, Exchange)
+except ImportError:
+    from sim_api import (Direction, OpenClose, OrderStatus, Exchange)
+
+
+def _names(enum):
+    """name of each member, keyed by both value and member"""
+    names = dict((member, member.name) for member in enum)
+    names.update((member.value, member.name) for member in enum)
+    return names
+
+
+"""Constants
+"""
+# Direction
+BUY = Direction.BUY.value
+SELL = Direction.SELL.value
+# OpenClose
+OPEN = OpenClose.OPEN.value
+CLOSE = OpenClose.CLOSE.value
+CLOSE_TOD = OpenClose.CLOSE_TOD.value
+CLOSE_YES = OpenClose.CLOSE_YES.value
+# OrderStatus
+INIT = OrderStatus.INIT.value
+SUCCEED = OrderStatus.SUCCEED.value
+ENTRUSTED = OrderStatus.ENTRUSTED.value
+PARTED = OrderStatus.PARTED.value
+CANCELED = OrderStatus.CANCELED.value
+CANCEL_REJECTED = OrderStatus.CANCEL_REJECTED.value
+REJECTED = OrderStatus.REJECTED.value
+INTERREJECTED = OrderStatus.INTERREJECTED.value
+# Exchange
+SSE = Exchange.SSE.short_name
+SZSE = Exchange.SZSE.short_name
+
+# lookup tables
+FILLED = frozenset((SUCCEED, PARTED))
+# besides SUCCEED with volume, statuses finishing an order
+DEAD = frozenset((CANCELED, REJECTED, INTERREJECTED))
+STOCK_EXCHANGES = frozenset((SSE, SZSE))
+# names for logs by value or member, a dict lookup instead of constructing the enum
+DIRECTION_NAMES = _names(Direction)
+OPEN_CLOSE_NAMES = _names(OpenClose)
+STATUS_NAMES = _names(OrderStatus)
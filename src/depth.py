@@ -0,0 +1,314 @@
+"""Rolling order book depth features
+
+`DepthFeatures` computes mid, depth weighted mid, microprice, multi-level depth imbalance,
+multi-level order flow imbalance (OFI) and spread from `bp_array`/`ap_array`/`bv_array`/`av_array`
+of each tick. `update_depth_batch` computes them for a cross-sectional snapshot with numpy
+operations over symbols and depth levels at once. Each symbol keeps the latest `window`
+values of every feature in a ring buffer with running sums, so the current value and the
+windowed sum/mean/std are O(1).
+
+Levels are weighted by `decay ** level`. OFI of a level follows Cont, Kukanov and Stoikov (2014):
+bid volume is counted as inflow when the bid price does not fall and the previous bid volume as
+outflow when it does not rise, the ask side the other way round.
+"""
+import numpy as np
+
+from bar import BarGenerator
+
+"""Constants
+"""
+# fields of feature vector
+MID = 0
+WEIGHTED_MID = 1
+MICROPRICE = 2
+IMBALANCE = 3
+OFI = 4
+SPREAD = 5
+N_FEATURES = 6
+FEATURE_NAMES = ('mid', 'weighted_mid', 'microprice', 'imbalance', 'ofi', 'spread')
+# rows of book
+BID_PX = 0
+ASK_PX = 1
+BID_VOL = 2
+ASK_VOL = 3
+SIDE_SIGN = np.array([1.0, -1.0])[:, None]
+
+
+class DepthFeatures(object):
+    """Depth features of symbols in ring buffers
+
+    Attributes
+    ----------
+    levels : int
+        depth levels used
+    window : int
+        ticks kept of each symbol
+    weights : numpy.ndarray
+        shape (levels, ), weight of each level
+    symbol_index : dict
+        symbol: row
+    symbols : list
+        row -> symbol
+    books : numpy.ndarray
+        shape (capacity, 4, levels), previous book of each symbol: bid price, ask price, bid volume, ask volume
+    buffer : numpy.ndarray
+        shape (capacity, window, N_FEATURES), ring buffers of features
+    pos : numpy.ndarray
+        shape (capacity, ), index of next write of each ring buffer
+    count : numpy.ndarray
+        shape (capacity, ), number of ticks recorded of each symbol
+    sums, sq_sums : numpy.ndarray
+        shape (capacity, N_FEATURES), running sum and sum of squares of each window
+    """
+
+    def __init__(self, window=120, levels=5, decay=0.5, symbols=None):
+        self.window = window
+        self.levels = levels
+        self.weights = decay ** np.arange(levels, dtype=np.float64)
+        self.weights_list = self.weights.tolist()
+        self.symbol_index = {}
+        self.symbols = []
+        self.books = np.zeros((0, 4, levels))
+        self.buffer = np.zeros((0, window, N_FEATURES))
+        self.pos = np.zeros(0, dtype=np.int64)
+        self.count = np.zeros(0, dtype=np.int64)
+        self.sums = np.zeros((0, N_FEATURES))
+        self.sq_sums = np.zeros((0, N_FEATURES))
+        self._grow(max(len(symbols) if symbols else 0, 16))
+        for symbol in symbols or ():
+            self.get_row(symbol)
+
+    def _grow(self, capacity):
+        for name in ('books', 'buffer', 'pos', 'count', 'sums', 'sq_sums'):
+            array = getattr(self, name)
+            grown = np.zeros((capacity, ) + array.shape[1:], dtype=array.dtype)
+            grown[:len(self.symbols)] = array[:len(self.symbols)]
+            setattr(self, name, grown)
+
+    def get_row(self, symbol):
+        """row of symbol, added if new"""
+        row = self.symbol_index.get(symbol)
+        if row is None:
+            row = len(self.symbols)
+            if row == len(self.pos):
+                self._grow(row * 2)
+            self.symbol_index[symbol] = row
+            self.symbols.append(symbol)
+        return row
+
+    def process_depth_data(self, context, quote_type, quote):
+        """update features from tick data, should be called at on_book interface
+
+        Parameters
+        ----------
+        context : object
+        quote_type : {0, 1}
+            0 for futures, 1 for stock
+        quote : object
+
+        Returns
+        -------
+        None
+
+        """
+        if quote_type == 3:
+            return
+        if quote_type == 0 and quote.feed_type == BarGenerator.MI_DCE_ORDER_STATISTIC:
+            return
+        symbol = quote.symbol if quote_type == 0 else quote.ticker
+        self.update_depth(symbol, quote.bp_array, quote.ap_array, quote.bv_array, quote.av_array)
+
+    def update_depth(self, symbol, bp_array, ap_array, bv_array, av_array):
+        """update features of symbol with one book
+
+        Parameters
+        ----------
+        symbol : str
+        bp_array, ap_array, bv_array, av_array : list or numpy.ndarray
+            prices and volumes of bid/ask levels, at least `levels` long
+
+        Returns
+        -------
+        recorded : bool
+            False if a side of book is empty, i.e. at limit price, features are not recorded
+
+        """
+        row = self.get_row(symbol)
+        book = self.books[row]
+        prev_bp, prev_ap, prev_bv, prev_av = book.tolist()
+        first = self.count.item(row) == 0 and not any(prev_bv) and not any(prev_av)
+        bid_vol = ask_vol = bid_notional = ask_notional = flow = 0.0
+        # a loop over a few levels is faster than numpy on arrays this small, see `update_depth_batch`
+        for k, weight in enumerate(self.weights_list):
+            bid, ask, bv, av = bp_array[k], ap_array[k], bv_array[k], av_array[k]
+            bid_vol += weight * bv
+            ask_vol += weight * av
+            bid_notional += weight * bid * bv
+            ask_notional += weight * ask * av
+            prev_ask = prev_ap[k]
+            flow += weight * ((bv if bid >= prev_bp[k] else 0) - (prev_bv[k] if bid <= prev_bp[k] else 0) -
+                              (av if ask <= prev_ask else 0) + (prev_av[k] if ask >= prev_ask else 0))
+        levels = self.levels
+        book[BID_PX] = bp_array[:levels]
+        book[ASK_PX] = ap_array[:levels]
+        book[BID_VOL] = bv_array[:levels]
+        book[ASK_VOL] = av_array[:levels]
+
+        bid, ask = float(bp_array[0]), float(ap_array[0])
+        if bid <= 0 or ask <= 0:
+            return False
+        mid = (bid + ask) * 0.5
+        bv1, av1 = float(bv_array[0]), float(av_array[0])
+        self._record(row, [
+            mid,
+            (bid_notional / bid_vol + ask_notional / ask_vol) * 0.5 if bid_vol > 0 and ask_vol > 0 else mid,
+            (bid * av1 + ask * bv1) / (bv1 + av1) if bv1 + av1 > 0 else mid,
+            (bid_vol - ask_vol) / (bid_vol + ask_vol) if bid_vol + ask_vol > 0 else 0.0,
+            0.0 if first else float(flow),
+            ask - bid
+        ])
+        return True
+
+    def _record(self, row, values):
+        """append feature values to ring buffer of row"""
+        pos = self.pos.item(row)
+        buffer = self.buffer[row]
+        old = buffer[pos].tolist()
+        sums = self.sums[row]
+        sq_sums = self.sq_sums[row]
+        sums[:] = [s + v - o for s, v, o in zip(sums.tolist(), values, old)]
+        sq_sums[:] = [s + v * v - o * o for s, v, o in zip(sq_sums.tolist(), values, old)]
+        buffer[pos] = values
+        pos += 1
+        if pos == self.window:
+            pos = 0
+            # renew running sums once per window against accumulated rounding errors
+            sums[:] = buffer.sum(axis=0)
+            sq_sums[:] = np.square(buffer).sum(axis=0)
+        self.pos[row] = pos
+        self.count[row] += 1
+
+    def update_depth_batch(self, rows, bp, ap, bv, av):
+        """update features of many symbols from a cross-sectional snapshot in one vectorized step
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            unique rows of symbols, see `get_row`
+        bp, ap, bv, av : numpy.ndarray
+            shape (len(rows), >= levels), prices and volumes of bid/ask levels
+
+        Returns
+        -------
+        recorded : numpy.ndarray
+            bool of each row, False if a side of book is empty
+
+        """
+        levels = self.levels
+        book = np.stack((bp[:, :levels], ap[:, :levels], bv[:, :levels], av[:, :levels]), axis=1).astype(np.float64)
+        prev = self.books[rows]
+        # ask prices negated so both sides share the same comparisons
+        price, prev_price = book[:, :2] * SIDE_SIGN, prev[:, :2] * SIDE_SIGN
+        volume = book[:, 2:]
+        flow = np.where(price >= prev_price, volume, 0.0) - np.where(price <= prev_price, prev[:, 2:], 0.0)
+        # shape (m, 6): bid_vol, ask_vol, bid_notional, -ask_notional, bid_flow, ask_flow
+        sums = np.dot(np.concatenate((volume, price * volume, flow), axis=1), self.weights)
+        first = (self.count[rows] == 0) & ~prev.any(axis=(1, 2))
+        self.books[rows] = book
+
+        bid, ask = bp[:, 0].astype(np.float64), ap[:, 0].astype(np.float64)
+        bv1, av1 = bv[:, 0].astype(np.float64), av[:, 0].astype(np.float64)
+        recorded = (bid > 0) & (ask > 0)
+        mid = (bid + ask) * 0.5
+        values = np.empty((len(rows), N_FEATURES))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values[:, MID] = mid
+            values[:, WEIGHTED_MID] = np.where(
+                (sums[:, 0] > 0) & (sums[:, 1] > 0), (sums[:, 2] / sums[:, 0] - sums[:, 3] / sums[:, 1]) * 0.5, mid)
+            values[:, MICROPRICE] = np.where(bv1 + av1 > 0, (bid * av1 + ask * bv1) / (bv1 + av1), mid)
+            total = sums[:, 0] + sums[:, 1]
+            values[:, IMBALANCE] = np.where(total > 0, (sums[:, 0] - sums[:, 1]) / total, 0.0)
+        values[:, OFI] = np.where(first, 0.0, sums[:, 4] - sums[:, 5])
+        values[:, SPREAD] = ask - bid
+
+        rows = rows[recorded]
+        values = values[recorded]
+        pos = self.pos[rows]
+        old = self.buffer[rows, pos]
+        self.sums[rows] += values - old
+        self.sq_sums[rows] += values * values - old * old
+        self.buffer[rows, pos] = values
+        pos += 1
+        wrapped = rows[pos == self.window]
+        pos[pos == self.window] = 0
+        if len(wrapped):
+            self.sums[wrapped] = self.buffer[wrapped].sum(axis=1)
+            self.sq_sums[wrapped] = np.square(self.buffer[wrapped]).sum(axis=1)
+        self.pos[rows] = pos
+        self.count[rows] += 1
+        return recorded
+
+    def get_feature(self, symbol, feature):
+        """latest value of feature
+
+        Parameters
+        ----------
+        symbol : str
+        feature : int
+            i.e. MICROPRICE
+
+        Returns
+        -------
+        value : float
+            nan if nothing recorded
+
+        """
+        row = self.symbol_index[symbol]
+        if self.count.item(row) == 0:
+            return float('nan')
+        return self.buffer.item(row, self.pos.item(row) - 1, feature)
+
+    def get_features(self, symbol):
+        """latest values of all features
+
+        Returns
+        -------
+        values : dict
+            name: value
+
+        """
+        return dict((name, self.get_feature(symbol, i)) for i, name in enumerate(FEATURE_NAMES))
+
+    def get_count(self, symbol):
+        """number of values in window"""
+        return min(self.count.item(self.symbol_index[symbol]), self.window)
+
+    def get_sum(self, symbol, feature):
+        """sum of feature over window, i.e. cumulative OFI"""
+        return self.sums.item(self.symbol_index[symbol], feature)
+
+    def get_mean(self, symbol, feature):
+        """mean of feature over window, nan if nothing recorded"""
+        n = self.get_count(symbol)
+        return self.get_sum(symbol, feature) / n if n else float('nan')
+
+    def get_std(self, symbol, feature):
+        """population standard deviation of feature over window, nan if nothing recorded"""
+        n = self.get_count(symbol)
+        if n == 0:
+            return float('nan')
+        mean = self.get_sum(symbol, feature) / n
+        var = self.sq_sums.item(self.symbol_index[symbol], feature) / n - mean * mean
+        return var ** 0.5 if var > 0 else 0.0
+
+    def get_window(self, symbol, feature):
+        """values of feature over window in time order, O(window)
+
+        Returns
+        -------
+        values : numpy.ndarray
+
+        """
+        row = self.symbol_index[symbol]
+        n = min(self.count.item(row), self.window)
+        return np.roll(self.buffer[row, :, feature], -self.pos.item(row))[self.window - n:]
@@ -0,0 +1,223 @@
+"""Symbol-routed quote dispatcher
+
+`QuoteDispatcher.on_book` resolves symbol and time of a quote once, maps the symbol to a compact
+integer id and calls only the handlers subscribed to that symbol and quote type. Handlers of each
+(quote type, symbol id) are precomputed into tuples on subscription, so a quote of a symbol nobody
+watches costs one dict lookup.
+
+Handlers are called as handler(context, quote_type, quote, symbol, int_time). DCE order statistic
+quotes carry no book, they are told apart once per quote and only routed to handlers subscribed to
+ORDER_STATISTIC.
+"""
+from bar import BarGenerator
+
+"""Constants
+"""
+FUTURES = 0
+STOCK = 1
+BAR = 3
+SYNC_BAR = 4
+# routing key of futures quotes of feed type BarGenerator.MI_DCE_ORDER_STATISTIC, handlers get quote type 0
+ORDER_STATISTIC = -1
+
+
+class QuoteDispatcher(object):
+    """Route quotes to subscribed handlers by symbol and quote type
+
+    Attributes
+    ----------
+    symbol_ids : dict
+        symbol: id, ids are assigned in order of first subscription or first quote
+    symbols : list
+        id -> symbol
+    routes : dict
+        quote_type: list of handler tuples indexed by symbol id
+    subscriptions : list
+        (handler, symbols or None for all symbols, quote_types)
+    """
+
+    def __init__(self):
+        self.symbol_ids = {}
+        self.symbols = []
+        self.routes = {}
+        self.subscriptions = []
+
+    def get_symbol_id(self, symbol):
+        """compact integer id of symbol, assigned if new"""
+        symbol_id = self.symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = self._add_symbol(symbol)
+        return symbol_id
+
+    def _add_symbol(self, symbol):
+        symbol_id = len(self.symbols)
+        self.symbol_ids[symbol] = symbol_id
+        self.symbols.append(symbol)
+        for quote_type, routes in self.routes.items():
+            routes.append(self._handlers(quote_type, symbol))
+        return symbol_id
+
+    def _handlers(self, quote_type, symbol):
+        return tuple(handler for handler, symbols, quote_types in self.subscriptions
+                     if quote_type in quote_types and (symbols is None or symbol in symbols))
+
+    def _rebuild(self):
+        quote_types = set()
+        for _, _, types in self.subscriptions:
+            quote_types.update(types)
+        self.routes = dict((quote_type, [self._handlers(quote_type, symbol) for symbol in self.symbols])
+                           for quote_type in quote_types)
+
+    def subscribe(self, handler, symbols=None, quote_types=(FUTURES, STOCK)):
+        """route quotes of symbols and quote types to handler
+
+        Parameters
+        ----------
+        handler : callable
+            handler(context, quote_type, quote, symbol, int_time)
+        symbols : list or None
+            None for all symbols
+        quote_types : tuple
+            i.e. (0, 1) for futures and stock ticks, 3 for bars of `BarGenerator`, 4 for `SyncBarGenerator`,
+            ORDER_STATISTIC for DCE order statistics
+
+        Returns
+        -------
+        None
+
+        """
+        if symbols is not None:
+            symbols = frozenset(symbols)
+            for symbol in symbols:
+                self.get_symbol_id(symbol)
+        self.subscriptions.append((handler, symbols, tuple(quote_types)))
+        self._rebuild()
+
+    def unsubscribe(self, handler):
+        """remove all subscriptions of handler"""
+        self.subscriptions = [s for s in self.subscriptions if s[0] != handler]
+        self._rebuild()
+
+    def add_bar_generator(self, bar_generator, on_book, symbols=None):
+        """feed ticks of symbols to `BarGenerator`, bars are called back to on_book
+
+        Parameters
+        ----------
+        bar_generator : BarGenerator
+        on_book : callable
+            i.e. `QuoteDispatcher.on_book` to route bars to handlers subscribed to quote type 3
+        symbols : list or None
+
+        Returns
+        -------
+        handler : callable
+            for `unsubscribe`
+
+        """
+        update_bar = bar_generator.update_bar
+
+        def handler(context, quote_type, quote, symbol, int_time):
+            update_bar(context, symbol, int_time, quote, on_book)
+        self.subscribe(handler, symbols)
+        return handler
+
+    def add_sync_bar_generator(self, sync_bar_generator, on_book):
+        """feed ticks of legs to `SyncBarGenerator`, synchronized bars are called back to on_book
+
+        Parameters
+        ----------
+        sync_bar_generator : SyncBarGenerator
+        on_book : callable
+            i.e. `QuoteDispatcher.on_book` to route bars to handlers subscribed to quote type 4 and
+            the name of the group
+
+        Returns
+        -------
+        handler : callable
+            for `unsubscribe`
+
+        """
+        update_bar = sync_bar_generator.update_bar
+
+        def handler(context, quote_type, quote, symbol, int_time):
+            update_bar(context, symbol, int_time, quote, on_book)
+        self.subscribe(handler, sync_bar_generator.symbols)
+        return handler
+
+    def add_depth_features(self, depth_features, symbols=None):
+        """feed books of symbols to `DepthFeatures`
+
+        Parameters
+        ----------
+        depth_features : DepthFeatures
+        symbols : list or None
+
+        Returns
+        -------
+        handler : callable
+            for `unsubscribe`
+
+        """
+        update_depth = depth_features.update_depth
+
+        def handler(context, quote_type, quote, symbol, int_time):
+            update_depth(symbol, quote.bp_array, quote.ap_array, quote.bv_array, quote.av_array)
+        self.subscribe(handler, symbols)
+        return handler
+
+    def add_posmgr(self, posmgr, symbols=None):
+        """update last prices of position manager
+
+        Parameters
+        ----------
+        posmgr : PosMgrBase
+        symbols : list or None
+            contracts of posmgr by default
+
+        Returns
+        -------
+        handler : callable
+            for `unsubscribe`
+
+        """
+        set_last_px = posmgr.set_last_px
+
+        def handler(context, quote_type, quote, symbol, int_time):
+            set_last_px(symbol, quote.last_px, int_time)
+        self.subscribe(handler, list(posmgr.contract_info) if symbols is None else symbols)
+        return handler
+
+    def on_book(self, context, quote_type, quote):
+        """dispatch a quote, should be called at on_book interface
+
+        Parameters
+        ----------
+        context : object
+        quote_type : int
+            0 for futures, 1 for stock, 3 for bar, 4 for synchronized bar routed by name of group.
+            DCE order statistics of type 0 are routed to ORDER_STATISTIC
+        quote : object
+
+        Returns
+        -------
+        None
+
+        """
+        if quote_type == STOCK:
+            symbol = quote.ticker
+            int_time = quote.exch_time
+            routes = self.routes.get(STOCK)
+        else:
+            symbol = quote.symbol
+            int_time = quote.int_time
+            if quote_type == FUTURES and quote.feed_type == BarGenerator.MI_DCE_ORDER_STATISTIC:
+                routes = self.routes.get(ORDER_STATISTIC)
+            else:
+                routes = self.routes.get(quote_type)
+        if routes is None:
+            return
+        symbol_id = self.symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = self._add_symbol(symbol)
+        for handler in routes[symbol_id]:
+            handler(context, quote_type, quote, symbol, int_time)
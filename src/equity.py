@@ -0,0 +1,193 @@
+"""Mark-to-market equity curve and drawdown recorder
+
+Samples of strategy pnl, per contract pnl, net positions and last prices are written into
+preallocated numpy arrays, driven by bar events from `BarGenerator` or by a sampling interval.
+Max equity and max drawdown are kept as running values, so checking a stop-out costs O(1).
+"""
+import json
+
+import numpy as np
+
+from bar import BarGenerator
+from position_array import PosMgrArray
+
+
+class EquityRecorder(object):
+    """Record equity curve of a position manager
+
+    Attributes
+    ----------
+    posmgr : PosMgrBase
+    symbols : list
+        column -> symbol of per contract arrays
+    int_time : numpy.ndarray
+        shape (capacity, ), time of each sample
+    equity : numpy.ndarray
+        shape (capacity, ), strategy pnl by cash including pnl settled by `settle`, so that a settlement is
+        not a drawdown
+    drawdown : numpy.ndarray
+        shape (capacity, ), max equity - equity
+    pnl, position, price : numpy.ndarray
+        shape (capacity, n_symbols), pnl by cash, net position and last price of each contract
+    count : int
+        number of samples recorded
+    max_equity : float
+    max_drawdown : float
+    interval : int
+        min milliseconds between two samples of `sample`
+    """
+
+    def __init__(self, posmgr, capacity=4096, interval=60000):
+        self.posmgr = posmgr
+        self.interval = interval
+        if isinstance(posmgr, PosMgrArray):
+            self.symbols = list(posmgr.symbols)
+        else:
+            self.symbols = list(posmgr.contract_info)
+        n_symbols = len(self.symbols)
+        self.int_time = np.zeros(capacity, dtype=np.int64)
+        self.equity = np.zeros(capacity)
+        self.drawdown = np.zeros(capacity)
+        self.pnl = np.zeros((capacity, n_symbols))
+        self.position = np.zeros((capacity, n_symbols))
+        self.price = np.zeros((capacity, n_symbols))
+        self.count = 0
+        self.max_equity = float('-inf')
+        self.max_drawdown = 0.0
+        self.last_sample_ms = None
+        self.last_bar_time = None
+
+    @property
+    def capacity(self):
+        return len(self.int_time)
+
+    def _grow(self):
+        capacity = self.capacity * 2
+        for name in ('int_time', 'equity', 'drawdown', 'pnl', 'position', 'price'):
+            array = getattr(self, name)
+            grown = np.zeros((capacity, ) + array.shape[1:], dtype=array.dtype)
+            grown[:self.count] = array[:self.count]
+            setattr(self, name, grown)
+
+    def record(self, int_time):
+        """record one sample of current pnl, positions and prices
+
+        Parameters
+        ----------
+        int_time : int
+            i.e. 93005000
+
+        Returns
+        -------
+        drawdown : float
+            current drawdown by cash
+
+        """
+        if self.count == self.capacity:
+            self._grow()
+        i = self.count
+        posmgr = self.posmgr
+        equity = posmgr.settled_pnl + posmgr.get_strategy_pnl_cash()
+        if equity > self.max_equity:
+            self.max_equity = equity
+        drawdown = self.max_equity - equity
+        if drawdown > self.max_drawdown:
+            self.max_drawdown = drawdown
+        self.int_time[i] = int_time
+        self.equity[i] = equity
+        self.drawdown[i] = drawdown
+        if isinstance(posmgr, PosMgrArray):
+            np.multiply(posmgr.realized + posmgr.unrealized, posmgr.pnl_scale, out=self.pnl[i])
+            self.position[i] = posmgr.net_position_vector()
+            self.price[i] = posmgr.last_px
+        else:
+            self.pnl[i] = [posmgr.get_contract_pnl_cash(symbol) for symbol in self.symbols]
+            self.position[i] = [posmgr.get_net_position(symbol) for symbol in self.symbols]
+            self.price[i] = [posmgr.prices[symbol]['last_px'] for symbol in self.symbols]
+        self.count += 1
+        return drawdown
+
+    def sample(self, int_time):
+        """record if `interval` milliseconds passed since last sample, can be called on each tick
+
+        Parameters
+        ----------
+        int_time : int
+
+        Returns
+        -------
+        recorded : bool
+
+        """
+        ms = BarGenerator.int_time_to_ms(int_time)
+        if self.last_sample_ms is not None and 0 <= ms - self.last_sample_ms < self.interval:
+            return False
+        self.last_sample_ms = ms
+        self.record(int_time)
+        return True
+
+    def on_book(self, context, quote_type, quote):
+        """record on bar quote (quote_type 3) from `BarGenerator`, once per bar time
+
+        Parameters
+        ----------
+        context : object
+        quote_type : int
+        quote : object
+
+        Returns
+        -------
+        None
+
+        """
+        if quote_type == 3 and quote.int_time != self.last_bar_time:
+            self.last_bar_time = quote.int_time
+            self.record(quote.int_time)
+
+    def export(self, path):
+        """export recorded samples to a memory-mapped `.npy` file, symbols are saved to `path + '.json'`
+
+        Parameters
+        ----------
+        path : str
+            i.e. 'equity.npy'
+
+        Returns
+        -------
+        data : numpy.memmap
+            structured array with fields int_time, equity, drawdown, pnl, position, price
+
+        """
+        n_symbols = len(self.symbols)
+        dtype = np.dtype([
+            ('int_time', 'i8'), ('equity', 'f8'), ('drawdown', 'f8'),
+            ('pnl', 'f8', (n_symbols, )), ('position', 'f8', (n_symbols, )), ('price', 'f8', (n_symbols, ))
+        ])
+        data = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(self.count, ))
+        for name in dtype.names:
+            data[name] = getattr(self, name)[:self.count]
+        data.flush()
+        with open(path + '.json', 'w') as f:
+            json.dump({
+                'symbols': self.symbols, 'max_equity': self.max_equity, 'max_drawdown': self.max_drawdown
+            }, f)
+        return data
+
+    @staticmethod
+    def load(path):
+        """load exported samples as read only memory map
+
+        Parameters
+        ----------
+        path : str
+
+        Returns
+        -------
+        data : numpy.memmap
+        info : dict
+            symbols, max_equity, max_drawdown
+
+        """
+        with open(path + '.json') as f:
+            info = json.load(f)
+        return np.load(path, mmap_mode='r'), info
@@ -0,0 +1,776 @@
+"""Asyncio gateway stand-in with pipelined responses
+
+`replay.Replayer` delivers responses between ticks in one fixed sequence. `AsyncGateway` instead runs
+quotes, order and cancel requests, acks, fills and cancel acks as timed events of one asyncio event
+loop, each delayed by a latency drawn from a `Latency` distribution, so that many responses are in
+flight at once, cancels race fills and, with `reorder`, responses of an order overtake each other.
+The loop runs on virtual time: when no callback is ready the clock jumps to the next timer, so
+sessions of thousands of concurrent orders run faster than real time and repeat for a seed.
+
+`stress` runs `Churn`, which keeps `SyncOrder`, `OrdMgr` and `PosMgrBase` busy with sends and cancels
+on every tick, and checks their state against the exchange once all events are drained.
+
+    python gateway.py
+    python gateway.py --symbols 50 --ticks 2000 --response-latency lognormal:2,0.8 --reorder --max-fill 2
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import selectors
+import sys
+
+import replay  # installs stand-ins of my.sdp.api if missing
+from replay import (Struct, Response, make_config, synthetic_ticks, TICK_DTYPE, CHUNK_SIZE, FINISHED_CACHE,
+                    ORD_SYMBOL, ORD_PRICE, ORD_LEAVES, ORD_DIRECTION, ORD_OPEN_CLOSE)
+from perf import Probe, perf_counter_ns
+
+from consts import BUY, SELL, OPEN, CLOSE, ENTRUSTED, SUCCEED, PARTED, CANCELED, CANCEL_REJECTED, REJECTED, FILLED
+from bar import BarGenerator
+from order import OrdMgr
+from position import PosMgrBase
+from sync_order import SyncOrder
+
+try:
+    from time import perf_counter as clock
+except ImportError:
+    from time import time as clock
+
+"""Constants
+"""
+# order record of AsyncExchange, after the fields shared with replay.SimExchange
+ORD_ARRIVED = 5
+ORD_REQUEST_DUE = 6
+ORD_RESPONSE_DUE = 7
+ORD_SENT_AT = 8
+ORD_CANCEL_AT = 9
+ORD_FILLED = 10
+# virtual latencies of AsyncExchange
+LATENCIES = ('ack', 'fill', 'cancel')
+# seconds between messages of an order on one leg, timers of equal time may fire in any sequence
+SEQUENCE_GAP = 1e-6
+
+
+class _VirtualSelector(selectors.DefaultSelector):
+    """selector which moves the clock of its loop forward by the timeout instead of waiting"""
+
+    def __init__(self, loop):
+        super(_VirtualSelector, self).__init__()
+        self.loop = loop
+
+    def select(self, timeout=None):
+        events = super(_VirtualSelector, self).select(0)
+        if events or (timeout is not None and timeout <= 0):
+            return events
+        if timeout is None:
+            raise RuntimeError('virtual time loop has no timer to wait for')
+        self.loop.advance(timeout)
+        return events
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """asyncio event loop on virtual time
+
+    `time` returns `virtual_time`, which only moves when no callback is ready, straight to the next
+    timer, so `asyncio.sleep` and `call_at` take no wall time.
+
+    Attributes
+    ----------
+    virtual_time : float
+        seconds, i.e. seconds of day of the replayed ticks
+    """
+
+    def __init__(self, start=0.0):
+        self.virtual_time = start
+        super(VirtualTimeLoop, self).__init__(_VirtualSelector(self))
+
+    def time(self):
+        return self.virtual_time
+
+    def advance(self, seconds):
+        self.virtual_time += seconds
+
+
+class Latency(object):
+    """distribution of latencies in milliseconds
+
+    Attributes
+    ----------
+    dist : {'constant', 'uniform', 'exponential', 'lognormal'}
+    params : tuple
+        (ms, ) of constant, (low, high) of uniform, (mean, ) of exponential, (median, sigma) of lognormal
+    floor : float
+        milliseconds, smallest latency drawn
+    """
+    N_PARAMS = {'constant': 1, 'uniform': 2, 'exponential': 1, 'lognormal': 2}
+
+    def __init__(self, dist='constant', params=(1.0, ), floor=0.0):
+        params = tuple(float(p) for p in params)
+        if self.N_PARAMS.get(dist) != len(params):
+            raise ValueError('invalid latency: {} {}'.format(dist, params))
+        if dist in ('exponential', 'lognormal') and params[0] <= 0:
+            raise ValueError('mean or median of {} latency must be positive'.format(dist))
+        self.dist = dist
+        self.params = params
+        self.floor = floor
+
+    @classmethod
+    def parse(cls, text):
+        """latency from text of '<dist>:<param>,<param>', i.e. '1', 'uniform:0.5,3', 'lognormal:2,0.8'"""
+        if ':' not in text:
+            return cls('constant', (text, ))
+        dist, params = text.split(':', 1)
+        return cls(dist, params.split(','))
+
+    def sample(self, rng):
+        """one latency in milliseconds
+
+        Parameters
+        ----------
+        rng : random.Random
+
+        Returns
+        -------
+        ms : float
+
+        """
+        dist = self.dist
+        if dist == 'constant':
+            ms = self.params[0]
+        elif dist == 'uniform':
+            ms = rng.uniform(self.params[0], self.params[1])
+        elif dist == 'exponential':
+            ms = rng.expovariate(1.0 / self.params[0])
+        else:
+            ms = rng.lognormvariate(math.log(self.params[0]), self.params[1])
+        return ms if ms > self.floor else self.floor
+
+    def __repr__(self):
+        return '{}:{}'.format(self.dist, ','.join('{:g}'.format(p) for p in self.params))
+
+
+class AsyncExchange(object):
+    """Matching stand-in behind a network of random latencies, on the clock of an asyncio loop
+
+    Requests reach the exchange `order_latency` after they are sent and responses reach the strategy
+    `response_latency` after the event. Orders trade on arrival and on later quotes against what is left
+    of the top of book like `replay.SimExchange`, each execution is split into fills of at most `max_fill`
+    lots. A cancel takes effect when it arrives: a live order is canceled, one finished or not yet
+    arrived is rejected with CANCEL_REJECTED. Unless `reorder`, messages of an order keep their sequence
+    on each leg, otherwise each message draws its own latency.
+
+    Attributes
+    ----------
+    loop : VirtualTimeLoop
+    rng : random.Random
+    order_latency : Latency
+    response_latency : Latency
+    reorder : bool
+    max_fill : int or None
+    closed : bool
+        live orders are canceled at close, orders arriving later are rejected
+    orders : dict
+        order_id: [symbol, price, leaves_qty, direction, open_close, arrived, request_due, response_due,
+        sent_at, cancel_at, filled] of unfinished orders, sent or live
+    book : dict
+        symbol: ids of live orders
+    tops : dict
+        symbol: [bid, ask, bid_vol, ask_vol] left of the latest quote
+    finished : dict
+        order_id: order record of the latest finished orders, at most FINISHED_CACHE
+    net_fills : dict
+        symbol: volume bought minus volume sold
+    in_flight : int
+        events scheduled and not fired yet
+    latency : dict
+        'ack', 'fill', 'cancel': perf.Probe of virtual nanoseconds from sending an order to its first ack
+        and first fill, and from sending a cancel to its ack or reject
+    on_response : callable
+        on_response(response), called when a response reaches the strategy
+    on_idle : callable or None
+        called when no event is in flight
+    """
+
+    def __init__(self, loop, order_latency=None, response_latency=None, reorder=False, max_fill=None, seed=0):
+        self.loop = loop
+        self.rng = random.Random(seed)
+        self.order_latency = order_latency or Latency()
+        self.response_latency = response_latency or Latency()
+        self.reorder = reorder
+        self.max_fill = max_fill
+        self.closed = False
+        self.next_order_id = 1
+        self.orders = {}
+        self.book = {}
+        self.tops = {}
+        self.finished = {}
+        self.net_fills = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.max_orders = 0
+        self.n_events = 0
+        self.n_orders = 0
+        self.n_cancels = 0
+        self.n_fills = 0
+        self.latency = dict((name, Probe(name)) for name in LATENCIES)
+        self.on_response = None
+        self.on_idle = None
+
+    def schedule(self, due, callback, *args):
+        """call back at virtual time `due` as an event in flight"""
+        self.in_flight += 1
+        if self.in_flight > self.max_in_flight:
+            self.max_in_flight = self.in_flight
+        self.loop.call_at(due, self._fire, callback, args)
+
+    def _fire(self, callback, args):
+        self.in_flight -= 1
+        self.n_events += 1
+        try:
+            callback(*args)
+        finally:
+            if self.in_flight == 0 and self.on_idle is not None:
+                self.on_idle()
+
+    def _request(self, order, callback, order_id):
+        due = self.loop.time() + self.order_latency.sample(self.rng) / 1000.0
+        if not self.reorder:
+            due = max(due, order[ORD_REQUEST_DUE] + SEQUENCE_GAP)
+            order[ORD_REQUEST_DUE] = due
+        self.schedule(due, callback, order_id, order)
+
+    def _respond(self, order, response):
+        due = self.loop.time() + self.response_latency.sample(self.rng) / 1000.0
+        if not self.reorder:
+            due = max(due, order[ORD_RESPONSE_DUE] + SEQUENCE_GAP)
+            order[ORD_RESPONSE_DUE] = due
+        self.schedule(due, self._deliver, response, order)
+
+    def _reply(self, order_id, order, exe_price, exe_volume, status, error_no=0, error_info=''):
+        self._respond(order, Response(
+            order_id, order[ORD_SYMBOL], order[ORD_DIRECTION], order[ORD_OPEN_CLOSE], exe_price, exe_volume, status,
+            error_no, error_info
+        ))
+
+    def _deliver(self, response, order):
+        status = response.status
+        if status == ENTRUSTED:
+            self.latency['ack'].add(int((self.loop.time() - order[ORD_SENT_AT]) * 1e9))
+        elif status in FILLED:
+            if not order[ORD_FILLED]:
+                order[ORD_FILLED] = True
+                self.latency['fill'].add(int((self.loop.time() - order[ORD_SENT_AT]) * 1e9))
+        elif status in (CANCELED, CANCEL_REJECTED) and order[ORD_CANCEL_AT] is not None:
+            self.latency['cancel'].add(int((self.loop.time() - order[ORD_CANCEL_AT]) * 1e9))
+            order[ORD_CANCEL_AT] = None
+        self.on_response(response)
+
+    def _finish(self, order_id):
+        self.finished[order_id] = self.orders.pop(order_id)
+        if len(self.finished) > FINISHED_CACHE:
+            del self.finished[next(iter(self.finished))]
+
+    def send_order(self, symbol, price, size, direction, open_close):
+        order_id = self.next_order_id
+        self.next_order_id += 1
+        now = self.loop.time()
+        order = [symbol, price, size, int(direction), int(open_close), False, now, now, now, None, False]
+        self.orders[order_id] = order
+        if len(self.orders) > self.max_orders:
+            self.max_orders = len(self.orders)
+        self._request(order, self._arrive, order_id)
+        self.n_orders += 1
+        return order_id
+
+    def cancel_order(self, order_id):
+        order = self.orders.get(order_id) or self.finished.get(order_id)
+        if order is None:
+            return -1
+        order[ORD_CANCEL_AT] = self.loop.time()
+        self._request(order, self._arrive_cancel, order_id)
+        self.n_cancels += 1
+        return 0
+
+    def _arrive(self, order_id, order):
+        if self.closed:
+            self._finish(order_id)
+            self._reply(order_id, order, 0.0, 0, REJECTED, -1, 'market closed')
+            return
+        order[ORD_ARRIVED] = True
+        self._reply(order_id, order, 0.0, 0, ENTRUSTED)
+        symbol = order[ORD_SYMBOL]
+        self.book.setdefault(symbol, []).append(order_id)
+        top = self.tops.get(symbol)
+        if top is not None and self._execute(order_id, order, top):
+            self.book[symbol].remove(order_id)
+            self._finish(order_id)
+
+    def _arrive_cancel(self, order_id, order):
+        if order_id in self.orders and order[ORD_ARRIVED]:
+            self.book[order[ORD_SYMBOL]].remove(order_id)
+            self._finish(order_id)
+            self._reply(order_id, order, 0.0, 0, CANCELED)
+        elif order_id in self.orders:
+            # cancel overtook its order
+            self._reply(order_id, order, 0.0, 0, CANCEL_REJECTED, -1, 'order not found')
+        else:
+            self._reply(order_id, order, 0.0, 0, CANCEL_REJECTED, -1, 'order finished')
+
+    def _execute(self, order_id, order, top):
+        """trade an order against what is left of top of book, returns True if the order is filled"""
+        if order[ORD_DIRECTION] == BUY:
+            ask, ask_vol = top[1], top[3]
+            if ask <= 0 or order[ORD_PRICE] < ask or ask_vol <= 0:
+                return False
+            volume = min(order[ORD_LEAVES], ask_vol)
+            top[3] -= volume
+            price = ask
+            self.net_fills[order[ORD_SYMBOL]] = self.net_fills.get(order[ORD_SYMBOL], 0) + volume
+        else:
+            bid, bid_vol = top[0], top[2]
+            if bid <= 0 or order[ORD_PRICE] > bid or bid_vol <= 0:
+                return False
+            volume = min(order[ORD_LEAVES], bid_vol)
+            top[2] -= volume
+            price = bid
+            self.net_fills[order[ORD_SYMBOL]] = self.net_fills.get(order[ORD_SYMBOL], 0) - volume
+        order[ORD_LEAVES] -= volume
+        max_fill = self.max_fill or volume
+        while volume > 0:
+            qty = min(volume, max_fill)
+            volume -= qty
+            self.n_fills += 1
+            status = SUCCEED if volume == 0 and order[ORD_LEAVES] == 0 else PARTED
+            self._reply(order_id, order, price, qty, status)
+        return order[ORD_LEAVES] == 0
+
+    def on_quote(self, symbol, bid, ask, bid_vol, ask_vol):
+        """new top of book of symbol, live orders of symbol are matched against it"""
+        top = [bid, ask, bid_vol, ask_vol]
+        self.tops[symbol] = top
+        order_ids = self.book.get(symbol)
+        if not order_ids:
+            return
+        filled = [order_id for order_id in order_ids if self._execute(order_id, self.orders[order_id], top)]
+        for order_id in filled:
+            order_ids.remove(order_id)
+            self._finish(order_id)
+
+    def close(self):
+        """close the session, live orders are canceled"""
+        self.closed = True
+        for order_ids in self.book.values():
+            for order_id in order_ids:
+                order = self.orders[order_id]
+                self._finish(order_id)
+                self._reply(order_id, order, 0.0, 0, CANCELED, 0, 'market closed')
+            del order_ids[:]
+
+
+class AsyncGateway(object):
+    """Replay ticks through a strategy on a `VirtualTimeLoop` with an `AsyncExchange`
+
+    Each tick updates the book of the exchange at its time and reaches `on_book` `quote_delay` ms later.
+    After the last tick the session closes and the loop runs until no event is in flight, so every order
+    is finished. Exceptions raised in callbacks stop the replay unless `strict` is False, in which case
+    they are collected in `errors`. A gateway runs once.
+
+    Attributes
+    ----------
+    strategy : object
+        module or object with on_init(context, config_type, config), on_book(context, quote_type, quote)
+        and on_response(context, response_type, response)
+    config : object
+        passed to on_init, i.e. from `replay.make_config`
+    ticks : numpy.ndarray
+        replay.TICK_DTYPE sorted by time
+    symbols : list
+        sid -> symbol
+    quote_type : {0, 1}
+    quote_delay : float
+        milliseconds
+    loop : VirtualTimeLoop
+    exchange : AsyncExchange
+    context : Struct
+        context of strategy, `context.sim_exchange` is the `AsyncExchange`
+    timing : dict
+        callback: perf.Probe of wall nanoseconds
+    errors : list
+        exceptions raised in callbacks
+    """
+    CALLBACKS = ('on_init', 'on_book', 'on_response')
+
+    def __init__(self, strategy, config, ticks, symbols, quote_type=0, order_latency=None, response_latency=None,
+                 quote_delay=0.0, reorder=False, max_fill=None, seed=0, config_type=0, strict=True):
+        self.strategy = strategy
+        self.config = config
+        self.config_type = config_type
+        self.ticks = ticks
+        self.symbols = list(symbols)
+        self.quote_type = quote_type
+        self.quote_delay = quote_delay
+        self.strict = strict
+        self.loop = VirtualTimeLoop()
+        self.loop.set_exception_handler(self._on_error)
+        self.exchange = AsyncExchange(self.loop, order_latency, response_latency, reorder, max_fill, seed)
+        self.exchange.on_response = self._on_response
+        self.context = Struct(sim_exchange=self.exchange)
+        self.timing = dict((name, Probe(name)) for name in self.CALLBACKS)
+        self.errors = []
+        self._idle = None
+
+    def _on_error(self, loop, context):
+        self.errors.append(context.get('exception') or RuntimeError(context['message']))
+        if self.strict:
+            loop.stop()
+
+    def _call_inline(self, name, callback, *args):
+        """call a callback from the feed coroutine, its exception is handled like one of a loop callback
+
+        Returns
+        -------
+        ok : bool
+            False if the callback raised and the replay stops
+
+        """
+        try:
+            callback(*args)
+        except Exception as e:
+            self._on_error(self.loop, {'exception': e, 'message': 'exception in {}'.format(name)})
+            return not self.strict
+        return True
+
+    def _on_init(self):
+        start = perf_counter_ns()
+        self.strategy.on_init(self.context, self.config_type, self.config)
+        self.timing['on_init'].add(perf_counter_ns() - start)
+
+    def _on_response(self, response):
+        start = perf_counter_ns()
+        self.strategy.on_response(self.context, 0, response)
+        self.timing['on_response'].add(perf_counter_ns() - start)
+
+    def _on_book(self, quote):
+        start = perf_counter_ns()
+        self.strategy.on_book(self.context, self.quote_type, quote)
+        self.timing['on_book'].add(perf_counter_ns() - start)
+
+    def _new_quote(self, symbol):
+        return Struct(
+            symbol=symbol, ticker=symbol, int_time=0, exch_time=0, feed_type=0, last_px=0.0,
+            bp_array=[], ap_array=[], bv_array=[], av_array=[], total_vol=0, total_notional=0.0,
+            open_interest=0, upper_limit_px=0.0, lower_limit_px=0.0
+        )
+
+    async def _feed(self):
+        loop = self.loop
+        exchange = self.exchange
+        symbols = self.symbols
+        delay = self.quote_delay / 1000.0
+        # quotes are reused unless delayed, a delayed quote may still be in flight at the next tick
+        quotes = [self._new_quote(symbol) for symbol in symbols]
+        int_time_to_ms = BarGenerator.int_time_to_ms
+        for offset in range(0, len(self.ticks), CHUNK_SIZE):
+            chunk = self.ticks[offset:offset + CHUNK_SIZE]
+            for (sid, int_time, last_px, bp, ap, bv, av, total_vol, total_notional, open_interest,
+                 upper_limit_px, lower_limit_px) in zip(*[chunk[name].tolist() for name in TICK_DTYPE.names]):
+                now = int_time_to_ms(int_time) / 1000.0
+                if now > loop.time():
+                    await asyncio.sleep(now - loop.time())
+                symbol = symbols[sid]
+                quote = quotes[sid] if delay <= 0 else self._new_quote(symbol)
+                quote.int_time = quote.exch_time = int_time
+                quote.last_px = last_px
+                quote.bp_array = bp
+                quote.ap_array = ap
+                quote.bv_array = bv
+                quote.av_array = av
+                quote.total_vol = total_vol
+                quote.total_notional = total_notional
+                quote.open_interest = open_interest
+                quote.upper_limit_px = upper_limit_px
+                quote.lower_limit_px = lower_limit_px
+                exchange.on_quote(symbol, bp[0], ap[0], bv[0], av[0])
+                if delay > 0:
+                    exchange.schedule(loop.time() + delay, self._on_book, quote)
+                elif not self._call_inline('on_book', self._on_book, quote):
+                    return False
+        return True
+
+    async def _main(self):
+        self._idle = asyncio.Event()
+        self.exchange.on_idle = self._idle.set
+        if not self._call_inline('on_init', self._on_init):
+            return
+        if not await self._feed():
+            return
+        if self.exchange.in_flight:
+            # quotes delayed past the last tick reach the strategy before the close
+            self._idle.clear()
+            await self._idle.wait()
+        self.exchange.close()
+        if self.exchange.in_flight:
+            self._idle.clear()
+            await self._idle.wait()
+
+    def run(self):
+        """replay all ticks and drain all events
+
+        Returns
+        -------
+        stats : dict
+            ticks, orders, cancels, fills, responses, events, seconds of wall time, virtual_seconds and
+            speedup over real time, events_per_sec and orders_per_sec of wall time, max_in_flight events,
+            max_orders unfinished at once, errors, `<callback>_ns` average and `<callback>_p99_ns` 99th
+            percentile wall nanoseconds of each callback, `<latency>_p50_ms`, `<latency>_p99_ms` and
+            `<latency>_max_ms` virtual milliseconds of 'ack', 'fill' and 'cancel'
+
+        """
+        loop = self.loop
+        exchange = self.exchange
+        if len(self.ticks):
+            loop.virtual_time = BarGenerator.int_time_to_ms(int(self.ticks['int_time'][0])) / 1000.0
+        virtual_start = loop.time()
+        begin = clock()
+        try:
+            loop.run_until_complete(self._main())
+        except RuntimeError:
+            if not self.errors:
+                raise
+        finally:
+            loop.close()
+        seconds = clock() - begin
+        if self.errors and self.strict:
+            raise self.errors[0]
+
+        virtual_seconds = loop.time() - virtual_start
+        stats = {
+            'ticks': len(self.ticks), 'orders': exchange.n_orders, 'cancels': exchange.n_cancels,
+            'fills': exchange.n_fills, 'responses': self.timing['on_response'].count, 'events': exchange.n_events,
+            'seconds': seconds, 'virtual_seconds': virtual_seconds,
+            'speedup': virtual_seconds / seconds if seconds > 0 else 0.0,
+            'events_per_sec': exchange.n_events / seconds if seconds > 0 else 0.0,
+            'orders_per_sec': exchange.n_orders / seconds if seconds > 0 else 0.0,
+            'max_in_flight': exchange.max_in_flight, 'max_orders': exchange.max_orders, 'errors': len(self.errors)
+        }
+        for name, probe in self.timing.items():
+            stats[name + '_ns'] = probe.total / float(probe.count) if probe.count else 0.0
+            stats[name + '_p99_ns'] = probe.percentile(99)
+        for name, probe in exchange.latency.items():
+            stats[name + '_p50_ms'] = probe.percentile(50) / 1e6
+            stats[name + '_p99_ms'] = probe.percentile(99) / 1e6
+            stats[name + '_max_ms'] = probe.max / 1e6
+        return stats
+
+
+class TrackedOrder(SyncOrder):
+    """`SyncOrder` which also records sends and cancels in an `OrdMgr`, delayed orders included
+
+    Attributes
+    ----------
+    ordmgr : OrdMgr
+    working : dict
+        symbol: dict of order ids sent, in order of sending, ids no longer active are pruned by the user
+    """
+
+    def __init__(self, context, config, ordmgr):
+        super(TrackedOrder, self).__init__(context, config)
+        self.ordmgr = ordmgr
+        self.working = {}
+
+    def send_single_order(self, symbol, price, size, direction, open_close, *args, **kwargs):
+        order_id = SyncOrder.send_single_order(self, symbol, price, size, direction, open_close, *args, **kwargs)
+        if order_id > 0:
+            self.ordmgr.send_order(order_id, symbol, price, size, direction, open_close)
+            self.working.setdefault(symbol, {})[order_id] = None
+        return order_id
+
+    def cancel_single_order(self, order_id):
+        ret = SyncOrder.cancel_single_order(self, order_id)
+        if ret == 0 and order_id in self.ordmgr.orders:
+            self.ordmgr.cancel_order(order_id)
+        return ret
+
+
+class Churn(object):
+    """stress strategy: on every tick, cancel each working order of the symbol with probability `cancel_ratio`
+    and send `orders_per_tick` orders of random side and size up to `max_size`, at the near touch, the far
+    touch or one tick through it, within `max_pos` lots of net position
+
+    Orders are sent with `TrackedOrder`, so orders sent while a cancel is pending are delayed by `SyncOrder`
+    until the cancel is confirmed. Responses go to `PosMgrBase`, to `OrdMgr` while it still has the order and
+    to `SyncOrder`.
+    """
+
+    def __init__(self, orders_per_tick=4, max_size=10, cancel_ratio=0.5, max_pos=50, tick_size=0.2, seed=0):
+        self.orders_per_tick = orders_per_tick
+        self.max_size = max_size
+        self.cancel_ratio = cancel_ratio
+        self.max_pos = max_pos
+        self.tick_size = tick_size
+        self.seed = seed
+
+    def on_init(self, context, config_type, config):
+        context.posmgr = PosMgrBase()
+        context.posmgr.init_position(config_type, config)
+        context.ordmgr = OrdMgr()
+        context.order = TrackedOrder(context, config, context.ordmgr)
+        context.order.info = context.order.nil
+        context.rng = random.Random(self.seed)
+        context.late_responses = 0
+
+    def on_book(self, context, quote_type, quote):
+        posmgr = context.posmgr
+        order = context.order
+        rng = context.rng
+        symbol = quote.symbol if quote_type == 0 else quote.ticker
+        posmgr.update_last_px(quote_type, quote)
+        working = order.working.get(symbol, {})
+        for order_id in list(working):
+            active = order.active_orders.get(order_id)
+            if active is None:
+                del working[order_id]
+            elif not active['pending_cancel'] and rng.random() < self.cancel_ratio:
+                order.cancel_single_order(order_id)
+        long_pos = posmgr.get_long_position(symbol)
+        short_pos = posmgr.get_short_position(symbol)
+        net = long_pos - short_pos
+        for _ in range(self.orders_per_tick):
+            size = rng.randint(1, self.max_size)
+            # 0 at the near touch, 1 at the far touch, 2 one tick through
+            level = rng.randint(0, 2) * self.tick_size
+            buy = rng.random() < 0.5
+            if buy and net + size > self.max_pos:
+                buy = False
+            elif not buy and net - size < -self.max_pos:
+                buy = True
+            if buy:
+                order.send_single_order(symbol, round(quote.bp_array[0] + level, 6), size, BUY,
+                                        CLOSE if short_pos >= size else OPEN)
+            else:
+                order.send_single_order(symbol, round(quote.ap_array[0] - level, 6), size, SELL,
+                                        CLOSE if long_pos >= size else OPEN)
+
+    def on_response(self, context, response_type, response):
+        context.posmgr.update_position(response_type, response)
+        if response.order_id in context.ordmgr.orders:
+            context.ordmgr.on_response(response_type, response)
+        else:
+            context.late_responses += 1
+        context.order.on_response(response_type, response)
+
+    @staticmethod
+    def check(context):
+        """state of order and position modules against the exchange once all events are drained
+
+        Returns
+        -------
+        stats : dict
+            position_breaks symbols whose net position differs from fills of the exchange, open_sync_orders
+            and open_ordmgr_orders left unfinished, delayed_orders never sent, late_responses of orders
+            `OrdMgr` had already finished, i.e. cancel rejects after fills
+
+        """
+        posmgr = context.posmgr
+        net_fills = context.sim_exchange.net_fills
+        breaks = [symbol for symbol in posmgr.contract_info
+                  if posmgr.get_long_position(symbol) - posmgr.get_short_position(symbol) != net_fills.get(symbol, 0)]
+        return {
+            'position_breaks': len(breaks), 'open_sync_orders': len(context.order.active_orders),
+            'open_ordmgr_orders': len(context.ordmgr.orders),
+            'delayed_orders': sum(len(orders) for orders in context.order.delayed_orders.values()),
+            'late_responses': context.late_responses
+        }
+
+
+def stress(n_symbols=20, n_ticks=1000, interval=500, order_latency=None, response_latency=None, quote_delay=0.0,
+           reorder=False, max_fill=None, seed=0, **kwargs):
+    """run `Churn` on synthetic ticks through an `AsyncGateway`
+
+    Parameters
+    ----------
+    n_symbols : int
+    n_ticks : int
+        ticks of each symbol
+    interval : int
+        milliseconds between ticks of a symbol
+    order_latency, response_latency : Latency or None
+        1 ms constant if None
+    quote_delay : float
+        milliseconds
+    reorder : bool
+    max_fill : int or None
+    seed : int
+    kwargs : dict
+        parameters of `Churn`
+
+    Returns
+    -------
+    stats : dict
+        `AsyncGateway.run` and `Churn.check`
+
+    """
+    symbols = ['f{:04d}'.format(i) for i in range(n_symbols)]
+    ticks = synthetic_ticks(n_symbols, n_ticks, seed=seed, interval=interval)
+    gateway = AsyncGateway(Churn(seed=seed, **kwargs), make_config(symbols, exch='SHFE', multiple=10), ticks, symbols,
+                           order_latency=order_latency, response_latency=response_latency, quote_delay=quote_delay,
+                           reorder=reorder, max_fill=max_fill, seed=seed)
+    stats = gateway.run()
+    stats.update(Churn.check(gateway.context))
+    return stats
+
+
+def format_stats(stats):
+    """format stats of `stress` as text"""
+    lines = [
+        '{} ticks, {} orders, {} cancels, {} fills, {} responses, {} events'.format(
+            stats['ticks'], stats['orders'], stats['cancels'], stats['fills'], stats['responses'], stats['events']),
+        '{:.2f}s wall for {:.1f}s virtual ({:.0f}x), {:.0f} events/s, {:.0f} orders/s'.format(
+            stats['seconds'], stats['virtual_seconds'], stats['speedup'], stats['events_per_sec'],
+            stats['orders_per_sec']),
+        'at most {} events in flight, {} orders unfinished'.format(stats['max_in_flight'], stats['max_orders']),
+        '',
+        '{:<20}{:>12}{:>12}{:>12}'.format('latency', 'p50 ms', 'p99 ms', 'max ms'),
+    ]
+    for name in LATENCIES:
+        lines.append('{:<20}{:>12.3f}{:>12.3f}{:>12.3f}'.format(
+            name, stats[name + '_p50_ms'], stats[name + '_p99_ms'], stats[name + '_max_ms']))
+    lines.append('')
+    lines.append('{:<20}{:>12}{:>12}'.format('callback', 'mean ns', 'p99 ns'))
+    for name in AsyncGateway.CALLBACKS:
+        lines.append('{:<20}{:>12.0f}{:>12}'.format(name, stats[name + '_ns'], stats[name + '_p99_ns']))
+    if 'position_breaks' in stats:
+        lines.append('')
+        for name in ('errors', 'position_breaks', 'open_sync_orders', 'open_ordmgr_orders', 'delayed_orders',
+                     'late_responses'):
+            lines.append('{:<20}{:>12}'.format(name, stats[name]))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='stress order and position modules through an asyncio gateway')
+    parser.add_argument('--symbols', type=int, default=20)
+    parser.add_argument('--ticks', type=int, default=1000, help='ticks of each symbol')
+    parser.add_argument('--interval', type=int, default=500, help='milliseconds between ticks of a symbol')
+    parser.add_argument('--order-latency', type=Latency.parse, default=Latency('lognormal', (1.0, 0.5)),
+                        help="i.e. '1', 'uniform:0.5,3', 'exponential:1', 'lognormal:1,0.5' in ms")
+    parser.add_argument('--response-latency', type=Latency.parse, default=Latency('lognormal', (1.0, 0.5)))
+    parser.add_argument('--quote-delay', type=float, default=0.0, help='milliseconds')
+    parser.add_argument('--reorder', action='store_true', help='messages of an order may overtake each other')
+    parser.add_argument('--max-fill', type=int, default=None, help='largest lots of one fill')
+    parser.add_argument('--orders-per-tick', type=int, default=4)
+    parser.add_argument('--max-size', type=int, default=10)
+    parser.add_argument('--cancel-ratio', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print stats as json')
+    args = parser.parse_args(argv)
+    stats = stress(args.symbols, args.ticks, args.interval, args.order_latency, args.response_latency,
+                   args.quote_delay, args.reorder, args.max_fill, args.seed, orders_per_tick=args.orders_per_tick,
+                   max_size=args.max_size, cancel_ratio=args.cancel_ratio)
+    print (json.dumps(stats, indent=2, sort_keys=True) if args.json else format_stats(stats))
+    return 1 if stats['position_breaks'] or stats['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""Lot level FIFO position ledger
+
+Each open fill is kept as a lot (qty, price, open_time) in per-symbol, per-side deques, yesterday
+and today lots separately. Close fills consume lots from the front, so a fill is matched in
+amortized O(1), and give exact realized pnl per lot, holding period and the close today/close
+yesterday split. Attached to a position manager, the ledger replaces the approximate handling of
+yesterday position in `PosMgrBase.update_position`.
+"""
+from collections import deque
+
+from bar import BarGenerator
+from consts import (BUY, SELL, OPEN, CLOSE_TOD, CLOSE_YES)
+
+"""Constants
+"""
+LONG = 0
+SHORT = 1
+# index of lot
+QTY = 0
+PRICE = 1
+OPEN_TIME = 2
+# open time of lots opened before the session of the ledger, i.e. yesterday lots and lots seeded by
+# `attach`, which are left out of holding periods
+UNKNOWN_TIME = -1
+
+
+class LotLedger(object):
+    """FIFO ledger of open lots
+
+    Attributes
+    ----------
+    lots : dict
+        symbol: [[yes_long, today_long], [yes_short, today_short]], deques of lots [qty, price, open_time].
+        open_time of yesterday lots and seeded lots is UNKNOWN_TIME
+    realized : dict
+        symbol: realized pnl by points of closed lots, fees excluded
+    closed_qty : dict
+        symbol: volume closed
+    held_qty : dict
+        symbol: volume closed from lots of known open time
+    holding_ms : dict
+        symbol: sum of volume closed from lots of known open time * holding milliseconds
+    now : int
+        int time of current quote, used as open/close time of lots
+    max_lots : int or None
+        max number of today lots of each side, the two latest lots are merged when exceeded
+    """
+
+    def __init__(self, max_lots=None):
+        self.lots = {}
+        self.realized = {}
+        self.closed_qty = {}
+        self.held_qty = {}
+        self.holding_ms = {}
+        self.now = 0
+        self.max_lots = max_lots
+
+    def _init_symbol(self, symbol):
+        self.lots[symbol] = [[deque(), deque()], [deque(), deque()]]
+        self.realized[symbol] = 0.0
+        self.closed_qty[symbol] = 0
+        self.held_qty[symbol] = 0
+        self.holding_ms[symbol] = 0
+
+    def attach(self, posmgr):
+        """seed lots from current positions of position manager and feed its fills to the ledger,
+        should be called after `init_position`
+
+        Parameters
+        ----------
+        posmgr : PosMgrBase
+
+        Returns
+        -------
+        None
+
+        """
+        for symbol in posmgr.contract_info:
+            self._init_symbol(symbol)
+            yes_position = posmgr.get_yes_position(symbol)
+            for side, key, direction, total in (
+                    (LONG, 'long', BUY, posmgr.get_long_position(symbol)),
+                    (SHORT, 'short', SELL, posmgr.get_short_position(symbol))):
+                yes_pos = yes_position[key]['pos']
+                if yes_pos > 0:
+                    yes_price = yes_position[key]['notional'] / yes_pos
+                    self.lots[symbol][side][0].append([yes_pos, yes_price, UNKNOWN_TIME])
+                today_pos = total - yes_pos
+                if today_pos > 0:
+                    today_notional = total * posmgr.get_avg_position_price(symbol, direction) - \
+                        yes_position[key]['notional']
+                    self.lots[symbol][side][1].append([today_pos, today_notional / today_pos, UNKNOWN_TIME])
+        posmgr.lot_ledger = self
+
+    def open(self, symbol, side, qty, price):
+        """add an open fill as a today lot, coalesced with the latest lot at the same price
+
+        Parameters
+        ----------
+        symbol : str
+        side : {LONG, SHORT}
+        qty : int
+        price : float
+
+        Returns
+        -------
+        None
+
+        """
+        if symbol not in self.lots:
+            self._init_symbol(symbol)
+        today = self.lots[symbol][side][1]
+        if today and today[-1][PRICE] == price:
+            today[-1][QTY] += qty
+            return
+        today.append([qty, price, self.now])
+        if self.max_lots is not None and len(today) > self.max_lots:
+            last = today.pop()
+            lot = today[-1]
+            qty = lot[QTY] + last[QTY]
+            lot[PRICE] = (lot[QTY] * lot[PRICE] + last[QTY] * last[PRICE]) / qty
+            lot[QTY] = qty
+
+    def _consume(self, symbol, side, lots, qty, price):
+        """close up to qty from the front of lots, return (closed qty, cost)"""
+        closed, cost = 0, 0.0
+        now_ms = BarGenerator.int_time_to_ms(self.now)
+        held, holding_ms = 0, 0
+        while qty > 0 and lots:
+            lot = lots[0]
+            matched = lot[QTY] if lot[QTY] <= qty else qty
+            closed += matched
+            cost += matched * lot[PRICE]
+            if lot[OPEN_TIME] != UNKNOWN_TIME:
+                held += matched
+                holding_ms += matched * (now_ms - BarGenerator.int_time_to_ms(lot[OPEN_TIME]))
+            qty -= matched
+            if matched == lot[QTY]:
+                lots.popleft()
+            else:
+                lot[QTY] -= matched
+        if closed:
+            pnl = closed * price - cost
+            self.realized[symbol] += pnl if side == LONG else -pnl
+            self.closed_qty[symbol] += closed
+            self.held_qty[symbol] += held
+            self.holding_ms[symbol] += holding_ms
+        return closed, cost
+
+    def close(self, symbol, side, qty, price, open_close, close_yes_first=True):
+        """match a close fill against open lots of given side
+
+        Parameters
+        ----------
+        symbol : str
+        side : {LONG, SHORT}
+            side of position being closed
+        qty : int
+        price : float
+        open_close : int
+            CLOSE_YES closes yesterday lots first, CLOSE_TOD closes today lots first
+        close_yes_first : bool
+            for CLOSE, close yesterday lots first
+
+        Returns
+        -------
+        yes_qty : int
+            volume of yesterday lots closed
+        yes_notional : float
+            cost of yesterday lots closed
+
+        """
+        if symbol not in self.lots:
+            self._init_symbol(symbol)
+        yes_lots, today_lots = self.lots[symbol][side]
+        # volume beyond lots of the requested kind is matched against the other kind
+        if open_close == CLOSE_YES or (open_close != CLOSE_TOD and close_yes_first):
+            yes_qty, yes_notional = self._consume(symbol, side, yes_lots, qty, price)
+            self._consume(symbol, side, today_lots, qty - yes_qty, price)
+        else:
+            today_qty, _ = self._consume(symbol, side, today_lots, qty, price)
+            yes_qty, yes_notional = self._consume(symbol, side, yes_lots, qty - today_qty, price)
+        return yes_qty, yes_notional
+
+    def on_fill(self, response, close_yes_first=True):
+        """update lots on filled response
+
+        Parameters
+        ----------
+        response : response
+        close_yes_first : bool
+
+        Returns
+        -------
+        split : tuple or None
+            (yes_qty, yes_notional) closed for close fills, None for open fills
+
+        """
+        if response.open_close == OPEN:
+            side = LONG if response.direction == BUY else SHORT
+            self.open(response.symbol, side, response.exe_volume, response.exe_price)
+            return None
+        side = SHORT if response.direction == BUY else LONG
+        return self.close(response.symbol, side, response.exe_volume, response.exe_price, response.open_close,
+                          close_yes_first)
+
+    def settle(self, symbol, settle_px=None):
+        """roll today lots into yesterday lots at end of day
+
+        Parameters
+        ----------
+        symbol : str
+        settle_px : float or None
+            if given, all lots are marked to settlement price and coalesced into one lot
+
+        Returns
+        -------
+        None
+
+        """
+        if symbol not in self.lots:
+            return
+        for yes_lots, today_lots in self.lots[symbol]:
+            for lot in today_lots:
+                lot[OPEN_TIME] = UNKNOWN_TIME
+            yes_lots.extend(today_lots)
+            today_lots.clear()
+            if settle_px is not None and yes_lots:
+                qty = sum(lot[QTY] for lot in yes_lots)
+                yes_lots.clear()
+                yes_lots.append([qty, settle_px, UNKNOWN_TIME])
+
+    def get_lots(self, symbol, side):
+        """open lots of given side in FIFO order
+
+        Parameters
+        ----------
+        symbol : str
+        side : {LONG, SHORT}
+
+        Returns
+        -------
+        lots : list
+            (qty, price, open_time, is_yesterday)
+            open_time is UNKNOWN_TIME for yesterday lots and lots seeded by `attach`
+
+        """
+        yes_lots, today_lots = self.lots[symbol][side]
+        return [(lot[QTY], lot[PRICE], lot[OPEN_TIME], True) for lot in yes_lots] + \
+            [(lot[QTY], lot[PRICE], lot[OPEN_TIME], False) for lot in today_lots]
+
+    def get_position(self, symbol, side):
+        """open volume of given side
+
+        Parameters
+        ----------
+        symbol : str
+        side : {LONG, SHORT}
+
+        Returns
+        -------
+        yes_qty : int
+        today_qty : int
+
+        """
+        yes_lots, today_lots = self.lots[symbol][side]
+        return sum(lot[QTY] for lot in yes_lots), sum(lot[QTY] for lot in today_lots)
+
+    def get_realized_pnl(self, symbol):
+        """realized pnl by points of closed lots, fees excluded
+
+        Parameters
+        ----------
+        symbol : str
+
+        Returns
+        -------
+        pnl : float
+
+        """
+        return self.realized[symbol]
+
+    def get_avg_holding_ms(self, symbol):
+        """volume weighted average holding period of closed lots, lots of unknown open time excluded
+
+        Parameters
+        ----------
+        symbol : str
+
+        Returns
+        -------
+        holding : float
+            milliseconds, 0 if no lot of known open time closed
+
+        """
+        if self.held_qty[symbol] == 0:
+            return 0.0
+        return self.holding_ms[symbol] / float(self.held_qty[symbol])
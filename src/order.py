@@ -1,15 +1,15 @@
-import numpy as np
-
 try:
     """Configuration for Simulation
     Under Linux simulation, api in included as part of strategy
     by cython, therefore anything from api module should not included.
     """
-    from my.sdp.api import (Direction, OpenClose, OrderStatus,
-                            InvestorType, OrderType, TIF)
+    from my.sdp.api import (InvestorType, OrderType, TIF)
 except ImportError:
     pass
 
+from consts import (BUY, SELL, INIT, ENTRUSTED, SUCCEED, CANCELED, REJECTED, INTERREJECTED, CANCEL_REJECTED,
+                    FILLED)
+
 
 class OrdMgr(object):
     """Order management
@@ -35,7 +35,7 @@ class OrdMgr(object):
             self.cum_qty = 0
             self.cum_amount = 0
             self.pending_cancel = False
-            self.status = OrderStatus.INIT.value
+            self.status = INIT
 
         @property
         def leaves_qty(self):
@@ -50,7 +50,7 @@ class OrdMgr(object):
         def left_to_buy(self):
             """quantity left to buy
             """
-            if self.direction == Direction.BUY.value:
+            if self.direction == BUY:
                 return self.leaves_qty
             else:
                 return 0
@@ -59,7 +59,7 @@ class OrdMgr(object):
         def left_to_sell(self):
             """quantity left to sell
             """
-            if self.direction == Direction.SELL.value:
+            if self.direction == SELL:
                 return self.leaves_qty
             else:
                 return 0
@@ -79,14 +79,14 @@ class OrdMgr(object):
             None
 
             """
-            if response.status in (OrderStatus.SUCCEED.value, OrderStatus.PARTED.value):
+            if response.status in FILLED:
                 if response.exe_volume == 0:
                     return
                 self.cum_amount += response.exe_volume * response.exe_price
                 self.cum_qty += response.exe_volume
                 self.last_px = response.exe_price
                 self.last_qty = response.exe_volume
-            if self.status != OrderStatus.INIT.value and response.status == OrderStatus.ENTRUSTED.value:
+            if self.status != INIT and response.status == ENTRUSTED:
                 pass    # If already entrusted, no need to update response status
             else:
                 self.status = response.status
@@ -146,25 +146,24 @@ class OrdMgr(object):
 
         """
         # calculate pos
-        if response.status in (OrderStatus.SUCCEED.value, OrderStatus.PARTED.value) and response.exe_volume == 0:
+        if response.status in FILLED and response.exe_volume == 0:
             return
 
         order = self.orders[response.order_id]
         order.update(response_type, response)
 
-        if order.status != OrderStatus.INIT.value and response.status == OrderStatus.ENTRUSTED.value:
+        if order.status != INIT and response.status == ENTRUSTED:
             # If already entrusted, no need to call update_order_list()
             pass
         else:
             order.status = response.status
 
         # delete order from dict once finished
-        if response.status == OrderStatus.SUCCEED.value and order.last_qty > 0:
+        if response.status == SUCCEED and order.last_qty > 0:
             self.orders.pop(response.order_id)
-        elif response.status == OrderStatus.CANCELED.value:
+        elif response.status == CANCELED:
             self.orders.pop(response.order_id)
-        elif response.status in (OrderStatus.REJECTED.value,
-                                 OrderStatus.INTERREJECTED.value, OrderStatus.CANCEL_REJECTED.value):
+        elif response.status in (REJECTED, INTERREJECTED, CANCEL_REJECTED):
             if self.orders[response.order_id].pending_cancel is True:
                 self.orders[response.order_id].pending_cancel = False
             else:
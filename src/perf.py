@@ -0,0 +1,293 @@
+"""Low-overhead profiling probes for strategy callbacks
+
+`Profiler.instrument` wraps the public entry points of `BarGenerator`, `OrdMgr`, `SyncOrder`
+and `PosMgrBase` instances (and `Profiler.wrap_function` the strategy's own functions) with
+probes timed by `perf_counter_ns`. Each probe keeps count, total, max and a fixed size log
+histogram, from which percentiles are read. When `Profiler.enabled` is False a probe costs one
+attribute check before calling the original method.
+
+Times are inclusive, i.e. `BarGenerator.process_bar_data` includes the `on_book` callback of bars.
+Instances should be instrumented before their methods are captured, i.e. by `QuoteDispatcher.add_posmgr`.
+"""
+from functools import wraps
+
+from bar import BarGenerator
+
+try:
+    from time import perf_counter_ns
+except ImportError:
+    from time import perf_counter
+
+    def perf_counter_ns():
+        return int(perf_counter() * 1e9)
+
+"""Constants
+"""
+# 4 buckets per power of 2, relative error of a bucket is at most 25%
+SUB_BITS = 2
+SUB_BUCKETS = 1 << SUB_BITS
+N_BUCKETS = SUB_BUCKETS * 62
+# public entry points probed by `Profiler.instrument`, looked up by class names along the mro
+ENTRY_POINTS = {
+    'BarGenerator': ('process_bar_data', 'update_bar'),
+    'SyncBarGenerator': ('process_bar_data', 'update_bar', 'flush'),
+    'DepthFeatures': ('process_depth_data', 'update_depth', 'update_depth_batch'),
+    'OrdMgr': ('send_order', 'cancel_order', 'on_response'),
+    'SyncOrder': ('send_single_order', 'cancel_single_order', 'on_response'),
+    'PosMgrBase': ('update_position', 'update_last_px', 'set_last_px', 'update_cash_on_order',
+                   'update_cash_on_response', 'get_strategy_pnl_cash', 'get_account_pnl_cash', 'settle'),
+}
+
+
+def bucket_index(ns):
+    """histogram bucket of a duration in nanoseconds"""
+    if ns < SUB_BUCKETS:
+        return ns if ns > 0 else 0
+    bits = ns.bit_length()
+    index = (bits - SUB_BITS) * SUB_BUCKETS + (ns >> (bits - SUB_BITS - 1)) - SUB_BUCKETS
+    return index if index < N_BUCKETS else N_BUCKETS - 1
+
+
+def bucket_upper(index):
+    """largest duration in nanoseconds of histogram bucket"""
+    if index < SUB_BUCKETS:
+        return index
+    bits = index // SUB_BUCKETS + SUB_BITS
+    top = index % SUB_BUCKETS + SUB_BUCKETS
+    return ((top + 1) << (bits - SUB_BITS - 1)) - 1
+
+
+class Probe(object):
+    """timing counters of one probe
+
+    Attributes
+    ----------
+    name : str
+    count : int
+    total : int
+        nanoseconds
+    max : int
+        nanoseconds
+    buckets : list
+        histogram of N_BUCKETS counts, see `bucket_index`
+    """
+    __slots__ = ('name', 'count', 'total', 'max', 'buckets')
+
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = [0] * N_BUCKETS
+
+    def add(self, ns):
+        """record one duration in nanoseconds"""
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+        self.buckets[bucket_index(ns)] += 1
+
+    def percentile(self, q):
+        """upper bound of the q-th percentile in nanoseconds, capped by max
+
+        Parameters
+        ----------
+        q : float
+            i.e. 99
+
+        Returns
+        -------
+        ns : int
+
+        """
+        if self.count == 0:
+            return 0
+        rank = self.count * q / 100.0
+        cum = 0
+        for index, n in enumerate(self.buckets):
+            cum += n
+            if n and cum >= rank:
+                return min(bucket_upper(index), self.max)
+        return self.max
+
+    def snapshot(self):
+        """
+        Returns
+        -------
+        stats : dict
+            count, total_ns, mean_ns, max_ns, p50_ns, p99_ns
+
+        """
+        return {
+            'count': self.count, 'total_ns': self.total,
+            'mean_ns': self.total / float(self.count) if self.count else 0.0,
+            'max_ns': self.max, 'p50_ns': self.percentile(50), 'p99_ns': self.percentile(99)
+        }
+
+
+class Profiler(object):
+    """Probes of callbacks
+
+    Attributes
+    ----------
+    enabled : bool
+        probes are timed only when enabled
+    probes : dict
+        name: Probe
+    interval : int
+        milliseconds between two snapshots of `poll`
+    wrapped : list
+        (obj, method name) of instrumented methods
+    """
+
+    def __init__(self, enabled=True, interval=300000):
+        self.enabled = enabled
+        self.interval = interval
+        self.probes = {}
+        self.wrapped = []
+        self.last_poll_ms = None
+
+    def probe(self, name):
+        """probe of given name, created if not exists"""
+        if name not in self.probes:
+            self.probes[name] = Probe(name)
+        return self.probes[name]
+
+    def wrap_function(self, func, name=None):
+        """wrap a function with a probe
+
+        Parameters
+        ----------
+        func : callable
+            i.e. on_book of strategy
+        name : str
+            name of probe, `func.__name__` by default
+
+        Returns
+        -------
+        wrapped : callable
+
+        """
+        probe = self.probe(name or func.__name__)
+        profiler = self
+
+        @wraps(func)
+        def wrapped(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            start = perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                probe.add(perf_counter_ns() - start)
+        return wrapped
+
+    def wrap(self, obj, method, name=None):
+        """wrap a method of an instance with a probe, other instances are not affected
+
+        Parameters
+        ----------
+        obj : object
+        method : str
+        name : str
+            name of probe, '<class name>.<method>' by default
+
+        Returns
+        -------
+        None
+
+        """
+        if method in obj.__dict__:
+            return  # already wrapped
+        name = name or '{}.{}'.format(type(obj).__name__, method)
+        setattr(obj, method, self.wrap_function(getattr(obj, method), name))
+        self.wrapped.append((obj, method))
+
+    def instrument(self, obj, methods=None):
+        """wrap public entry points of an instance
+
+        Parameters
+        ----------
+        obj : BarGenerator, OrdMgr, SyncOrder or PosMgrBase
+        methods : list
+            methods to wrap, by ENTRY_POINTS of its class if None
+
+        Returns
+        -------
+        None
+
+        """
+        if methods is None:
+            methods = ()
+            for cls in type(obj).__mro__:
+                if cls.__name__ in ENTRY_POINTS:
+                    methods = ENTRY_POINTS[cls.__name__]
+                    break
+        for method in methods:
+            self.wrap(obj, method)
+
+    def uninstrument(self):
+        """restore all wrapped methods"""
+        for obj, method in self.wrapped:
+            obj.__dict__.pop(method, None)
+        self.wrapped = []
+
+    def snapshot(self, reset=False):
+        """
+        Parameters
+        ----------
+        reset : bool
+            reset counters after snapshot
+
+        Returns
+        -------
+        stats : dict
+            name: dict of `Probe.snapshot`, probes not called are omitted
+
+        """
+        stats = dict((name, probe.snapshot()) for name, probe in self.probes.items() if probe.count)
+        if reset:
+            self.reset()
+        return stats
+
+    def reset(self):
+        for probe in self.probes.values():
+            probe.reset()
+
+    def poll(self, int_time):
+        """snapshot and reset once every `interval` milliseconds, can be called on each tick
+
+        Parameters
+        ----------
+        int_time : int
+            i.e. 93005000
+
+        Returns
+        -------
+        stats : dict or None
+            snapshot if interval passed, otherwise None
+
+        """
+        ms = BarGenerator.int_time_to_ms(int_time)
+        if self.last_poll_ms is None:
+            self.last_poll_ms = ms
+            return None
+        if 0 <= ms - self.last_poll_ms < self.interval:
+            return None
+        self.last_poll_ms = ms
+        return self.snapshot(reset=True)
+
+    @staticmethod
+    def format(stats):
+        """format snapshot as text table"""
+        lines = ['{:<40}{:>10}{:>12}{:>12}{:>12}{:>12}'.format('probe', 'count', 'mean ns', 'p50 ns', 'p99 ns',
+                                                               'max ns')]
+        for name in sorted(stats):
+            s = stats[name]
+            lines.append('{:<40}{:>10}{:>12.0f}{:>12}{:>12}{:>12}'.format(
+                name, s['count'], s['mean_ns'], s['p50_ns'], s['p99_ns'], s['max_ns']))
+        return '\n'.join(lines)
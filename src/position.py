@@ -1,9 +1,8 @@
+import sys
 from enum import Enum
 
-try:
-    from my.sdp.api import (Direction, OpenClose, OrderStatus, Exchange)
-except ImportError:
-    pass
+from consts import (BUY, SELL, OPEN, CLOSE, CLOSE_TOD, CLOSE_YES, INIT, SUCCEED, CANCELED, REJECTED, FILLED, DEAD,
+                    SSE, STOCK_EXCHANGES)
 
 """Constants
 """
@@ -13,6 +12,122 @@ SHORT_OPEN = 2
 SHORT_CLOSE = 3
 
 ERROR_CODE = -1
+# open_close of fills changing position, `_fill_notional` ignores others, i.e. CLOSE_TOD
+POSITION_OPEN_CLOSE = frozenset((OPEN, CLOSE, CLOSE_YES))
+# direction: open_close: index within position, built once at import
+_INDEX_MAP = {
+    BUY: {
+        OPEN: LONG_OPEN,
+        CLOSE: LONG_CLOSE,
+        CLOSE_TOD: LONG_CLOSE,
+        CLOSE_YES: LONG_CLOSE
+    },
+    SELL: {
+        OPEN: SHORT_OPEN,
+        CLOSE: SHORT_CLOSE,
+        CLOSE_TOD: SHORT_CLOSE,
+        CLOSE_YES: SHORT_CLOSE
+    }
+}
+
+
+def _sizeof(obj, seen):
+    """size of obj in bytes, following dict/list/tuple/set and __slots__ members"""
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_sizeof(k, seen) + _sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_sizeof(v, seen) for v in obj)
+    elif hasattr(obj, '__slots__'):
+        size += sum(_sizeof(getattr(obj, name), seen) for name in obj.__slots__ if hasattr(obj, name))
+    return size
+
+
+class InflightOrder(object):
+    """compact record of an order in flight for cash tracking
+
+    Attributes
+    ----------
+    order_id : int
+    symbol : str
+    price : float
+    size : int
+    direction : int
+    open_close : int
+    cum_qty : int
+        volume filled
+    """
+    __slots__ = ('order_id', 'symbol', 'price', 'size', 'direction', 'open_close', 'cum_qty')
+
+    def __init__(self, order):
+        self.order_id = order.order_id
+        self.symbol = order.symbol
+        self.price = order.price
+        self.size = order.size
+        self.direction = order.direction
+        self.open_close = order.open_close
+        self.cum_qty = 0
+
+
+class FeeSchedule(object):
+    """fee schedule of a contract compiled from `contract.fee`
+
+    fee = size * (by_lot + price * by_notional), the close yesterday variant uses `yes_by_lot`, `yes_by_notional`.
+
+    Attributes
+    ----------
+    by_lot : float
+        fee per lot
+    by_notional : float
+        fee per notional, including transfer fee
+    yes_by_lot : float
+        fee per lot when closing yesterday position
+    yes_by_notional : float
+        fee per notional when closing yesterday position, including transfer fee
+    stamp_tax : float
+        tax per notional on selling
+    transfer_fee : float
+        transfer fee per notional, only for SSE
+    """
+    __slots__ = ('by_lot', 'by_notional', 'yes_by_lot', 'yes_by_notional', 'stamp_tax', 'transfer_fee')
+
+    def __init__(self, contract):
+        fee = contract.fee
+        if contract.exch == SSE:
+            self.transfer_fee = fee['acc_transfer_fee']
+        else:
+            self.transfer_fee = 0.0
+        self.stamp_tax = fee.get('stamp_tax', 0.0)
+        rate = fee['exchange_fee'] + fee['broker_fee']
+        yes_rate = fee['yes_exchange_fee'] + fee['broker_fee']
+        if fee['fee_by_lot'] == 0:
+            self.by_lot, self.by_notional = rate, self.transfer_fee
+            self.yes_by_lot, self.yes_by_notional = yes_rate, self.transfer_fee
+        else:
+            self.by_lot, self.by_notional = 0.0, rate + self.transfer_fee
+            self.yes_by_lot, self.yes_by_notional = 0.0, yes_rate + self.transfer_fee
+
+    def fee(self, size, price, flag_close_yes=False):
+        """transaction fee, same as `PosMgrBase.get_transaction_fee`
+
+        Parameters
+        ----------
+        size : int
+        price : float
+        flag_close_yes : bool
+
+        Returns
+        -------
+        fee : float
+
+        """
+        if flag_close_yes:
+            return size * (self.yes_by_lot + price * self.yes_by_notional)
+        return size * (self.by_lot + price * self.by_notional)
+
 
 class PosMgrBase(object):
     """A base class providing position management and pnl calculation
@@ -30,6 +145,39 @@ class PosMgrBase(object):
                 }
     contract_info : contract
         stores contract from config
+    fee_schedule : dict
+        symbol: FeeSchedule compiled at `init_position`
+    pnl : dict
+        symbol: str
+            {
+                'realized'      realized pnl by points
+                'unrealized'    unrealized pnl by points at last price
+                'slope'         unrealized pnl = slope * last_px + intercept
+                'intercept'
+                'scale'         contract multiple * exchange rate, points to cash
+            }
+    strategy_pnl : float
+        running strategy pnl by cash since `init_position` or last `settle`
+    settled_pnl : float
+        pnl by cash settled by `settle`
+    account_pnl : dict
+        account: running pnl by cash
+    exchange_pnl : dict
+        exchange: running pnl by cash
+    exposure : dict
+        symbol: {'account', 'exchange', 'margin_rate', 'gross_pos', 'gross_notional', 'net_notional', 'margin'},
+        account/exchange of contract resolved once at `init_pnl` and exposure by cash at last price
+    account_exposure, exchange_exposure : dict
+        account/exchange: {'gross_notional', 'net_notional', 'margin'}, running sums of `exposure`
+    margin_rate : dict
+        symbol: margin per notional of position, 1.0 by default, see `set_margin_rate`
+    PNL_CHECK : bool
+        compare running pnl with full recompute on each strategy/account pnl query
+    orders : dict
+        order_id: InflightOrder, orders in flight of cash tracking, released at terminal status
+    lot_ledger : LotLedger or None
+        optional FIFO lot ledger, see `lots.LotLedger.attach`. If set, yesterday position and close
+        today/close yesterday fees of close fills come from matched lots.
     """
 
     def __init__(self):
@@ -37,13 +185,25 @@ class PosMgrBase(object):
         self.account = {}
         self.contract_info = {}
         self.account_info = {}
+        self.fee_schedule = {}
         self.orders = {}
         self.prices = {}
+        self.pnl = {}
+        self.strategy_pnl = 0.0
+        self.settled_pnl = 0.0
+        self.account_pnl = {}
+        self.exchange_pnl = {}
+        self.exposure = {}
+        self.account_exposure = {}
+        self.exchange_exposure = {}
+        self.margin_rate = {}
+        self.lot_ledger = None
         self.CLOSE_YES_FIRST = True
+        self.PNL_CHECK = False
 
     @staticmethod
     def switch_side(direction):
-        return Direction.BUY.value if direction == Direction.SELL.value else Direction.SELL.value
+        return BUY if direction == SELL else SELL
 
     @staticmethod
     def direction_to_index(direction, openclose):
@@ -60,23 +220,13 @@ class PosMgrBase(object):
             index within position dict
 
         """
-        _INDEX_MAP = {
-            Direction.BUY.value: {
-                OpenClose.OPEN.value: LONG_OPEN, 
-                OpenClose.CLOSE.value: LONG_CLOSE,
-                OpenClose.CLOSE_TOD.value: LONG_CLOSE,
-                OpenClose.CLOSE_YES.value: LONG_CLOSE
-                },
-            Direction.SELL.value: {
-                OpenClose.OPEN.value: SHORT_OPEN,
-                OpenClose.CLOSE.value: SHORT_CLOSE,
-                OpenClose.CLOSE_TOD.value: SHORT_CLOSE,
-                OpenClose.CLOSE_YES.value: SHORT_CLOSE
-            }
-        }
-        _direction = direction.value if isinstance(direction, Enum) else direction
-        _open_close = openclose.value if isinstance(openclose, Enum) else openclose
-        return _INDEX_MAP[_direction][_open_close]
+        try:
+            return _INDEX_MAP[direction][openclose]
+        except KeyError:
+            # members of a plain Enum do not hash as their values
+            _direction = direction.value if isinstance(direction, Enum) else direction
+            _open_close = openclose.value if isinstance(openclose, Enum) else openclose
+            return _INDEX_MAP[_direction][_open_close]
 
     @staticmethod
     def get_transaction_fee(contract, size, price, flag_close_yes=False):
@@ -102,10 +252,27 @@ class PosMgrBase(object):
             fee = size * (exchange_fee + contract.fee['broker_fee'])  # Caution, for futures right now, broker fee is 0.0
         else:
             fee = size * price * (exchange_fee + contract.fee['broker_fee'])
-        if contract.exch == Exchange.SSE.short_name:
+        if contract.exch == SSE:
             fee += size * price * contract.fee['acc_transfer_fee']
         return fee
 
+    def get_fee(self, symbol, size, price, flag_close_yes=False):
+        """get transaction fee from compiled fee schedule of contract
+
+        Parameters
+        ----------
+        symbol : str
+        size : int
+        price : float
+        flag_close_yes : bool
+
+        Returns
+        -------
+        fee : float
+
+        """
+        return self.fee_schedule[symbol].fee(size, price, flag_close_yes)
+
     def get_symbol_position_detail(self, symbol):
         """position of given symbol
 
@@ -207,7 +374,7 @@ class PosMgrBase(object):
             -1 for error, otherwise average price
 
         """
-        if direction == Direction.BUY.value:
+        if direction == BUY:
             long_position = self.get_long_position(symbol)
             if long_position > 0:
                 return (self.position[symbol][LONG_OPEN]['notional'] - self.position[symbol][SHORT_CLOSE]['notional']) / \
@@ -289,6 +456,7 @@ class PosMgrBase(object):
         """
         for contract in config.contracts:
             self.contract_info[contract.symbol] = contract
+            self.fee_schedule[contract.symbol] = FeeSchedule(contract)
             self.position[contract.symbol] = [{
                 'yes_pos': 0,
                 'yes_notional': 0.0,
@@ -317,6 +485,151 @@ class PosMgrBase(object):
                 "cash_available":  account.cash_available,
                 "cash_asset": account.cash_asset
             }
+        self.init_pnl()
+
+    def init_pnl(self):
+        """reset running pnl from current positions and last prices, called at the end of `init_position`
+
+        Returns
+        -------
+        None
+
+        """
+        self.strategy_pnl = 0.0
+        self.account_pnl = dict((account, 0.0) for account in self.account_info)
+        self.exchange_pnl = {}
+        self.account_exposure = dict((account, self._empty_exposure()) for account in self.account_info)
+        self.exchange_exposure = {}
+        for symbol, contract in self.contract_info.items():
+            self.account_pnl.setdefault(contract.account, 0.0)
+            self.exchange_pnl.setdefault(contract.exch, 0.0)
+            if contract.account not in self.account_exposure:
+                self.account_exposure[contract.account] = self._empty_exposure()
+            if contract.exch not in self.exchange_exposure:
+                self.exchange_exposure[contract.exch] = self._empty_exposure()
+            self.pnl[symbol] = {
+                'realized': 0.0,
+                'unrealized': 0.0,
+                'slope': 0.0,
+                'intercept': 0.0,
+                'scale': contract.multiple * self.account_info[contract.account].exch_rate
+            }
+            self.exposure[symbol] = {
+                'account': contract.account,
+                'exchange': contract.exch,
+                'margin_rate': self.margin_rate.setdefault(symbol, 1.0),
+                'gross_pos': 0,
+                'gross_notional': 0.0,
+                'net_notional': 0.0,
+                'margin': 0.0
+            }
+            self.refresh_contract_pnl(symbol)
+
+    @staticmethod
+    def _empty_exposure():
+        return {'gross_notional': 0.0, 'net_notional': 0.0, 'margin': 0.0}
+
+    def refresh_contract_pnl(self, symbol):
+        """recompute running pnl of given contract after its position changed, O(1)
+
+        Parameters
+        ----------
+        symbol : str
+
+        Returns
+        -------
+        None
+
+        """
+        _position = self.position[symbol]
+        long_pos = self.get_long_position(symbol)
+        short_pos = self.get_short_position(symbol)
+        slope, intercept = 0.0, 0.0
+        if long_pos >= 0:
+            slope += long_pos
+            intercept -= long_pos * self.avg_px(_position[LONG_OPEN])
+        if short_pos >= 0:
+            slope -= short_pos
+            intercept += short_pos * self.avg_px(_position[SHORT_OPEN])
+        pnl = self.pnl[symbol]
+        pnl['slope'] = slope
+        pnl['intercept'] = intercept
+        last_px = self.prices[symbol]['last_px']
+        unrealized = 0.0 if last_px < 0.01 else slope * last_px + intercept
+        realized = self.get_realized_pnl(symbol)
+        delta = (realized + unrealized - pnl['realized'] - pnl['unrealized']) * pnl['scale']
+        pnl['realized'] = realized
+        pnl['unrealized'] = unrealized
+        self.strategy_pnl += delta
+        exposure = self.exposure[symbol]
+        self.account_pnl[exposure['account']] += delta
+        self.exchange_pnl[exposure['exchange']] += delta
+        exposure['gross_pos'] = max(long_pos, 0) + max(short_pos, 0)
+        self._refresh_exposure(exposure, slope, last_px, pnl['scale'])
+
+    def _refresh_exposure(self, exposure, net_pos, last_px, scale):
+        """mark exposure of a contract at last price and apply the deltas to account/exchange rollups, O(1)"""
+        px = 0.0 if last_px < 0.01 else last_px * scale
+        gross = exposure['gross_pos'] * px
+        net = net_pos * px
+        margin = gross * exposure['margin_rate']
+        gross_delta = gross - exposure['gross_notional']
+        net_delta = net - exposure['net_notional']
+        margin_delta = margin - exposure['margin']
+        exposure['gross_notional'] = gross
+        exposure['net_notional'] = net
+        exposure['margin'] = margin
+        for rollup in (self.account_exposure[exposure['account']], self.exchange_exposure[exposure['exchange']]):
+            rollup['gross_notional'] += gross_delta
+            rollup['net_notional'] += net_delta
+            rollup['margin'] += margin_delta
+
+    def _fill_notional(self, response, split=None):
+        """fee adjusted notional of a fill, shared by all position backends
+
+        Parameters
+        ----------
+        response : :obj:response
+            filled response from exchange
+        split : tuple or None
+            (yes_qty, yes_notional) of yesterday lots closed by the fill, from lot ledger
+
+        Returns
+        -------
+        fill : tuple or None
+            (index, opposite_index, notional_change, notional_delta), None if the fill does not change position.
+            `notional_change` is volume * price, `notional_delta` is the change of notional with fees as cost.
+
+        """
+        schedule = self.fee_schedule[response.symbol]
+        volume, price = response.exe_volume, response.exe_price
+        fees = volume * (schedule.by_lot + price * schedule.by_notional)
+        if split is not None:
+            # close yesterday fee for yesterday lots, today fee for the rest
+            close_fees = (volume - split[0]) * (schedule.by_lot + price * schedule.by_notional) + \
+                split[0] * (schedule.yes_by_lot + price * schedule.yes_by_notional)
+        elif response.open_close == CLOSE_YES:
+            # If it's close yesterday, revert back using today's fee and add two yesterday fee back.
+            close_fees = 2 * volume * (schedule.yes_by_lot + price * schedule.yes_by_notional) - fees
+        else:
+            close_fees = fees
+        # notional calculation
+        notional_change = volume * price
+        opposite_index = self.direction_to_index(self.switch_side(response.direction), OPEN)
+        _index = self.direction_to_index(response.direction, response.open_close)
+        # accounting fees as cost for position
+        if response.direction == BUY:
+            if response.open_close == OPEN:
+                return _index, opposite_index, notional_change, notional_change + fees
+            elif response.open_close in (CLOSE, CLOSE_YES):
+                return _index, opposite_index, notional_change, notional_change + close_fees
+        elif response.direction == SELL:
+            fees += notional_change * schedule.stamp_tax
+            if response.open_close == OPEN:
+                return _index, opposite_index, notional_change, notional_change - fees
+            elif response.open_close in (CLOSE, CLOSE_YES):
+                return _index, opposite_index, notional_change, notional_change - close_fees
+        return None
 
     def update_position(self, response_type, response):
         """update position on each response
@@ -334,56 +647,106 @@ class PosMgrBase(object):
 
         """
         # calculate pos
-        if response.status in (OrderStatus.SUCCEED.value, OrderStatus.PARTED.value):
+        if response.status in FILLED:
             if response.exe_volume == 0:
                 return
-            # fee calculation
-            contract = self.contract_info[response.symbol]
-            fees = self.get_transaction_fee(contract, response.exe_volume, response.exe_price)
-            close_fees = 0
-            if response.open_close == OpenClose.CLOSE_YES.value:
-                close_fees -= fees  # If it's close yesterday, revert back using today's fee.
-                # Add two yesterday fee back.
-                close_fees += (2 * self.get_transaction_fee(contract, response.exe_volume, response.exe_price, True))
-            else:
-                close_fees = fees
-            # notional calculation
-            notional_change = response.exe_volume * response.exe_price
+            split = None
+            # the ledger only follows fills which change position
+            if self.lot_ledger is not None and response.open_close in POSITION_OPEN_CLOSE:
+                split = self.lot_ledger.on_fill(response, self.CLOSE_YES_FIRST)
+            fill = self._fill_notional(response, split)
+            if fill is None:
+                return
+            _index, opposite_index, notional_change, notional_delta = fill
+            _position = self.position[response.symbol]
             # update yesterday pos, not accounting for fees
-            opposite_index = self.direction_to_index(self.switch_side(response.direction), OpenClose.OPEN)
-            if response.open_close == OpenClose.CLOSE_YES:
-                self.position[response.symbol][opposite_index]['yes_pos'] -= response.exe_volume
-                self.position[response.symbol][opposite_index]['yes_notional'] -= notional_change
-            elif response.open_close == OpenClose.CLOSE and self.CLOSE_YES_FIRST:
-                opposite_yes_pos = self.position[response.symbol][opposite_index]['yes_pos']
+            if split is not None:
+                _position[opposite_index]['yes_pos'] -= split[0]
+                _position[opposite_index]['yes_notional'] -= split[1]
+            elif response.open_close == CLOSE_YES:
+                _position[opposite_index]['yes_pos'] -= response.exe_volume
+                _position[opposite_index]['yes_notional'] -= notional_change
+            elif response.open_close == CLOSE and self.CLOSE_YES_FIRST:
+                opposite_yes_pos = _position[opposite_index]['yes_pos']
                 pos_diff = opposite_yes_pos - response.exe_volume
                 if pos_diff > 0:
-                    self.position[response.symbol][opposite_index]['yes_pos'] -= response.exe_volume
-                    self.position[response.symbol][opposite_index]['yes_notional'] -= notional_change
+                    _position[opposite_index]['yes_pos'] -= response.exe_volume
+                    _position[opposite_index]['yes_notional'] -= notional_change
                 else:
-                    self.position[response.symbol][opposite_index]['yes_pos'] = 0
-                    self.position[response.symbol][opposite_index]['yes_notional'] = 0.0
+                    _position[opposite_index]['yes_pos'] = 0
+                    _position[opposite_index]['yes_notional'] = 0.0
             # update today pos, accounting fees as cost for position
-            _index = self.direction_to_index(response.direction, response.open_close)
-            if response.direction == Direction.BUY.value:
-                if response.open_close == OpenClose.OPEN.value:
-                    self.position[response.symbol][_index]['notional'] += (notional_change + fees)
-                    self.position[response.symbol][_index]['pos'] += response.exe_volume
-                elif response.open_close in (OpenClose.CLOSE.value, OpenClose.CLOSE_YES.value):
-                    self.position[response.symbol][_index]['notional'] += (notional_change + close_fees)
-                    self.position[response.symbol][_index]['pos'] += response.exe_volume
-            elif response.direction == Direction.SELL.value:
-                fees += notional_change * contract.fee['stamp_tax']
-                if response.open_close == OpenClose.OPEN.value:
-                    self.position[response.symbol][_index]['notional'] += (notional_change - fees)
-                    self.position[response.symbol][_index]['pos'] += response.exe_volume
-                elif response.open_close in (OpenClose.CLOSE.value, OpenClose.CLOSE_YES.value):
-                    self.position[response.symbol][_index]['notional'] += (notional_change - close_fees)
-                    self.position[response.symbol][_index]['pos'] += response.exe_volume
+            _position[_index]['notional'] += notional_delta
+            _position[_index]['pos'] += response.exe_volume
+            self.refresh_contract_pnl(response.symbol)
+
+    def settle(self, settle_prices, mark_to_settle=True):
+        """end of day settlement: roll positions into yesterday position and reset intraday buckets
+
+        Net long/short positions become `pos` and `yes_pos` of LONG_OPEN/SHORT_OPEN, close buckets are cleared.
+        With `mark_to_settle`, cost basis is moved to settlement price and both realized and unrealized pnl are
+        settled; otherwise the open cost basis (fees included) is carried and only realized pnl is settled.
+        Running pnl restarts from the settled positions.
+
+        Parameters
+        ----------
+        settle_prices : dict
+            symbol: settlement price, last price is used for symbols not given or priced 0
+        mark_to_settle : bool
+            True for futures daily mark to market, False to carry cost basis, i.e. stocks
+
+        Returns
+        -------
+        pnl : float
+            pnl by cash settled, also added to `settled_pnl`
+
+        """
+        settled = 0.0
+        for symbol, _position in self.position.items():
+            settle_px = settle_prices.get(symbol, 0.0)
+            if settle_px < 0.01:
+                settle_px = self.prices[symbol]['last_px']
+            self.prices[symbol]['last_px'] = settle_px
+            long_pos = max(self.get_long_position(symbol), 0)
+            short_pos = max(self.get_short_position(symbol), 0)
+            pnl = self.get_realized_pnl(symbol)
+            if mark_to_settle and settle_px >= 0.01:
+                pnl += self.get_unrealized_pnl(symbol)
+                long_notional = long_pos * settle_px
+                short_notional = short_pos * settle_px
+            else:
+                long_notional = long_pos * self.avg_px(_position[LONG_OPEN])
+                short_notional = short_pos * self.avg_px(_position[SHORT_OPEN])
+                settle_px = None
+            settled += pnl * self.pnl[symbol]['scale']
+            self.position[symbol] = [{
+                'yes_pos': 0,
+                'yes_notional': 0.0,
+                'pos': 0,
+                'notional': 0.0
+                } for i in range(4)]
+            self.position[symbol][LONG_OPEN] = {
+                'yes_pos': long_pos,
+                'yes_notional': long_notional,
+                'pos': long_pos,
+                'notional': long_notional
+            }
+            self.position[symbol][SHORT_OPEN] = {
+                'yes_pos': short_pos,
+                'yes_notional': short_notional,
+                'pos': short_pos,
+                'notional': short_notional
+            }
+            if self.lot_ledger is not None:
+                self.lot_ledger.settle(symbol, settle_px)
+        self.settled_pnl += settled
+        self.init_pnl()
+        return settled
 
     def update_cash_on_order(self, order):
         """
         When opening positions, we update cash upon sending order for compliance.
+        A compact record of the order is kept until it reaches a terminal status.
 
         Parameters
         ----------
@@ -393,30 +756,32 @@ class PosMgrBase(object):
         -------
 
         """
-        # TODO : verify logic, not available yet
-        self.orders[order.order_id] = order
+        # Pre-send checks of cash, margin and exposure are provided by risk.RiskEngine
+        if order.status != INIT:  # New Order only
+            return
+        self.orders[order.order_id] = InflightOrder(order)
 
         contract = self.contract_info[order.symbol]
-        if order.status == OrderStatus.INIT.value:  # New Order
-            if order.exch in (Exchange.SZSE.short_name, Exchange.SSE.short_name):  # stocks
-                stock_value = order.price * order.size
-                transaction_fee = self.get_transaction_fee(contract, order.size, order.price)
-                total_fees = stock_value * contract['stamp_tax'] + transaction_fee
-
-                if order.direction == Direction.BUY.value:
-                    self.account[contract.account]['cash_available'] -= stock_value
-                else:
-                    self.account[contract.account]['cash_available'] -= total_fees
-            else: # futures
-                futures_value = order.price * order.size * contract['multiplier']
-                transaction_fee = self.get_transaction_fee(contract, order.size, order.price) * contract['multiplier']
-                if order.open_close == OpenClose.OPEN.value:
-                    self.account[contract.account]['cash_available'] -= (futures_value + transaction_fee)
+        if contract.exch in STOCK_EXCHANGES:  # stocks
+            stock_value = order.price * order.size
+            transaction_fee = self.get_fee(order.symbol, order.size, order.price)
+            total_fees = stock_value * self.fee_schedule[order.symbol].stamp_tax + transaction_fee
+
+            if order.direction == BUY:
+                self.account[contract.account]['cash_available'] -= stock_value
+            else:
+                self.account[contract.account]['cash_available'] -= total_fees
+        else: # futures
+            futures_value = order.price * order.size * contract.multiple
+            transaction_fee = self.get_fee(order.symbol, order.size, order.price) * contract.multiple
+            if order.open_close == OPEN:
+                self.account[contract.account]['cash_available'] -= (futures_value + transaction_fee)
 
     def update_cash_on_response(self, response_type, response):
         """
         When closing positions, we update cash records at a later stage after we receive actual response. Previously
         deducted cash might be added back to reflect closed positions or cancelled operations.
+        The order record is released once the order is finished.
 
         Parameters
         ----------
@@ -427,44 +792,67 @@ class PosMgrBase(object):
         -------
 
         """
-        # TODO : verify logic, not available yet
+        order = self.orders.get(response.order_id)
+        if order is None:
+            return
         contract = self.contract_info[response.symbol]
-        order = self.orders[response.order_id]
-        if response.status in (OrderStatus.CANCELED.value, OrderStatus.REJECTED.value):  # Cancel or rejected
-            # revert back positions and available cash
-            if contract.exch in (Exchange.SZSE.short_name, Exchange.SSE.short_name):  # Stocks, multiplier is 1
-                stock_value = order.price * order.size
-                transaction_fee = self.get_transaction_fee(contract, order.size, order.price)
-                fees = stock_value * contract['stamp_tax'] + transaction_fee
-                if order.direction == Direction.BUY.value:
+        if response.status in (CANCELED, REJECTED):  # Cancel or rejected
+            # revert back positions and available cash of volume not filled
+            leaves_qty = order.size - order.cum_qty
+            if contract.exch in STOCK_EXCHANGES:  # Stocks, multiplier is 1
+                stock_value = order.price * leaves_qty
+                transaction_fee = self.get_fee(order.symbol, leaves_qty, order.price)
+                fees = stock_value * self.fee_schedule[order.symbol].stamp_tax + transaction_fee
+                if order.direction == BUY:
                     self.account[contract.account]['cash_available'] += stock_value
                 else:
                     self.account[contract.account]['cash_available'] += fees
             else: # futures
-                futures_value = order.price * order.size * contract['multiplier']
-                transaction_fee = self.get_transaction_fee(contract, order.size, order.price) * contract['multiplier']
-                if order.open_close == OpenClose.OPEN.value:
+                futures_value = order.price * leaves_qty * contract.multiple
+                transaction_fee = self.get_fee(order.symbol, leaves_qty, order.price) * contract.multiple
+                if order.open_close == OPEN:
                     self.account[contract.account]['cash_available'] += (futures_value + transaction_fee)
 
-        elif response.status in (OrderStatus.SUCCEED.value, OrderStatus.PARTED.value):
+        elif response.status in FILLED:
+            last_px, last_qty = response.exe_price, response.exe_volume
+            order.cum_qty += last_qty
             # Add cash upon part/success sell response
-            if contract.exch in (Exchange.SZSE.short_name, Exchange.SSE.short_name):  # Stocks, multiplier is 1
-                stock_value = order.last_px * order.last_qty
-                if order.direction == Direction.SELL.value:
+            if contract.exch in STOCK_EXCHANGES:  # Stocks, multiplier is 1
+                stock_value = last_px * last_qty
+                if order.direction == SELL:
                     self.account[contract.account]['cash_available'] += stock_value
-            elif order.open_close in (OpenClose.CLOSE.value, OpenClose.CLOSE_YES.value):
+            elif order.open_close in (CLOSE, CLOSE_YES):
                 # When close a position, we reset the cash.
                 # When a position is closed, it  will release some cash for openning that account
-                futures_value = order.last_px * order.last_qty * contract['multiplier']
-                if order.direction == Direction.BUY.value:
+                futures_value = last_px * last_qty * contract.multiple
+                if order.direction == BUY:
                     sell_open_avg_px = self.get_sell_open_avg_px(order.symbol)
                     self.account[contract.account]['cash_available'] += \
-                        (sell_open_avg_px + (sell_open_avg_px - order.last_px)) * order.last_qty * contract['multiplier']
-                elif order.direction == Direction.SELL.value:
+                        (sell_open_avg_px + (sell_open_avg_px - last_px)) * last_qty * contract.multiple
+                elif order.direction == SELL:
                     self.account[contract.account]['cash_available'] += futures_value
-            elif order.open_close == OpenClose.OPEN.value:
-                price_gap = order.price - order.last_px  # If we send a price higher than last_px, we need to re-adjust the gap to cash.
-                self.account[contract.account]['cash_available'] += price_gap * order.last_qty * contract['multiplier']
+            elif order.open_close == OPEN:
+                price_gap = order.price - last_px  # If we send a price higher than last_px, we need to re-adjust the gap to cash.
+                self.account[contract.account]['cash_available'] += price_gap * last_qty * contract.multiple
+
+        # release order record once finished
+        if (response.status == SUCCEED and response.exe_volume > 0) or response.status in DEAD:
+            self.orders.pop(response.order_id)
+
+    def memory_usage(self):
+        """approximate memory used by each dict of position manager
+
+        Returns
+        -------
+        usage : dict
+            name: bytes, including keys and nested containers, contract/account objects are counted shallow
+
+        """
+        usage = {}
+        for name, value in self.__dict__.items():
+            if isinstance(value, dict):
+                usage[name] = _sizeof(value, set())
+        return usage
 
     def update_last_px(self, quote_type, quote):
         """update last price of contract
@@ -483,10 +871,59 @@ class PosMgrBase(object):
 
         """
         if quote_type == 0:
-            self.prices[quote.symbol]["last_px"] = quote.last_px
+            self.set_last_px(quote.symbol, quote.last_px, quote.int_time)
         elif quote_type == 1:
-            self.prices[quote.ticker]["last_px"] = quote.last_px
+            self.set_last_px(quote.ticker, quote.last_px, quote.exch_time)
+
+    def set_last_px(self, symbol, last_px, int_time=None):
+        """update last price of contract whose symbol is already resolved, i.e. by `QuoteDispatcher`
+
+        Parameters
+        ----------
+        symbol : str
+        last_px : float
+        int_time : int or None
+            time of quote, passed to lot ledger
+
+        Returns
+        -------
+        None
+
+        """
+        if int_time is not None and self.lot_ledger is not None:
+            self.lot_ledger.now = int_time
+        self.prices[symbol]["last_px"] = last_px
+        # apply the delta of unrealized pnl
+        pnl = self.pnl[symbol]
+        unrealized = 0.0 if last_px < 0.01 else pnl['slope'] * last_px + pnl['intercept']
+        delta = (unrealized - pnl['unrealized']) * pnl['scale']
+        pnl['unrealized'] = unrealized
+        self.strategy_pnl += delta
+        exposure = self.exposure[symbol]
+        self.account_pnl[exposure['account']] += delta
+        self.exchange_pnl[exposure['exchange']] += delta
+        if exposure['gross_pos'] or exposure['gross_notional']:
+            self._refresh_exposure(exposure, pnl['slope'], last_px, pnl['scale'])
+
+    def set_margin_rate(self, symbol, margin_rate):
+        """set margin rate of contract used by margin of exposure, 1.0 by default (full notional)
+
+        Parameters
+        ----------
+        symbol : str
+        margin_rate : float
+            i.e. 0.1 for 10% of notional
+
+        Returns
+        -------
+        None
 
+        """
+        self.margin_rate[symbol] = margin_rate
+        exposure = self.exposure[symbol]
+        exposure['margin_rate'] = margin_rate
+        pnl = self.pnl[symbol]
+        self._refresh_exposure(exposure, pnl['slope'], self.prices[symbol]['last_px'], pnl['scale'])
 
     @staticmethod
     def avg_px(pos_info):
@@ -567,7 +1004,7 @@ class PosMgrBase(object):
         return long_side_unrealized_pnl + short_side_unrealized_pnl
 
     def get_contract_pnl_cash(self, symbol):
-        """get total contract pnl by cash
+        """get total contract pnl by cash, read from running pnl
 
         Parameters
         ----------
@@ -579,12 +1016,28 @@ class PosMgrBase(object):
             by cash
 
         """
-        contract = self.contract_info[symbol]
-        account = self.account_info[contract.account]
-        return (self.get_realized_pnl(symbol) + self.get_unrealized_pnl(symbol)) * contract.multiple * account.exch_rate
+        pnl = self.pnl[symbol]
+        return (pnl['realized'] + pnl['unrealized']) * pnl['scale']
 
     def get_strategy_pnl_cash(self):
-        """get strategy pnl by cash
+        """get strategy pnl by cash, read from running pnl
+
+        Returns
+        -------
+        pnl : float
+            by cash
+
+        """
+        if self.PNL_CHECK:
+            self.check_pnl()
+        return self.strategy_pnl
+
+    def get_account_pnl_cash(self, account):
+        """get pnl by cash of contracts held by given account, read from running pnl
+
+        Parameters
+        ----------
+        account : str
 
         Returns
         -------
@@ -592,7 +1045,179 @@ class PosMgrBase(object):
             by cash
 
         """
-        _pnl = 0
+        if self.PNL_CHECK:
+            self.check_pnl()
+        return self.account_pnl[account]
+
+    def get_exchange_pnl_cash(self, exchange):
+        """get pnl by cash of contracts traded on given exchange, read from running pnl
+
+        Parameters
+        ----------
+        exchange : str
+            short name of exchange, i.e. 'SHFE'
+
+        Returns
+        -------
+        pnl : float
+            by cash
+
+        """
+        if self.PNL_CHECK:
+            self.check_pnl()
+        return self.exchange_pnl[exchange]
+
+    def get_account_exposure(self, account):
+        """get exposure and pnl of contracts held by given account, read from running sums, O(1)
+
+        Parameters
+        ----------
+        account : str
+
+        Returns
+        -------
+        exposure : dict
+            {'gross_notional', 'net_notional', 'margin', 'pnl'} by cash, notional marked at last price
+
+        """
+        if self.PNL_CHECK:
+            self.check_pnl()
+        exposure = dict(self.account_exposure[account])
+        exposure['pnl'] = self.account_pnl[account]
+        return exposure
+
+    def get_exchange_exposure(self, exchange):
+        """get exposure and pnl of contracts traded on given exchange, read from running sums, O(1)
+
+        Parameters
+        ----------
+        exchange : str
+            short name of exchange, i.e. 'SHFE'
+
+        Returns
+        -------
+        exposure : dict
+            {'gross_notional', 'net_notional', 'margin', 'pnl'} by cash, notional marked at last price
+
+        """
+        if self.PNL_CHECK:
+            self.check_pnl()
+        exposure = dict(self.exchange_exposure[exchange])
+        exposure['pnl'] = self.exchange_pnl[exchange]
+        return exposure
+
+    def get_portfolio_summary(self):
+        """get exposure and pnl of every account and exchange, O(accounts + exchanges)
+
+        Returns
+        -------
+        summary : dict
+            ::
+                {
+                    'accounts': {account: see `get_account_exposure`},
+                    'exchanges': {exchange: see `get_exchange_exposure`},
+                    'strategy': {'gross_notional', 'net_notional', 'margin', 'pnl'}
+                }
+
+        """
+        if self.PNL_CHECK:
+            self.check_pnl()
+        accounts = {}
+        strategy = self._empty_exposure()
+        for account, rollup in self.account_exposure.items():
+            accounts[account] = dict(rollup, pnl=self.account_pnl[account])
+            for key in strategy:
+                strategy[key] += rollup[key]
+        strategy['pnl'] = self.strategy_pnl
+        exchanges = dict((exchange, dict(rollup, pnl=self.exchange_pnl[exchange]))
+                         for exchange, rollup in self.exchange_exposure.items())
+        return {'accounts': accounts, 'exchanges': exchanges, 'strategy': strategy}
+
+    def recompute_exposure(self):
+        """recompute exposure by cash of every contract from positions and last prices
+
+        Returns
+        -------
+        exposure : dict
+            symbol: {'gross_notional', 'net_notional', 'margin'}
+
+        """
+        _exposure = {}
+        for symbol, contract in self.contract_info.items():
+            last_px = self.prices[symbol]['last_px']
+            px = 0.0 if last_px < 0.01 else last_px * contract.multiple * self.account_info[contract.account].exch_rate
+            long_pos = max(self.get_long_position(symbol), 0)
+            short_pos = max(self.get_short_position(symbol), 0)
+            _exposure[symbol] = {
+                'gross_notional': (long_pos + short_pos) * px,
+                'net_notional': (long_pos - short_pos) * px,
+                'margin': (long_pos + short_pos) * px * self.margin_rate.get(symbol, 1.0)
+            }
+        return _exposure
+
+    def recompute_pnl_cash(self):
+        """recompute pnl by cash of every contract from positions and last prices
+
+        Returns
+        -------
+        pnl : dict
+            symbol: pnl by cash
+
+        """
+        _pnl = {}
         for symbol, contract in self.contract_info.items():
-            _pnl += self.get_contract_pnl_cash(symbol)
+            account = self.account_info[contract.account]
+            _pnl[symbol] = (self.get_realized_pnl(symbol) + self.get_unrealized_pnl(symbol)) * \
+                contract.multiple * account.exch_rate
         return _pnl
+
+    def recompute_strategy_pnl_cash(self):
+        """recompute strategy pnl by cash from scratch, O(symbols)
+
+        Returns
+        -------
+        pnl : float
+            by cash
+
+        """
+        return sum(self.recompute_pnl_cash().values())
+
+    def check_pnl(self, tolerance=1e-6):
+        """compare running strategy, account and exchange pnl and exposure with full recompute
+
+        Parameters
+        ----------
+        tolerance : float
+            relative tolerance
+
+        Returns
+        -------
+        consistent : bool
+
+        """
+        recomputed = self.recompute_pnl_cash()
+        expected = {'strategy': 0.0}
+        running = {'strategy': self.strategy_pnl}
+        for symbol, pnl in recomputed.items():
+            account = self.contract_info[symbol].account
+            exchange = self.contract_info[symbol].exch
+            expected['strategy'] += pnl
+            expected[account] = expected.get(account, 0.0) + pnl
+            running[account] = self.account_pnl[account]
+            key = 'exchange ' + exchange
+            expected[key] = expected.get(key, 0.0) + pnl
+            running[key] = self.exchange_pnl[exchange]
+        for symbol, exposure in self.recompute_exposure().items():
+            contract = self.contract_info[symbol]
+            for prefix, rollup in ((contract.account, self.account_exposure[contract.account]),
+                                   ('exchange ' + contract.exch, self.exchange_exposure[contract.exch])):
+                for name, value in exposure.items():
+                    key = '{} {}'.format(prefix, name)
+                    expected[key] = expected.get(key, 0.0) + value
+                    running[key] = rollup[name]
+        consistent = True
+        for key, value in expected.items():
+            if abs(running[key] - value) > tolerance * max(1.0, abs(value)):
+                print ("running pnl of {} is {}, recomputed {}".format(key, running[key], value))
+                consistent = False
+        return consistent
@@ -0,0 +1,833 @@
+"""A numpy array backed position manager
+
+Positions of all contracts are stored in one preallocated float64 matrix instead of
+nested dicts, so per-symbol getters are plain array reads and portfolio wide
+aggregates are computed in a single vectorized pass.
+"""
+import numpy as np
+
+from consts import (BUY, CLOSE, CLOSE_YES, FILLED)
+from position import (PosMgrBase, FeeSchedule, LONG_OPEN, LONG_CLOSE, SHORT_OPEN, SHORT_CLOSE, ERROR_CODE,
+                      POSITION_OPEN_CLOSE)
+
+"""Constants
+"""
+POS = 0
+NOTIONAL = 1
+YES_POS = 2
+YES_NOTIONAL = 3
+N_FIELDS = 4
+
+FIELD_NAMES = ('pos', 'notional', 'yes_pos', 'yes_notional')
+
+
+class PosMgrArray(PosMgrBase):
+    """Position manager storing positions in a numpy matrix, keeps the getter api of `PosMgrBase`
+
+    Attributes
+    ----------
+    matrix : numpy.ndarray
+        shape (n_symbols, 4, N_FIELDS), float64
+            axis 1: {LONG_OPEN, LONG_CLOSE, SHORT_OPEN, SHORT_CLOSE}
+            axis 2: {POS, NOTIONAL, YES_POS, YES_NOTIONAL}
+    symbol_index : dict
+        symbol -> row of matrix
+    symbols : list
+        row -> symbol
+    last_px : numpy.ndarray
+        shape (n_symbols, ), last price of each contract
+    multiple : numpy.ndarray
+        shape (n_symbols, ), contract multiple
+    exch_rate : numpy.ndarray
+        shape (n_symbols, ), exchange rate of the account holding the contract
+    realized, unrealized : numpy.ndarray
+        shape (n_symbols, ), running pnl by points, replaces `PosMgrBase.pnl`
+    pnl_slope, pnl_intercept : numpy.ndarray
+        shape (n_symbols, ), unrealized = pnl_slope * last_px + pnl_intercept
+    pnl_scale : numpy.ndarray
+        shape (n_symbols, ), multiple * exch_rate
+    account_id : numpy.ndarray
+        shape (n_symbols, ), index of account in `account_names` holding the contract
+    exchange_id : numpy.ndarray
+        shape (n_symbols, ), index of exchange in `exchange_names` of the contract
+    gross_pos : numpy.ndarray
+        shape (n_symbols, ), long + short position
+    gross_notional, net_notional, margin : numpy.ndarray
+        shape (n_symbols, ), exposure by cash at last price, replaces `PosMgrBase.exposure`
+    margin_coef : numpy.ndarray
+        shape (n_symbols, ), margin rate of each contract, see `set_margin_rate`
+    fee_coef : numpy.ndarray
+        shape (n_symbols, 2, 2), fee schedule of each contract
+            axis 1: {0 for today, 1 for close yesterday}
+            axis 2: {0 for by lot, 1 for by notional}
+    stamp_tax : numpy.ndarray
+        shape (n_symbols, ), tax per notional on selling
+    """
+
+    def __init__(self):
+        super(PosMgrArray, self).__init__()
+        self.symbol_index = {}
+        self.symbols = []
+        self.matrix = np.zeros((0, 4, N_FIELDS))
+        self.last_px = np.zeros(0)
+        self.multiple = np.ones(0)
+        self.exch_rate = np.ones(0)
+        self.realized = np.zeros(0)
+        self.unrealized = np.zeros(0)
+        self.pnl_slope = np.zeros(0)
+        self.pnl_intercept = np.zeros(0)
+        self.pnl_scale = np.ones(0)
+        self.symbol_account = []
+        self.account_names = []
+        self.account_id = np.zeros(0, dtype=np.intp)
+        self.symbol_exchange = []
+        self.exchange_names = []
+        self.exchange_id = np.zeros(0, dtype=np.intp)
+        self.gross_pos = np.zeros(0)
+        self.gross_notional = np.zeros(0)
+        self.net_notional = np.zeros(0)
+        self.margin = np.zeros(0)
+        self.margin_coef = np.ones(0)
+        self.fee_coef = np.zeros((0, 2, 2))
+        self.stamp_tax = np.zeros(0)
+
+    def init_position(self, config_type, config):
+        """initialize start position, preallocate matrix for all contracts in config
+
+        Parameters
+        ----------
+        config_type : int
+            type of config
+        config : :obj:config
+            strategy configuration
+
+        Returns
+        -------
+        None
+
+        """
+        for account in config.accounts:
+            self.account_info[account.account] = account
+            self.account[account.account] = {
+                "cash_available":  account.cash_available,
+                "cash_asset": account.cash_asset
+            }
+        n_symbols = len(config.contracts)
+        self.matrix = np.zeros((n_symbols, 4, N_FIELDS))
+        self.last_px = np.zeros(n_symbols)
+        self.multiple = np.ones(n_symbols)
+        self.exch_rate = np.ones(n_symbols)
+        self.fee_coef = np.zeros((n_symbols, 2, 2))
+        self.stamp_tax = np.zeros(n_symbols)
+        self.symbol_index = {}
+        self.symbols = []
+        for row, contract in enumerate(config.contracts):
+            self.contract_info[contract.symbol] = contract
+            schedule = FeeSchedule(contract)
+            self.fee_schedule[contract.symbol] = schedule
+            self.fee_coef[row] = ((schedule.by_lot, schedule.by_notional),
+                                  (schedule.yes_by_lot, schedule.yes_by_notional))
+            self.stamp_tax[row] = schedule.stamp_tax
+            self.symbol_index[contract.symbol] = row
+            self.symbols.append(contract.symbol)
+            yes_pos, today_pos = contract.yesterday_pos, contract.today_pos
+            self.matrix[row, LONG_OPEN] = (
+                today_pos['long_volume'], today_pos['long_volume'] * today_pos['long_price'],
+                yes_pos['long_volume'], yes_pos['long_volume'] * yes_pos['long_price']
+            )
+            self.matrix[row, SHORT_OPEN] = (
+                today_pos['short_volume'], today_pos['short_volume'] * today_pos['short_price'],
+                yes_pos['short_volume'], yes_pos['short_volume'] * yes_pos['short_price']
+            )
+            self.multiple[row] = contract.multiple
+            self.exch_rate[row] = self.account_info[contract.account].exch_rate
+        self.init_pnl()
+
+    def init_pnl(self):
+        """reset running pnl from current positions and last prices
+
+        Returns
+        -------
+        None
+
+        """
+        self.pnl_scale = self.multiple * self.exch_rate
+        self.symbol_account = [self.contract_info[symbol].account for symbol in self.symbols]
+        self.account_names = list(self.account_info)
+        account_index = dict((account, i) for i, account in enumerate(self.account_names))
+        self.account_id = np.array([account_index[account] for account in self.symbol_account], dtype=np.intp)
+        pos = self.matrix[:, :, POS]
+        avg_px = self.avg_px_vector(self.matrix)
+        long_pos = pos[:, LONG_OPEN] - pos[:, SHORT_CLOSE]
+        short_pos = pos[:, SHORT_OPEN] - pos[:, LONG_CLOSE]
+        long_pos = np.where(long_pos >= 0, long_pos, 0.0)
+        short_pos = np.where(short_pos >= 0, short_pos, 0.0)
+        self.pnl_slope = long_pos - short_pos
+        self.pnl_intercept = short_pos * avg_px[:, SHORT_OPEN] - long_pos * avg_px[:, LONG_OPEN]
+        self.realized = self.realized_pnl_vector()
+        self.unrealized = np.where(self.last_px < 0.01, 0.0, self.pnl_slope * self.last_px + self.pnl_intercept)
+        pnl_cash = (self.realized + self.unrealized) * self.pnl_scale
+        self.strategy_pnl = float(pnl_cash.sum())
+        self.account_pnl = dict(zip(self.account_names, np.bincount(
+            self.account_id, weights=pnl_cash, minlength=len(self.account_names)).tolist()))
+
+        self.symbol_exchange = [self.contract_info[symbol].exch for symbol in self.symbols]
+        self.exchange_names = sorted(set(self.symbol_exchange))
+        exchange_index = dict((exchange, i) for i, exchange in enumerate(self.exchange_names))
+        self.exchange_id = np.array([exchange_index[exchange] for exchange in self.symbol_exchange], dtype=np.intp)
+        self.exchange_pnl = dict(zip(self.exchange_names, np.bincount(
+            self.exchange_id, weights=pnl_cash, minlength=len(self.exchange_names)).tolist()))
+        self.margin_coef = np.array([self.margin_rate.setdefault(symbol, 1.0) for symbol in self.symbols])
+        self.gross_pos = long_pos + short_pos
+        px = np.where(self.last_px < 0.01, 0.0, self.last_px * self.pnl_scale)
+        self.gross_notional = self.gross_pos * px
+        self.net_notional = self.pnl_slope * px
+        self.margin = self.gross_notional * self.margin_coef
+        exposure = np.stack((self.gross_notional, self.net_notional, self.margin), axis=1)
+        self.account_exposure = self._rollup(self.account_names, self.account_id, exposure)
+        self.exchange_exposure = self._rollup(self.exchange_names, self.exchange_id, exposure)
+
+    @staticmethod
+    def _rollup(names, ids, exposure):
+        """sum exposure of shape (n_symbols, 3) by account/exchange ids"""
+        columns = [np.bincount(ids, weights=exposure[:, i], minlength=len(names)).tolist() for i in range(3)]
+        return dict((name, {'gross_notional': gross, 'net_notional': net, 'margin': margin})
+                    for name, gross, net, margin in zip(names, *columns))
+
+    def _refresh_exposure_row(self, row, last_px):
+        """mark exposure of a contract at last price and apply the deltas to account/exchange rollups, O(1)"""
+        px = 0.0 if last_px < 0.01 else last_px * self.pnl_scale.item(row)
+        gross = self.gross_pos.item(row) * px
+        net = self.pnl_slope.item(row) * px
+        margin = gross * self.margin_coef.item(row)
+        gross_delta = gross - self.gross_notional.item(row)
+        net_delta = net - self.net_notional.item(row)
+        margin_delta = margin - self.margin.item(row)
+        self.gross_notional[row] = gross
+        self.net_notional[row] = net
+        self.margin[row] = margin
+        for rollup in (self.account_exposure[self.symbol_account[row]],
+                       self.exchange_exposure[self.symbol_exchange[row]]):
+            rollup['gross_notional'] += gross_delta
+            rollup['net_notional'] += net_delta
+            rollup['margin'] += margin_delta
+
+    def refresh_contract_pnl(self, symbol):
+        """recompute running pnl of given contract after its position changed, O(1)
+
+        Parameters
+        ----------
+        symbol : str
+
+        Returns
+        -------
+        None
+
+        """
+        row = self.symbol_index[symbol]
+        long_open, long_close, short_open, short_close = self.matrix[row].tolist()
+        avg_px = [p[NOTIONAL] / p[POS] if p[POS] > 0 else 0 for p in (long_open, long_close, short_open, short_close)]
+        long_pos = long_open[POS] - short_close[POS]
+        short_pos = short_open[POS] - long_close[POS]
+        slope, intercept = 0.0, 0.0
+        if long_pos >= 0:
+            slope += long_pos
+            intercept -= long_pos * avg_px[LONG_OPEN]
+        if short_pos >= 0:
+            slope -= short_pos
+            intercept += short_pos * avg_px[SHORT_OPEN]
+        realized = min(long_open[POS], short_close[POS]) * (avg_px[SHORT_CLOSE] - avg_px[LONG_OPEN]) + \
+            min(short_open[POS], long_close[POS]) * (avg_px[SHORT_OPEN] - avg_px[LONG_CLOSE])
+        last_px = self.last_px.item(row)
+        unrealized = 0.0 if last_px < 0.01 else slope * last_px + intercept
+        delta = (realized + unrealized - self.realized.item(row) - self.unrealized.item(row)) * \
+            self.pnl_scale.item(row)
+        self.pnl_slope[row] = slope
+        self.pnl_intercept[row] = intercept
+        self.realized[row] = realized
+        self.unrealized[row] = unrealized
+        self.strategy_pnl += delta
+        self.account_pnl[self.symbol_account[row]] += delta
+        self.exchange_pnl[self.symbol_exchange[row]] += delta
+        self.gross_pos[row] = max(long_pos, 0) + max(short_pos, 0)
+        self._refresh_exposure_row(row, last_px)
+
+    def get_transaction_fee_batch(self, rows, sizes, prices, close_yes=None):
+        """transaction fees of a batch of fills, vectorized form of `FeeSchedule.fee`
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            rows of contracts, see `symbol_index`
+        sizes : numpy.ndarray
+        prices : numpy.ndarray
+        close_yes : numpy.ndarray, optional
+            bool, True for closing yesterday position
+
+        Returns
+        -------
+        fees : numpy.ndarray
+
+        """
+        if close_yes is None:
+            coef = self.fee_coef[rows, 0]
+        else:
+            coef = self.fee_coef[rows, np.asarray(close_yes, dtype=np.intp)]
+        return sizes * (coef[:, 0] + prices * coef[:, 1])
+
+    def get_symbol_position_detail(self, symbol):
+        """position of given symbol
+
+        Parameters
+        ----------
+        symbol : str
+
+        Returns
+        -------
+        position : list
+            0 for long open, 1 for long close, 2 for short open, 3 for short close.
+            A snapshot copied from matrix, writing to it does not change position.
+
+        """
+        row = self.matrix[self.symbol_index[symbol]]
+        return [{
+            'pos': int(row[i, POS]),
+            'notional': float(row[i, NOTIONAL]),
+            'yes_pos': int(row[i, YES_POS]),
+            'yes_notional': float(row[i, YES_NOTIONAL])
+        } for i in range(4)]
+
+    def get_long_position(self, symbol):
+        """long position of contract
+
+        Parameters
+        ----------
+        symbol : str
+            i.e. 'i1801'
+
+        Returns
+        -------
+        position : int
+
+        """
+        row = self.symbol_index[symbol]
+        return int(self.matrix.item(row, LONG_OPEN, POS) - self.matrix.item(row, SHORT_CLOSE, POS))
+
+    def get_short_position(self, symbol):
+        """short position of contract
+
+        Parameters
+        ----------
+        symbol
+
+        Returns
+        -------
+        position : int
+
+        """
+        row = self.symbol_index[symbol]
+        return int(self.matrix.item(row, SHORT_OPEN, POS) - self.matrix.item(row, LONG_CLOSE, POS))
+
+    def get_yes_position(self, symbol):
+        """
+
+        Parameters
+        ----------
+        symbol
+
+        Returns
+        -------
+        yesterday position : dict
+            ::
+                {
+                    "long": {"pos", "notional"},
+                    "short": {"pos", "notional"}
+                }
+
+        """
+        row = self.symbol_index[symbol]
+        return {
+            'long': {
+                'pos': int(self.matrix.item(row, LONG_OPEN, YES_POS)),
+                'notional': self.matrix.item(row, LONG_OPEN, YES_NOTIONAL)
+            },
+            'short': {
+                'pos': int(self.matrix.item(row, SHORT_OPEN, YES_POS)),
+                'notional': self.matrix.item(row, SHORT_OPEN, YES_NOTIONAL)
+            }
+        }
+
+    def get_avg_position_price(self, symbol, direction):
+        """calculate average price for current long or short position
+
+        Parameters
+        ----------
+        symbol : str
+        direction : int
+
+        Returns
+        -------
+        price : float or -1
+            -1 for error, otherwise average price
+
+        """
+        row = self.symbol_index[symbol]
+        if direction == BUY:
+            long_position = self.get_long_position(symbol)
+            if long_position > 0:
+                return (self.matrix.item(row, LONG_OPEN, NOTIONAL) - self.matrix.item(row, SHORT_CLOSE, NOTIONAL)) / \
+                       long_position
+            elif long_position == 0:
+                return 0.0
+            else:
+                print ("long position is less than 0")
+                return ERROR_CODE
+        else:
+            short_position = self.get_short_position(symbol)
+            if short_position > 0:
+                return (self.matrix.item(row, SHORT_OPEN, NOTIONAL) - self.matrix.item(row, LONG_CLOSE, NOTIONAL)) / \
+                       short_position
+            elif short_position == 0:
+                return 0.0
+            else:
+                print ("short position is less than 0")
+                return ERROR_CODE
+
+    def _open_avg_px(self, symbol, index):
+        row = self.symbol_index[symbol]
+        open_position = self.matrix.item(row, index, POS)
+        if open_position < 0:
+            print ("position is less than zero")
+            return ERROR_CODE
+        elif open_position == 0:
+            return 0.0
+        else:
+            return self.matrix.item(row, index, NOTIONAL) / open_position
+
+    def get_sell_open_avg_px(self, symbol):
+        """calculate average sell open price
+
+        Parameters
+        ----------
+        symbol : str
+
+        Returns
+        -------
+        price : float or -1
+            -1 for error, otherwise average price
+
+        """
+        return self._open_avg_px(symbol, SHORT_OPEN)
+
+    def get_buy_open_avg_px(self, symbol):
+        """calculate average buy open price
+
+        Parameters
+        ----------
+        symbol : str
+
+        Returns
+        -------
+        price : float or -1
+            -1 for error, otherwise average price
+
+        """
+        return self._open_avg_px(symbol, LONG_OPEN)
+
+    def update_position(self, response_type, response):
+        """update position on each response
+
+        Parameters
+        ----------
+        response_type : int
+            type of response
+        response : :obj:response
+            response from exchange
+
+        Returns
+        -------
+        None
+
+        """
+        if response.status in FILLED:
+            if response.exe_volume == 0:
+                return
+            split = None
+            # the ledger only follows fills which change position
+            if self.lot_ledger is not None and response.open_close in POSITION_OPEN_CLOSE:
+                split = self.lot_ledger.on_fill(response, self.CLOSE_YES_FIRST)
+            fill = self._fill_notional(response, split)
+            if fill is None:
+                return
+            _index, opposite_index, notional_change, notional_delta = fill
+            _position = self.matrix[self.symbol_index[response.symbol]]
+            # update yesterday pos, not accounting for fees
+            if split is not None:
+                _position[opposite_index, YES_POS] -= split[0]
+                _position[opposite_index, YES_NOTIONAL] -= split[1]
+            elif response.open_close == CLOSE_YES:
+                _position[opposite_index, YES_POS] -= response.exe_volume
+                _position[opposite_index, YES_NOTIONAL] -= notional_change
+            elif response.open_close == CLOSE and self.CLOSE_YES_FIRST:
+                if _position[opposite_index, YES_POS] - response.exe_volume > 0:
+                    _position[opposite_index, YES_POS] -= response.exe_volume
+                    _position[opposite_index, YES_NOTIONAL] -= notional_change
+                else:
+                    _position[opposite_index, YES_POS] = 0
+                    _position[opposite_index, YES_NOTIONAL] = 0.0
+            # update today pos, accounting fees as cost for position
+            _position[_index, NOTIONAL] += notional_delta
+            _position[_index, POS] += response.exe_volume
+            self.refresh_contract_pnl(response.symbol)
+
+    def settle(self, settle_prices, mark_to_settle=True):
+        """end of day settlement of all contracts in one vectorized pass, see `PosMgrBase.settle`
+
+        Parameters
+        ----------
+        settle_prices : dict or numpy.ndarray
+            symbol: settlement price, or settlement prices in order of `symbols`.
+            Last price is used for symbols not given or priced 0.
+        mark_to_settle : bool
+            True for futures daily mark to market, False to carry cost basis, i.e. stocks
+
+        Returns
+        -------
+        pnl : float
+            pnl by cash settled, also added to `settled_pnl`
+
+        """
+        if isinstance(settle_prices, dict):
+            rows = [self.symbol_index[symbol] for symbol in settle_prices]
+            settle_px = self.last_px.copy()
+            settle_px[rows] = list(settle_prices.values())
+        else:
+            settle_px = np.asarray(settle_prices, dtype=np.float64)
+        settle_px = np.where(settle_px >= 0.01, settle_px, self.last_px)
+        self.last_px[:] = settle_px
+        pos = self.matrix[:, :, POS]
+        avg_px = self.avg_px_vector(self.matrix)
+        long_pos = np.maximum(pos[:, LONG_OPEN] - pos[:, SHORT_CLOSE], 0.0)
+        short_pos = np.maximum(pos[:, SHORT_OPEN] - pos[:, LONG_CLOSE], 0.0)
+        pnl = self.realized_pnl_vector()
+        long_cost = avg_px[:, LONG_OPEN]
+        short_cost = avg_px[:, SHORT_OPEN]
+        if mark_to_settle:
+            mark = settle_px >= 0.01
+            pnl += np.where(mark, self.unrealized_pnl_vector(), 0.0)
+            long_cost = np.where(mark, settle_px, long_cost)
+            short_cost = np.where(mark, settle_px, short_cost)
+        settled = float(np.dot(pnl, self.pnl_scale))
+        self.matrix[:] = 0.0
+        self.matrix[:, LONG_OPEN, POS] = long_pos
+        self.matrix[:, LONG_OPEN, YES_POS] = long_pos
+        self.matrix[:, LONG_OPEN, NOTIONAL] = long_pos * long_cost
+        self.matrix[:, LONG_OPEN, YES_NOTIONAL] = long_pos * long_cost
+        self.matrix[:, SHORT_OPEN, POS] = short_pos
+        self.matrix[:, SHORT_OPEN, YES_POS] = short_pos
+        self.matrix[:, SHORT_OPEN, NOTIONAL] = short_pos * short_cost
+        self.matrix[:, SHORT_OPEN, YES_NOTIONAL] = short_pos * short_cost
+        if self.lot_ledger is not None:
+            marked = (settle_px >= 0.01).tolist() if mark_to_settle else [False] * len(self.symbols)
+            for symbol, px, is_marked in zip(self.symbols, settle_px.tolist(), marked):
+                self.lot_ledger.settle(symbol, px if is_marked else None)
+        self.settled_pnl += settled
+        self.init_pnl()
+        return settled
+
+    def set_last_px(self, symbol, last_px, int_time=None):
+        """update last price of contract whose symbol is already resolved
+
+        Parameters
+        ----------
+        symbol : str
+        last_px : float
+        int_time : int or None
+
+        Returns
+        -------
+        None
+
+        """
+        if int_time is not None and self.lot_ledger is not None:
+            self.lot_ledger.now = int_time
+        row = self.symbol_index[symbol]
+        self.last_px[row] = last_px
+        # apply the delta of unrealized pnl
+        unrealized = 0.0 if last_px < 0.01 else self.pnl_slope.item(row) * last_px + self.pnl_intercept.item(row)
+        delta = (unrealized - self.unrealized.item(row)) * self.pnl_scale.item(row)
+        self.unrealized[row] = unrealized
+        self.strategy_pnl += delta
+        self.account_pnl[self.symbol_account[row]] += delta
+        self.exchange_pnl[self.symbol_exchange[row]] += delta
+        if self.gross_pos.item(row) or self.gross_notional.item(row):
+            self._refresh_exposure_row(row, last_px)
+
+    def set_margin_rate(self, symbol, margin_rate):
+        """set margin rate of contract used by margin of exposure, 1.0 by default (full notional)
+
+        Parameters
+        ----------
+        symbol : str
+        margin_rate : float
+
+        Returns
+        -------
+        None
+
+        """
+        self.margin_rate[symbol] = margin_rate
+        row = self.symbol_index[symbol]
+        self.margin_coef[row] = margin_rate
+        self._refresh_exposure_row(row, self.last_px.item(row))
+
+    def get_symbol_ids(self, symbols):
+        """precompute rows of symbols for `update_last_px_batch`
+
+        Parameters
+        ----------
+        symbols : list
+            i.e. tickers of a snapshot feed
+
+        Returns
+        -------
+        symbol_ids : numpy.ndarray
+
+        """
+        return np.array([self.symbol_index[symbol] for symbol in symbols], dtype=np.intp)
+
+    def update_last_px_batch(self, symbol_ids, prices, int_time=None):
+        """update last prices of many contracts from a cross-sectional snapshot,
+        unrealized pnl and running pnl are updated in the same vectorized step
+
+        Parameters
+        ----------
+        symbol_ids : numpy.ndarray
+            unique rows of contracts, see `get_symbol_ids`
+        prices : numpy.ndarray
+            last prices in order of `symbol_ids`
+        int_time : int, optional
+            time of snapshot, passed to lot ledger
+
+        Returns
+        -------
+        None
+
+        """
+        prices = np.asarray(prices, dtype=np.float64)
+        self.last_px[symbol_ids] = prices
+        unrealized = np.where(prices < 0.01, 0.0,
+                              self.pnl_slope[symbol_ids] * prices + self.pnl_intercept[symbol_ids])
+        delta = (unrealized - self.unrealized[symbol_ids]) * self.pnl_scale[symbol_ids]
+        self.unrealized[symbol_ids] = unrealized
+        self.strategy_pnl += float(delta.sum())
+        account_delta = np.bincount(self.account_id[symbol_ids], weights=delta, minlength=len(self.account_names))
+        for account, account_pnl in zip(self.account_names, account_delta.tolist()):
+            self.account_pnl[account] += account_pnl
+        exchange_ids = self.exchange_id[symbol_ids]
+        exchange_delta = np.bincount(exchange_ids, weights=delta, minlength=len(self.exchange_names))
+        for exchange, exchange_pnl in zip(self.exchange_names, exchange_delta.tolist()):
+            self.exchange_pnl[exchange] += exchange_pnl
+
+        px = np.where(prices < 0.01, 0.0, prices * self.pnl_scale[symbol_ids])
+        gross = self.gross_pos[symbol_ids] * px
+        net = self.pnl_slope[symbol_ids] * px
+        margin = gross * self.margin_coef[symbol_ids]
+        exposure_delta = np.stack((gross - self.gross_notional[symbol_ids], net - self.net_notional[symbol_ids],
+                                   margin - self.margin[symbol_ids]), axis=1)
+        self.gross_notional[symbol_ids] = gross
+        self.net_notional[symbol_ids] = net
+        self.margin[symbol_ids] = margin
+        for rollups, names, ids in ((self.account_exposure, self.account_names, self.account_id[symbol_ids]),
+                                    (self.exchange_exposure, self.exchange_names, exchange_ids)):
+            for name, rollup_delta in self._rollup(names, ids, exposure_delta).items():
+                rollup = rollups[name]
+                for key, value in rollup_delta.items():
+                    rollup[key] += value
+        if int_time is not None and self.lot_ledger is not None:
+            self.lot_ledger.now = int_time
+
+    def get_realized_pnl(self, symbol):
+        """calculate realized pnl by points, see `PosMgrBase.get_realized_pnl`
+
+        Parameters
+        ----------
+        symbol : str
+
+        Returns
+        -------
+        pnl : float
+            by points
+
+        """
+        return float(self.realized_pnl_vector(self.symbol_index[symbol]))
+
+    def get_unrealized_pnl(self, symbol):
+        """calculate unrealized pnl by points, see `PosMgrBase.get_unrealized_pnl`
+
+        Parameters
+        ----------
+        symbol : str
+
+        Returns
+        -------
+        pnl : float
+            by points
+
+        """
+        return float(self.unrealized_pnl_vector(self.symbol_index[symbol]))
+
+    def get_contract_pnl_cash(self, symbol):
+        """get total contract pnl by cash, read from running pnl
+
+        Parameters
+        ----------
+        symbol : str
+
+        Returns
+        -------
+        pnl : float
+            by cash
+
+        """
+        row = self.symbol_index[symbol]
+        return (self.realized.item(row) + self.unrealized.item(row)) * self.pnl_scale.item(row)
+
+    def recompute_pnl_cash(self):
+        """recompute pnl by cash of every contract from positions and last prices, vectorized
+
+        Returns
+        -------
+        pnl : dict
+            symbol: pnl by cash
+
+        """
+        return dict(zip(self.symbols, self.pnl_cash_vector().tolist()))
+
+    def recompute_strategy_pnl_cash(self):
+        """recompute strategy pnl by cash from scratch, vectorized
+
+        Returns
+        -------
+        pnl : float
+            by cash
+
+        """
+        return float(self.pnl_cash_vector().sum())
+
+    def recompute_exposure(self):
+        """recompute exposure by cash of every contract from matrix and last prices, vectorized
+
+        Returns
+        -------
+        exposure : dict
+            symbol: {'gross_notional', 'net_notional', 'margin'}
+
+        """
+        pos = self.matrix[:, :, POS]
+        long_pos = np.maximum(pos[:, LONG_OPEN] - pos[:, SHORT_CLOSE], 0.0)
+        short_pos = np.maximum(pos[:, SHORT_OPEN] - pos[:, LONG_CLOSE], 0.0)
+        px = np.where(self.last_px < 0.01, 0.0, self.last_px * self.multiple * self.exch_rate)
+        gross = ((long_pos + short_pos) * px).tolist()
+        net = ((long_pos - short_pos) * px).tolist()
+        margin = ((long_pos + short_pos) * px * [self.margin_rate.get(s, 1.0) for s in self.symbols]).tolist()
+        return dict((symbol, {'gross_notional': g, 'net_notional': n, 'margin': m})
+                    for symbol, g, n, m in zip(self.symbols, gross, net, margin))
+
+    @staticmethod
+    def avg_px_vector(pos_info):
+        """average price of position, vectorized `PosMgrBase.avg_px`
+
+        Parameters
+        ----------
+        pos_info : numpy.ndarray
+            shape (..., N_FIELDS)
+
+        Returns
+        -------
+        price : numpy.ndarray
+            shape (...), 0 where there is no position
+
+        """
+        pos = pos_info[..., POS]
+        return np.divide(pos_info[..., NOTIONAL], pos, out=np.zeros(pos.shape), where=pos > 0)
+
+    def realized_pnl_vector(self, rows=slice(None)):
+        """realized pnl by points of contracts at given rows
+
+        Parameters
+        ----------
+        rows : int, slice or numpy.ndarray
+            rows of matrix, all contracts by default
+
+        Returns
+        -------
+        pnl : numpy.ndarray
+            by points
+
+        """
+        _position = self.matrix[rows]
+        avg_px = self.avg_px_vector(_position)
+        pos = _position[..., POS]
+        long_pos = np.minimum(pos[..., LONG_OPEN], pos[..., SHORT_CLOSE])
+        short_pos = np.minimum(pos[..., SHORT_OPEN], pos[..., LONG_CLOSE])
+        return long_pos * (avg_px[..., SHORT_CLOSE] - avg_px[..., LONG_OPEN]) + \
+            short_pos * (avg_px[..., SHORT_OPEN] - avg_px[..., LONG_CLOSE])
+
+    def unrealized_pnl_vector(self, rows=slice(None)):
+        """unrealized pnl by points of contracts at given rows, based on last price
+
+        Parameters
+        ----------
+        rows : int, slice or numpy.ndarray
+            rows of matrix, all contracts by default
+
+        Returns
+        -------
+        pnl : numpy.ndarray
+            by points
+
+        """
+        _position = self.matrix[rows]
+        last_px = self.last_px[rows]
+        avg_px = self.avg_px_vector(_position)
+        pos = _position[..., POS]
+        long_pos = pos[..., LONG_OPEN] - pos[..., SHORT_CLOSE]
+        short_pos = pos[..., SHORT_OPEN] - pos[..., LONG_CLOSE]
+        long_side = np.where(long_pos >= 0, long_pos * (last_px - avg_px[..., LONG_OPEN]), 0.0)
+        short_side = np.where(short_pos >= 0, short_pos * (avg_px[..., SHORT_OPEN] - last_px), 0.0)
+        return np.where(last_px < 0.01, 0.0, long_side + short_side)
+
+    def pnl_cash_vector(self):
+        """pnl by cash of all contracts, recomputed from matrix
+
+        Returns
+        -------
+        pnl : numpy.ndarray
+            shape (n_symbols, ), in order of `symbols`
+
+        """
+        return (self.realized_pnl_vector() + self.unrealized_pnl_vector()) * self.multiple * self.exch_rate
+
+    def net_position_vector(self):
+        """net position (LONG - SHORT) of all contracts
+
+        Returns
+        -------
+        position : numpy.ndarray
+            shape (n_symbols, ), in order of `symbols`
+
+        """
+        pos = self.matrix[:, :, POS]
+        return (pos[:, LONG_OPEN] - pos[:, SHORT_CLOSE]) - (pos[:, SHORT_OPEN] - pos[:, LONG_CLOSE])
+
+    def get_net_exposure(self):
+        """net exposure by cash of all contracts, marked at last price
+
+        Returns
+        -------
+        exposure : float
+            by cash
+
+        """
+        return float(np.dot(self.net_position_vector() * self.last_px * self.multiple, self.exch_rate))
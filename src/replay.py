@@ -0,0 +1,426 @@
+"""Tick replay harness
+
+Recorded or synthetic ticks are streamed through a strategy with the platform callbacks
+`on_init`/`on_book`/`on_response`. Orders sent through `my.sdp.api.Order` (and so `SyncOrder`)
+are matched by `SimExchange` against the replayed book, responses come back after a fixed
+latency. Ticks are kept in numpy structured arrays of `TICK_DTYPE`.
+
+If `my.sdp.api` can not be imported, `sim_api.install_api` registers stand-ins of the api classes in
+`sys.modules`, so that `order`, `position`, `sync_order` and strategies import as usual.
+Importing this module installs them.
+"""
+from collections import deque
+
+import numpy as np
+
+from bar import BarGenerator
+from perf import Probe, perf_counter_ns
+# stand-ins are re-exported for strategies importing them from replay
+from sim_api import (Direction, OpenClose, OrderStatus, InvestorType, OrderType, TIF, Exchange, Logger, Order,
+                     install_api)
+
+try:
+    from time import perf_counter as clock
+except ImportError:
+    from time import time as clock
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+"""Constants
+"""
+DEPTH = 5
+CHUNK_SIZE = 65536
+# finished orders kept by SimExchange for cancel rejects
+FINISHED_CACHE = 4096
+TICK_DTYPE = np.dtype([
+    ('sid', 'i4'), ('int_time', 'i8'), ('last_px', 'f8'),
+    ('bp', 'f8', (DEPTH, )), ('ap', 'f8', (DEPTH, )), ('bv', 'i8', (DEPTH, )), ('av', 'i8', (DEPTH, )),
+    ('total_vol', 'i8'), ('total_notional', 'f8'), ('open_interest', 'i8'),
+    ('upper_limit_px', 'f8'), ('lower_limit_px', 'f8')
+])
+# order record of SimExchange
+ORD_SYMBOL = 0
+ORD_PRICE = 1
+ORD_LEAVES = 2
+ORD_DIRECTION = 3
+ORD_OPEN_CLOSE = 4
+ORD_LIVE_MS = 5
+
+
+install_api()
+
+
+class Struct(object):
+    """plain object of keyword attributes, used for context, config and quotes"""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class Response(object):
+    __slots__ = ('order_id', 'symbol', 'direction', 'open_close', 'exe_price', 'exe_volume', 'status',
+                 'error_no', 'error_info')
+
+    def __init__(self, order_id, symbol, direction, open_close, exe_price, exe_volume, status,
+                 error_no=0, error_info=''):
+        self.order_id = order_id
+        self.symbol = symbol
+        self.direction = direction
+        self.open_close = open_close
+        self.exe_price = exe_price
+        self.exe_volume = exe_volume
+        self.status = status
+        self.error_no = error_no
+        self.error_info = error_info
+
+
+def ms_to_int_time(ms):
+    """inverse of `BarGenerator.int_time_to_ms`, works on numpy arrays"""
+    return ms // 3600000 * 10000000 + ms // 60000 % 60 * 100000 + ms % 60000
+
+
+def make_config(symbols, exch='SHFE', multiple=1, fee=None, account='sim', cash=1e9, yes_pos=0, price=0.0):
+    """config of contracts and an account in the structure passed to `on_init`
+
+    Parameters
+    ----------
+    symbols : list
+    exch : str or list
+        exchange short name of all contracts or of each contract
+    multiple : int
+    fee : dict or None
+        `contract.fee`, stock or futures default by exchange if None
+    account : str
+    cash : float
+    yes_pos : int
+        yesterday long position of each contract
+    price : float
+        price of yesterday position
+
+    Returns
+    -------
+    config : Struct
+        with contracts, accounts
+
+    """
+    contracts = []
+    for i, symbol in enumerate(symbols):
+        contract_exch = exch if isinstance(exch, str) else exch[i]
+        is_stock = contract_exch in (Exchange.SSE.short_name, Exchange.SZSE.short_name)
+        if fee is not None:
+            contract_fee = fee
+        elif is_stock:
+            contract_fee = {'exchange_fee': 0.0000487, 'yes_exchange_fee': 0.0000487, 'broker_fee': 0.0002,
+                            'fee_by_lot': 1, 'acc_transfer_fee': 0.00002, 'stamp_tax': 0.001}
+        else:
+            contract_fee = {'exchange_fee': 0.00005, 'yes_exchange_fee': 0.00005, 'broker_fee': 0.00001,
+                            'fee_by_lot': 1, 'acc_transfer_fee': 0.0, 'stamp_tax': 0.0}
+        contracts.append(Struct(
+            symbol=symbol, exch=contract_exch, account=account, multiple=multiple, fee=contract_fee,
+            yesterday_pos={'long_volume': yes_pos, 'long_price': price, 'short_volume': 0, 'short_price': 0.0},
+            today_pos={'long_volume': yes_pos, 'long_price': price, 'short_volume': 0, 'short_price': 0.0}
+        ))
+    accounts = [Struct(account=account, cash_available=cash, cash_asset=cash, exch_rate=1.0)]
+    return Struct(contracts=contracts, accounts=accounts)
+
+
+def synthetic_ticks(n_symbols, n_ticks, seed=0, start_time=90000000, interval=500, price=100.0, tick_size=0.2):
+    """random walk ticks of `n_symbols` contracts, one tick of each contract every `interval` ms
+
+    Parameters
+    ----------
+    n_symbols : int
+    n_ticks : int
+        ticks of each contract
+    seed : int
+    start_time : int
+        int time of first tick
+    interval : int
+        milliseconds
+    price : float
+        start price
+    tick_size : float
+
+    Returns
+    -------
+    ticks : numpy.ndarray
+        TICK_DTYPE, shape (n_symbols * n_ticks, ), sorted by time, sid is index of contract
+
+    """
+    rng = np.random.RandomState(seed)
+    ticks = np.zeros(n_symbols * n_ticks, dtype=TICK_DTYPE)
+    ms = BarGenerator.int_time_to_ms(start_time) + np.arange(n_ticks, dtype=np.int64) * interval
+    ticks['sid'] = np.tile(np.arange(n_symbols, dtype=np.int32), n_ticks)
+    ticks['int_time'] = np.repeat(ms_to_int_time(ms), n_symbols)
+    # shape (n_ticks, n_symbols)
+    last_px = price + tick_size * np.cumsum(rng.randint(-1, 2, size=(n_ticks, n_symbols)), axis=0)
+    last_px = np.maximum(last_px, tick_size).ravel()
+    levels = np.arange(DEPTH) * tick_size
+    ticks['last_px'] = last_px
+    ticks['bp'] = last_px[:, None] - levels
+    ticks['ap'] = last_px[:, None] + tick_size + levels
+    ticks['bv'] = rng.randint(1, 50, size=(len(ticks), DEPTH))
+    ticks['av'] = rng.randint(1, 50, size=(len(ticks), DEPTH))
+    volume = rng.randint(0, 20, size=(n_ticks, n_symbols))
+    ticks['total_vol'] = np.cumsum(volume, axis=0).ravel()
+    ticks['total_notional'] = np.cumsum(volume * last_px.reshape(n_ticks, n_symbols), axis=0).ravel()
+    ticks['open_interest'] = 10000
+    ticks['upper_limit_px'] = price * 1.1
+    ticks['lower_limit_px'] = price * 0.9
+    return ticks
+
+
+def save_ticks(path, ticks, symbols):
+    """save ticks and symbols of sid to `.npz`"""
+    np.savez(path, ticks=ticks, symbols=np.array(symbols))
+
+
+def load_ticks(path):
+    """load ticks saved by `save_ticks`
+
+    Returns
+    -------
+    ticks : numpy.ndarray
+    symbols : list
+
+    """
+    with np.load(path) as data:
+        return data['ticks'], data['symbols'].tolist()
+
+
+class SimExchange(object):
+    """Matching stand-in of the trading gateway
+
+    Orders go live `latency` ms after sending and trade against the top of book of later ticks,
+    buy orders at ask1 up to av1 and sell orders at bid1 up to bv1. Cancels take effect at once.
+    Each response is delivered `latency` ms after the event.
+
+    Attributes
+    ----------
+    latency : int
+        milliseconds
+    now : int
+        milliseconds of current tick
+    orders : dict
+        order_id: [symbol, price, leaves_qty, direction, open_close, live_ms] of live orders
+    book : dict
+        symbol: order ids of live orders
+    finished : dict
+        order_id: order record of the latest finished orders, at most FINISHED_CACHE
+    responses : collections.deque
+        (due_ms, response) in time order
+    """
+
+    def __init__(self, latency=1):
+        self.latency = latency
+        self.now = 0
+        self.next_order_id = 1
+        self.orders = {}
+        self.book = {}
+        self.finished = {}
+        self.responses = deque()
+        self.n_orders = 0
+        self.n_cancels = 0
+        self.n_fills = 0
+
+    def _respond(self, order_id, order, exe_price, exe_volume, status):
+        self.responses.append((self.now + self.latency, Response(
+            order_id, order[ORD_SYMBOL], order[ORD_DIRECTION], order[ORD_OPEN_CLOSE], exe_price, exe_volume, status
+        )))
+
+    def _finish(self, order_id):
+        self.finished[order_id] = self.orders.pop(order_id)
+        if len(self.finished) > FINISHED_CACHE:
+            del self.finished[next(iter(self.finished))]
+
+    def send_order(self, symbol, price, size, direction, open_close):
+        order_id = self.next_order_id
+        self.next_order_id += 1
+        order = [symbol, price, size, int(direction), int(open_close), self.now + self.latency]
+        self.orders[order_id] = order
+        self.book.setdefault(symbol, []).append(order_id)
+        self._respond(order_id, order, 0.0, 0, OrderStatus.ENTRUSTED.value)
+        self.n_orders += 1
+        return order_id
+
+    def cancel_order(self, order_id):
+        if order_id in self.orders:
+            order = self.orders[order_id]
+            self.book[order[ORD_SYMBOL]].remove(order_id)
+            self._finish(order_id)
+            self._respond(order_id, order, 0.0, 0, OrderStatus.CANCELED.value)
+        elif order_id in self.finished:
+            # finished before cancel arrives
+            self.responses.append((self.now + self.latency, Response(
+                order_id, self.finished[order_id][ORD_SYMBOL], self.finished[order_id][ORD_DIRECTION],
+                self.finished[order_id][ORD_OPEN_CLOSE], 0.0, 0, OrderStatus.CANCEL_REJECTED.value, -1,
+                'order finished'
+            )))
+        else:
+            return -1
+        self.n_cancels += 1
+        return 0
+
+    def match(self, symbol, bid, ask, bid_vol, ask_vol):
+        """match live orders of symbol against top of book"""
+        order_ids = self.book[symbol]
+        filled = []
+        for order_id in order_ids:
+            order = self.orders[order_id]
+            if order[ORD_LIVE_MS] > self.now:
+                continue
+            if order[ORD_DIRECTION] == Direction.BUY.value:
+                if ask <= 0 or order[ORD_PRICE] < ask or ask_vol <= 0:
+                    continue
+                volume = min(order[ORD_LEAVES], ask_vol)
+                ask_vol -= volume
+                price = ask
+            else:
+                if bid <= 0 or order[ORD_PRICE] > bid or bid_vol <= 0:
+                    continue
+                volume = min(order[ORD_LEAVES], bid_vol)
+                bid_vol -= volume
+                price = bid
+            order[ORD_LEAVES] -= volume
+            self.n_fills += 1
+            if order[ORD_LEAVES] == 0:
+                self._respond(order_id, order, price, volume, OrderStatus.SUCCEED.value)
+                filled.append(order_id)
+            else:
+                self._respond(order_id, order, price, volume, OrderStatus.PARTED.value)
+        for order_id in filled:
+            order_ids.remove(order_id)
+            self._finish(order_id)
+
+
+class Replayer(object):
+    """Replay ticks through a strategy
+
+    Attributes
+    ----------
+    strategy : object
+        module or object with on_init(context, config_type, config), on_book(context, quote_type, quote)
+        and on_response(context, response_type, response)
+    config : object
+        passed to on_init, i.e. from `make_config`
+    ticks : numpy.ndarray
+        TICK_DTYPE sorted by time
+    symbols : list
+        sid -> symbol
+    quote_type : {0, 1}
+        0 for futures quotes (symbol, int_time), 1 for stock quotes (ticker, exch_time)
+    context : Struct
+        context of strategy, `context.sim_exchange` is the `SimExchange`
+    timing : dict
+        callback: perf.Probe
+    """
+    CALLBACKS = ('on_init', 'on_book', 'on_response')
+
+    def __init__(self, strategy, config, ticks, symbols, quote_type=0, latency=1, config_type=0):
+        self.strategy = strategy
+        self.config = config
+        self.config_type = config_type
+        self.ticks = ticks
+        self.symbols = list(symbols)
+        self.quote_type = quote_type
+        self.exchange = SimExchange(latency)
+        self.context = Struct(sim_exchange=self.exchange)
+        self.quotes = [Struct(
+            symbol=symbol, ticker=symbol, int_time=0, exch_time=0, feed_type=0, last_px=0.0,
+            bp_array=[], ap_array=[], bv_array=[], av_array=[], total_vol=0, total_notional=0.0,
+            open_interest=0, upper_limit_px=0.0, lower_limit_px=0.0
+        ) for symbol in self.symbols]
+        # callback: Probe
+        self.timing = dict((name, Probe(name)) for name in self.CALLBACKS)
+
+    def _deliver(self, until_ms):
+        """deliver responses due before `until_ms`"""
+        responses = self.exchange.responses
+        on_response = self.strategy.on_response
+        context = self.context
+        probe = self.timing['on_response']
+        while responses and responses[0][0] <= until_ms:
+            due_ms, response = responses.popleft()
+            self.exchange.now = due_ms
+            start = perf_counter_ns()
+            on_response(context, 0, response)
+            probe.add(perf_counter_ns() - start)
+
+    def run(self, trace_memory=False):
+        """replay all ticks, responses left are delivered after the last tick
+
+        Parameters
+        ----------
+        trace_memory : bool
+            trace peak memory with tracemalloc, which slows down the replay
+
+        Returns
+        -------
+        stats : dict
+            ticks, seconds, ticks_per_sec, orders, cancels, fills, responses, `<callback>_ns` average and
+            `<callback>_p99_ns` 99th percentile nanoseconds of each callback, peak_memory in bytes if traced
+
+        """
+        trace_memory = trace_memory and tracemalloc is not None
+        if trace_memory:
+            tracemalloc.start()
+        exchange = self.exchange
+        context = self.context
+        on_book = self.strategy.on_book
+        quote_type = self.quote_type
+        symbols = self.symbols
+        quotes = self.quotes
+        book = exchange.book
+        responses = exchange.responses
+        book_probe = self.timing['on_book']
+        int_time_to_ms = BarGenerator.int_time_to_ms
+
+        begin = clock()
+        start = perf_counter_ns()
+        self.strategy.on_init(context, self.config_type, self.config)
+        self.timing['on_init'].add(perf_counter_ns() - start)
+        for offset in range(0, len(self.ticks), CHUNK_SIZE):
+            chunk = self.ticks[offset:offset + CHUNK_SIZE]
+            for (sid, int_time, last_px, bp, ap, bv, av, total_vol, total_notional, open_interest,
+                 upper_limit_px, lower_limit_px) in zip(*[chunk[name].tolist() for name in TICK_DTYPE.names]):
+                now = int_time_to_ms(int_time)
+                if responses and responses[0][0] <= now:
+                    self._deliver(now)
+                exchange.now = now
+                quote = quotes[sid]
+                quote.int_time = quote.exch_time = int_time
+                quote.last_px = last_px
+                quote.bp_array = bp
+                quote.ap_array = ap
+                quote.bv_array = bv
+                quote.av_array = av
+                quote.total_vol = total_vol
+                quote.total_notional = total_notional
+                quote.open_interest = open_interest
+                quote.upper_limit_px = upper_limit_px
+                quote.lower_limit_px = lower_limit_px
+                symbol = symbols[sid]
+                if book.get(symbol):
+                    exchange.match(symbol, bp[0], ap[0], bv[0], av[0])
+                start = perf_counter_ns()
+                on_book(context, quote_type, quote)
+                book_probe.add(perf_counter_ns() - start)
+        while responses:
+            self._deliver(responses[-1][0])
+        seconds = clock() - begin
+
+        stats = {
+            'ticks': len(self.ticks), 'seconds': seconds,
+            'ticks_per_sec': len(self.ticks) / seconds if seconds > 0 else 0.0,
+            'orders': exchange.n_orders, 'cancels': exchange.n_cancels, 'fills': exchange.n_fills,
+            'responses': self.timing['on_response'].count
+        }
+        for name, probe in self.timing.items():
+            stats[name + '_ns'] = probe.total / float(probe.count) if probe.count else 0.0
+            stats[name + '_p99_ns'] = probe.percentile(99)
+        if trace_memory:
+            stats['peak_memory'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return stats
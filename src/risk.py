@@ -0,0 +1,287 @@
+"""Pre-trade risk checks on top of `PosMgrBase`
+
+Cash, margin, exposure and order counts are maintained incrementally from sent orders and
+responses, so `RiskEngine.check` is O(1) and can be called before every order is sent.
+`SyncOrder.send_single_order` calls it when `SyncOrder.risk` is set.
+"""
+from enum import IntEnum
+
+from consts import (BUY, SELL, OPEN, CLOSE_YES, SUCCEED, FILLED, DEAD)
+
+"""Constants
+"""
+INF = float('inf')
+# index of qty in held, cost is at index + 1
+LONG = 0
+SHORT = 2
+# fields of limit
+MAX_POS = 0
+MAX_GROSS = 1
+MAX_NET = 2
+MAX_ACTIVE_ORDERS = 3
+
+
+class RiskRet(IntEnum):
+    OK = 0
+    CASH_EXCEEDED = -2001
+    POSITION_EXCEEDED = -2002
+    GROSS_EXPOSURE_EXCEEDED = -2003
+    NET_EXPOSURE_EXCEEDED = -2004
+    ACTIVE_ORDERS_EXCEEDED = -2005
+    ORDER_COUNT_EXCEEDED = -2006
+
+
+class RiskEngine(object):
+    """Pre-trade risk engine
+
+    Attributes
+    ----------
+    posmgr : PosMgrBase
+        provides positions, contracts, fee schedules and margin rates, positions should be updated by
+        `update_position`
+    cash : dict
+        account: cash after filled orders, starts from `cash_available` of account
+    reserved : dict
+        account: cash/margin reserved by orders in flight
+    margin : dict
+        account: margin held by positions
+    held : dict
+        symbol: [long_qty, long_cost, short_qty, short_cost], cost by points
+    pending : dict
+        symbol: [long_open_qty, short_open_qty] of orders in flight
+    active_orders : dict
+        symbol: number of orders in flight
+    orders : dict
+        order_id: [symbol, direction, open_close, leaves_qty, reserve_per_lot] of orders in flight
+    limits : dict
+        symbol: [max_pos, max_gross, max_net, max_active_orders], inf for no limit
+    max_orders : int or float
+        limit of orders sent in session
+    order_count : int
+        orders sent in session
+    """
+
+    def __init__(self, posmgr, max_orders=INF):
+        self.posmgr = posmgr
+        self.max_orders = max_orders
+        self.order_count = 0
+        self.cash = dict((account, info['cash_available']) for account, info in posmgr.account.items())
+        self.reserved = dict((account, 0.0) for account in posmgr.account)
+        self.margin = dict((account, 0.0) for account in posmgr.account)
+        self.held = {}
+        self.pending = {}
+        self.active_orders = {}
+        self.orders = {}
+        self.limits = {}
+        for symbol in posmgr.contract_info:
+            long_pos = max(posmgr.get_long_position(symbol), 0)
+            short_pos = max(posmgr.get_short_position(symbol), 0)
+            self.held[symbol] = [
+                long_pos, long_pos * posmgr.get_avg_position_price(symbol, BUY) if long_pos else 0.0,
+                short_pos, short_pos * posmgr.get_avg_position_price(symbol, SELL) if short_pos else 0.0
+            ]
+            self.pending[symbol] = [0, 0]
+            self.active_orders[symbol] = 0
+            self.limits[symbol] = [INF, INF, INF, INF]
+
+    def set_limit(self, symbol, max_pos=None, max_gross=None, max_net=None, max_active_orders=None):
+        """set risk limits of contract, None keeps current limit
+
+        Parameters
+        ----------
+        symbol : str
+        max_pos : int
+            max long or short position including orders in flight
+        max_gross : float
+            max (long + short) * price * multiple by cash
+        max_net : float
+            max abs(long - short) * price * multiple by cash
+        max_active_orders : int
+            max number of orders in flight
+
+        Returns
+        -------
+        None
+
+        """
+        limit = self.limits[symbol]
+        for field, value in ((MAX_POS, max_pos), (MAX_GROSS, max_gross), (MAX_NET, max_net),
+                             (MAX_ACTIVE_ORDERS, max_active_orders)):
+            if value is not None:
+                limit[field] = value
+
+    def set_margin_rate(self, symbol, margin_rate):
+        """set margin rate of contract in the position manager, 1.0 by default (full notional),
+        see `PosMgrBase.set_margin_rate`
+
+        Parameters
+        ----------
+        symbol : str
+        margin_rate : float
+
+        Returns
+        -------
+        None
+
+        """
+        self.posmgr.set_margin_rate(symbol, margin_rate)
+
+    def available_cash(self, account):
+        """cash available for new orders
+
+        Parameters
+        ----------
+        account : str
+
+        Returns
+        -------
+        cash : float
+
+        """
+        return self.cash[account] - self.reserved[account]
+
+    def _reserve_per_lot(self, symbol, price, direction, open_close):
+        contract = self.posmgr.contract_info[symbol]
+        schedule = self.posmgr.fee_schedule[symbol]
+        reserve = schedule.fee(1, price) * contract.multiple
+        if direction == SELL:
+            reserve += price * schedule.stamp_tax * contract.multiple
+        if open_close == OPEN:
+            reserve += price * contract.multiple * self.posmgr.margin_rate[symbol]
+        return reserve
+
+    def check(self, symbol, price, size, direction, open_close):
+        """check order before sending, O(1)
+
+        Parameters
+        ----------
+        symbol : str
+        price : float
+        size : int
+        direction : int
+        open_close : int
+
+        Returns
+        -------
+        ret : RiskRet
+            RiskRet.OK if order passes all checks
+
+        """
+        if self.order_count >= self.max_orders:
+            return RiskRet.ORDER_COUNT_EXCEEDED
+        limit = self.limits[symbol]
+        if self.active_orders[symbol] >= limit[MAX_ACTIVE_ORDERS]:
+            return RiskRet.ACTIVE_ORDERS_EXCEEDED
+        contract = self.posmgr.contract_info[symbol]
+        if open_close == OPEN:
+            pending = self.pending[symbol]
+            long_pos = self.posmgr.get_long_position(symbol) + pending[0]
+            short_pos = self.posmgr.get_short_position(symbol) + pending[1]
+            if direction == BUY:
+                long_pos += size
+                if long_pos > limit[MAX_POS]:
+                    return RiskRet.POSITION_EXCEEDED
+            else:
+                short_pos += size
+                if short_pos > limit[MAX_POS]:
+                    return RiskRet.POSITION_EXCEEDED
+            value = price * contract.multiple
+            if (long_pos + short_pos) * value > limit[MAX_GROSS]:
+                return RiskRet.GROSS_EXPOSURE_EXCEEDED
+            if abs(long_pos - short_pos) * value > limit[MAX_NET]:
+                return RiskRet.NET_EXPOSURE_EXCEEDED
+        if size * self._reserve_per_lot(symbol, price, direction, open_close) > self.available_cash(contract.account):
+            return RiskRet.CASH_EXCEEDED
+        return RiskRet.OK
+
+    def on_order(self, order_id, symbol, price, size, direction, open_close):
+        """reserve cash/margin for an order just sent
+
+        Parameters
+        ----------
+        order_id : int
+        symbol : str
+        price : float
+        size : int
+        direction : int
+        open_close : int
+
+        Returns
+        -------
+        None
+
+        """
+        reserve_per_lot = self._reserve_per_lot(symbol, price, direction, open_close)
+        self.orders[order_id] = [symbol, direction, open_close, size, reserve_per_lot]
+        self.reserved[self.posmgr.contract_info[symbol].account] += size * reserve_per_lot
+        if open_close == OPEN:
+            self.pending[symbol][0 if direction == BUY else 1] += size
+        self.active_orders[symbol] += 1
+        self.order_count += 1
+
+    def _release(self, order, volume):
+        """release reservation of `volume` lots of order in flight"""
+        symbol, direction, open_close, leaves_qty, reserve_per_lot = order
+        volume = min(volume, leaves_qty)
+        order[3] -= volume
+        self.reserved[self.posmgr.contract_info[symbol].account] -= volume * reserve_per_lot
+        if open_close == OPEN:
+            self.pending[symbol][0 if direction == BUY else 1] -= volume
+
+    def _fill(self, symbol, price, volume, direction, open_close):
+        """update cash and margin held on fill"""
+        contract = self.posmgr.contract_info[symbol]
+        schedule = self.posmgr.fee_schedule[symbol]
+        multiple = contract.multiple
+        cash = -schedule.fee(volume, price, open_close == CLOSE_YES) * multiple
+        if direction == SELL:
+            cash -= volume * price * schedule.stamp_tax * multiple
+        held = self.held[symbol]
+        margin_rate = self.posmgr.margin_rate[symbol]
+        if open_close == OPEN:
+            side = LONG if direction == BUY else SHORT
+            held[side] += volume
+            held[side + 1] += volume * price
+            margin = volume * price * multiple * margin_rate
+            cash -= margin
+            self.margin[contract.account] += margin
+        else:
+            # close the opposite side at its average cost
+            side = SHORT if direction == BUY else LONG
+            qty = min(volume, held[side])
+            if qty > 0:
+                cost = held[side + 1] * qty / held[side]
+                held[side] -= qty
+                held[side + 1] -= cost
+                margin = cost * multiple * margin_rate
+                pnl = (qty * price - cost) if side == LONG else (cost - qty * price)
+                cash += margin + pnl * multiple
+                self.margin[contract.account] -= margin
+        self.cash[contract.account] += cash
+
+    def on_response(self, response_type, response):
+        """update reservation, cash and margin on each response
+
+        Parameters
+        ----------
+        response_type : int
+        response : response
+
+        Returns
+        -------
+        None
+
+        """
+        order = self.orders.get(response.order_id)
+        if response.status in FILLED and response.exe_volume > 0:
+            self._fill(response.symbol, response.exe_price, response.exe_volume, response.direction,
+                       response.open_close)
+            if order is not None:
+                self._release(order, response.exe_volume)
+        if order is None:
+            return
+        # finish order with succeed/canceled/rejected/interrejected
+        if (response.status == SUCCEED and response.exe_volume > 0) or response.status in DEAD:
+            self._release(order, order[3])
+            self.active_orders[order[0]] -= 1
+            self.orders.pop(response.order_id)
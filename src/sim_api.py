@@ -0,0 +1,118 @@
+"""Stand-ins of my.sdp.api
+
+Enums, `Logger` and `Order` with the interface of the platform api, for offline replay where the
+platform package is not installed. `Order` routes orders to `context.sim_exchange`, i.e.
+`replay.SimExchange`. Only the standard library is imported, so stand-ins can be installed before
+strategy modules without loading numpy.
+"""
+import sys
+import types
+from enum import Enum, IntEnum
+
+
+class Direction(IntEnum):
+    BUY = 1
+    SELL = 2
+
+
+class OpenClose(IntEnum):
+    OPEN = 0
+    CLOSE = 1
+    CLOSE_TOD = 2
+    CLOSE_YES = 3
+
+
+class OrderStatus(IntEnum):
+    INIT = -1
+    SUCCEED = 0
+    ENTRUSTED = 1
+    PARTED = 2
+    CANCELED = 3
+    PARTED_CANCELED = 4
+    CANCEL_REJECTED = 5
+    REJECTED = 6
+    INTERREJECTED = 7
+
+
+class InvestorType(IntEnum):
+    SPECULATOR = 0
+    HEDGER = 1
+    ARBITRAGEUR = 2
+
+
+class OrderType(IntEnum):
+    LIMIT = 0
+    MARKET = 1
+
+
+class TIF(IntEnum):
+    DAY = 0
+    FAK = 1
+    FOK = 2
+
+
+class Exchange(Enum):
+    SHFE = 'SHFE'
+    DCE = 'DCE'
+    CZCE = 'CZCE'
+    CFFEX = 'CFFEX'
+    INE = 'INE'
+    SSE = 'SSE'
+    SZSE = 'SZSE'
+
+    @property
+    def short_name(self):
+        return self.value
+
+
+class Logger(object):
+    """logs are dropped"""
+
+    def __init__(self, context, config):
+        pass
+
+    def info(self, contents):
+        pass
+
+
+class Order(object):
+    """orders are routed to `context.sim_exchange`"""
+
+    def __init__(self, context, config):
+        self.sim_exchange = context.sim_exchange
+
+    def send_single_order(self, symbol, price, size, direction, open_close, *args, **kwargs):
+        return self.sim_exchange.send_order(symbol, price, size, direction, open_close)
+
+    def cancel_single_order(self, order_id):
+        return self.sim_exchange.cancel_order(order_id)
+
+
+def install_api(force=False):
+    """register stand-ins as `my.sdp.api` if the platform package is not installed
+
+    Parameters
+    ----------
+    force : bool
+        replace the installed api, orders of `SyncOrder` are only matched by `SimExchange` with stand-ins
+
+    Returns
+    -------
+    api : module
+
+    """
+    if not force:
+        try:
+            from my.sdp import api
+            return api
+        except ImportError:
+            pass
+    api = types.ModuleType('my.sdp.api')
+    for cls in (Direction, OpenClose, OrderStatus, InvestorType, OrderType, TIF, Exchange, Logger, Order):
+        setattr(api, cls.__name__, cls)
+    my = sys.modules.setdefault('my', types.ModuleType('my'))
+    sdp = sys.modules.setdefault('my.sdp', types.ModuleType('my.sdp'))
+    my.sdp = sdp
+    sdp.api = api
+    sys.modules['my.sdp.api'] = api
+    return api
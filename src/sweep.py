@@ -0,0 +1,214 @@
+"""Parallel parameter sweep over shared-memory ticks
+
+The tick array is copied once into `multiprocessing.shared_memory`, each worker process of the
+pool attaches to it without copying and replays parameter combinations of a strategy with
+`replay.Replayer`. PnL, trades and callback latency of each run are collected into one table.
+
+    python sweep.py --processes 8
+    python sweep.py --ticks day.npz --csv result.csv
+"""
+import argparse
+import csv
+import itertools
+import multiprocessing
+import sys
+
+import numpy as np
+
+import replay  # installs stand-ins of my.sdp.api if missing
+from replay import Replayer, make_config, synthetic_ticks, load_ticks
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+"""Constants
+"""
+RESULT_COLUMNS = ('run', 'pnl', 'orders', 'fills', 'cancels', 'ticks_per_sec', 'on_book_ns', 'on_book_p99_ns',
+                  'on_response_ns', 'on_response_p99_ns', 'seconds')
+# state of worker process
+_worker = {}
+
+
+def param_grid(**params):
+    """all combinations of parameter values
+
+    Parameters
+    ----------
+    params : dict
+        name: list of values
+
+    Returns
+    -------
+    grid : list
+        dict of parameters of each combination, i.e. param_grid(a=[1, 2], b=[3]) -> [{a: 1, b: 3}, {a: 2, b: 3}]
+
+    """
+    names = sorted(params)
+    return [dict(zip(names, values)) for values in itertools.product(*[params[name] for name in names])]
+
+
+def attach(name, shape, dtype):
+    """attach to shared memory block of ticks without copying
+
+    Returns
+    -------
+    shm : SharedMemory
+        must be kept alive while ticks are used
+    ticks : numpy.ndarray
+
+    """
+    try:
+        shm = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # before python 3.13, workers register the block again to the resource tracker shared with the
+        # creating process, which is a no-op
+        shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _init_worker(name, shape, dtype, symbols, strategy, config_kwargs, quote_type, latency):
+    _worker['shm'], _worker['ticks'] = attach(name, shape, dtype)
+    _worker.update(symbols=symbols, strategy=strategy, config_kwargs=config_kwargs, quote_type=quote_type,
+                   latency=latency)
+
+
+def _run(job):
+    """replay one parameter combination in worker"""
+    run, params = job
+    config = make_config(_worker['symbols'], **_worker['config_kwargs'])
+    replayer = Replayer(_worker['strategy'](**params), config, _worker['ticks'], _worker['symbols'],
+                        quote_type=_worker['quote_type'], latency=_worker['latency'])
+    stats = replayer.run()
+    posmgr = getattr(replayer.context, 'posmgr', None)
+    row = dict((column, stats[column]) for column in RESULT_COLUMNS if column in stats)
+    row['run'] = run
+    row['pnl'] = posmgr.get_strategy_pnl_cash() if posmgr is not None else float('nan')
+    row.update(params)
+    return row
+
+
+class Sweep(object):
+    """Run parameter combinations of a strategy over the same ticks in a process pool
+
+    Attributes
+    ----------
+    shm : SharedMemory
+        block holding the ticks, unlinked by `close`
+    ticks : numpy.ndarray
+        TICK_DTYPE view of shm
+    symbols : list
+        sid -> symbol
+    strategy : type
+        strategy class defined at module level, constructed with the parameters of each run
+    config_kwargs : dict
+        keyword arguments of `replay.make_config` besides symbols
+    processes : int
+        size of the pool, number of cpus by default
+    """
+
+    def __init__(self, ticks, symbols, strategy, config_kwargs=None, quote_type=0, latency=1, processes=None):
+        if shared_memory is None:
+            raise RuntimeError('multiprocessing.shared_memory requires python 3.8+')
+        self.shm = shared_memory.SharedMemory(create=True, size=max(ticks.nbytes, 1))
+        self.ticks = np.ndarray(ticks.shape, dtype=ticks.dtype, buffer=self.shm.buf)
+        self.ticks[:] = ticks
+        self.symbols = list(symbols)
+        self.strategy = strategy
+        self.config_kwargs = config_kwargs or {}
+        self.quote_type = quote_type
+        self.latency = latency
+        self.processes = processes or multiprocessing.cpu_count()
+
+    def run(self, grid):
+        """replay each parameter combination
+
+        Parameters
+        ----------
+        grid : list
+            dict of strategy parameters of each run, i.e. from `param_grid`
+
+        Returns
+        -------
+        rows : list
+            dict of each run in order of grid, RESULT_COLUMNS and the parameters
+
+        """
+        initargs = (self.shm.name, self.ticks.shape, self.ticks.dtype, self.symbols, self.strategy,
+                    self.config_kwargs, self.quote_type, self.latency)
+        jobs = list(enumerate(grid))
+        if self.processes == 1:
+            _init_worker(*initargs)
+            rows = [_run(job) for job in jobs]
+            _worker.clear()
+        else:
+            pool = multiprocessing.Pool(min(self.processes, len(jobs)), _init_worker, initargs)
+            try:
+                rows = list(pool.imap_unordered(_run, jobs, chunksize=1))
+            finally:
+                pool.close()
+                pool.join()
+        rows.sort(key=lambda row: row['run'])
+        return rows
+
+    def close(self):
+        """release shared memory"""
+        self.ticks = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+def format_table(rows, columns=None):
+    """format result rows as text table, columns are parameters and RESULT_COLUMNS by default"""
+    if not rows:
+        return ''
+    if columns is None:
+        columns = [key for key in sorted(rows[0]) if key not in RESULT_COLUMNS] + list(RESULT_COLUMNS)
+    cells = [[('{:.4g}' if isinstance(row.get(c), float) else '{}').format(row.get(c, '')) for c in columns]
+             for row in rows]
+    widths = [max([len(c)] + [len(line[i]) for line in cells]) for i, c in enumerate(columns)]
+    lines = ['  '.join(c.rjust(w) for c, w in zip(columns, widths))]
+    lines.extend('  '.join(cell.rjust(w) for cell, w in zip(line, widths)) for line in cells)
+    return '\n'.join(lines)
+
+
+def save_csv(path, rows):
+    """save result rows to csv"""
+    columns = [key for key in sorted(rows[0]) if key not in RESULT_COLUMNS] + list(RESULT_COLUMNS)
+    with open(path, 'w') as f:
+        writer = csv.DictWriter(f, columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(argv=None):
+    from bench import BarFollower
+    parser = argparse.ArgumentParser(description='parameter sweep of bench.BarFollower on shared-memory ticks')
+    parser.add_argument('--ticks', help='.npz saved by replay.save_ticks, synthetic ticks of 50 futures if omitted')
+    parser.add_argument('--processes', type=int, default=None, help='size of process pool, cpu count by default')
+    parser.add_argument('--bar-intervals', default='1,3,5,10', help='comma separated bar intervals')
+    parser.add_argument('--thresholds', default='0,0.2,0.4,0.8', help='comma separated thresholds')
+    parser.add_argument('--csv', help='save result table to csv')
+    args = parser.parse_args(argv)
+
+    if args.ticks:
+        ticks, symbols = load_ticks(args.ticks)
+    else:
+        symbols = ['f{:04d}'.format(i) for i in range(50)]
+        ticks = synthetic_ticks(len(symbols), 2000)
+    grid = param_grid(bar_interval=[int(v) for v in args.bar_intervals.split(',')],
+                      threshold=[float(v) for v in args.thresholds.split(',')])
+    sweep = Sweep(ticks, symbols, BarFollower, {'exch': 'SHFE', 'multiple': 10}, processes=args.processes)
+    try:
+        rows = sweep.run(grid)
+    finally:
+        sweep.close()
+    print (format_table(rows))
+    if args.csv:
+        save_csv(args.csv, rows)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""Cross-symbol synchronized bars
+
+`SyncBarGenerator` builds bars of a group of symbols, i.e. legs of a calendar spread or a basket,
+on intervals aligned to the clock, and calls back one cross-sectional bar per interval with quote
+type 4 instead of one bar per symbol. OHLCV of all legs come as one numpy matrix, legs without
+ticks in the interval are forward filled from their last close.
+
+Ticks only update the current bar of their leg, the matrix is built when the interval closes, so
+the work per interval is O(legs) whatever the number of ticks or bars emitted before.
+"""
+import numpy as np
+
+from bar import BarGenerator
+
+"""Constants
+"""
+SYNC_BAR = 4
+# fields of matrix
+OPEN = 0
+HIGH = 1
+LOW = 2
+CLOSE = 3
+VOLUME = 4
+TURNOVER = 5
+OPEN_INTEREST = 6
+N_FIELDS = 7
+FIELD_NAMES = ('open', 'high', 'low', 'close', 'volume', 'turnover', 'open_interest')
+# minutes of half a day, a larger step back in time is a new trading day after midnight
+HALF_DAY = 720
+
+
+class SyncBar(object):
+    """cross-sectional bar of a group of symbols
+
+    Attributes
+    ----------
+    symbol : str
+        name of group, so that bars can be routed by `QuoteDispatcher`
+    symbols : list
+        legs, in order of rows of matrix
+    int_time : int
+        start of interval, i.e. 93000000
+    bar_index : int
+        counts up from 0
+    matrix : numpy.ndarray
+        shape (legs, N_FIELDS), OPEN, HIGH, LOW, CLOSE, VOLUME, TURNOVER, OPEN_INTEREST of each leg.
+        Legs without ticks in the interval repeat their last close with 0 volume, nan before their first tick.
+    updated : numpy.ndarray
+        shape (legs, ), bool, True for legs with ticks in the interval
+    """
+    __slots__ = ('symbol', 'symbols', 'int_time', 'bar_index', 'matrix', 'updated')
+
+    def __init__(self, symbol, symbols, int_time, bar_index, matrix, updated):
+        self.symbol = symbol
+        self.symbols = symbols
+        self.int_time = int_time
+        self.bar_index = bar_index
+        self.matrix = matrix
+        self.updated = updated
+
+    def get_leg(self, symbol):
+        """
+        Returns
+        -------
+        bar : dict
+            field name: value of leg
+
+        """
+        return dict(zip(FIELD_NAMES, self.matrix[self.symbols.index(symbol)].tolist()))
+
+
+class SyncBarGenerator(object):
+    """Synchronized bars of a group of symbols
+
+    Attributes
+    ----------
+    bar_interval : int
+        minutes
+    symbols : list
+        legs
+    name : str
+        symbol of `SyncBar`, legs joined by '|' by default
+    leg_index : dict
+        symbol: row
+    bars : list
+        current bar of each leg, [open, high, low, close, total_vol, total_notional, open_interest] or None
+        if the leg has no tick in the current interval
+    started : list
+        True for legs with ticks since construction
+    fill : numpy.ndarray
+        shape (legs, N_FIELDS), row of each leg for intervals without ticks
+    base : numpy.ndarray
+        shape (legs, 2), total volume and notional at the end of the previous bar of each leg
+    bar_minute : int or None
+        start of current interval in minutes of day
+    bar_index : int
+        index of next bar
+    """
+
+    def __init__(self, bar_interval, symbols, name=None):
+        self.bar_interval = bar_interval
+        self.symbols = list(symbols)
+        self.name = name or '|'.join(self.symbols)
+        self.leg_index = dict((symbol, row) for row, symbol in enumerate(self.symbols))
+        n_legs = len(self.symbols)
+        self.bars = [None] * n_legs
+        self.started = [False] * n_legs
+        self.fill = np.full((n_legs, N_FIELDS), np.nan)
+        self.base = np.zeros((n_legs, 2))
+        self.bar_minute = None
+        self.bar_index = 0
+
+    def process_bar_data(self, context, quote_type, quote, on_book):
+        """update bars from tick data, should be called at on_book interface
+
+        Parameters
+        ----------
+        context : object
+        quote_type : {0, 1}
+            0 for futures, 1 for stock, other quote types are ignored
+        quote : object
+        on_book : object
+            call back function, called with quote type 4 and `SyncBar` when an interval closes
+
+        Returns
+        -------
+        None
+
+        """
+        if quote_type == 0:
+            if quote.feed_type == BarGenerator.MI_DCE_ORDER_STATISTIC:
+                return
+            self.update_bar(context, quote.symbol, quote.int_time, quote, on_book)
+        elif quote_type == 1:
+            self.update_bar(context, quote.ticker, quote.exch_time, quote, on_book)
+
+    def update_bar(self, context, symbol, int_time, quote, on_book):
+        """update bar of a leg with a tick whose symbol and time are already resolved, i.e. by `QuoteDispatcher`
+
+        A tick of any leg in a later interval closes the current interval first. Ticks late by less than
+        an interval are counted in the current bar.
+
+        Parameters
+        ----------
+        context : object
+        symbol : str
+            ticks of symbols outside the group are ignored
+        int_time : int
+        quote : object
+        on_book : object
+
+        Returns
+        -------
+        None
+
+        """
+        row = self.leg_index.get(symbol)
+        if row is None:
+            return
+        minute = BarGenerator.int_time_to_min(int_time)
+        if self.bar_minute is None:
+            self.bar_minute = minute - minute % self.bar_interval
+        else:
+            elapsed = minute - self.bar_minute
+            if elapsed < -HALF_DAY:
+                elapsed += 2 * HALF_DAY
+            if elapsed >= self.bar_interval:
+                self.flush(context, on_book)
+                self.bar_minute = minute - minute % self.bar_interval
+
+        px = quote.last_px
+        bar = self.bars[row]
+        if bar is None:
+            if not self.started[row]:
+                self.started[row] = True
+                self.base[row] = (quote.total_vol, quote.total_notional)
+            self.bars[row] = [px, px, px, px, quote.total_vol, quote.total_notional, quote.open_interest]
+        else:
+            if px > bar[HIGH]:
+                bar[HIGH] = px
+            if px < bar[LOW]:
+                bar[LOW] = px
+            bar[CLOSE] = px
+            bar[VOLUME] = quote.total_vol
+            bar[TURNOVER] = quote.total_notional
+            bar[OPEN_INTEREST] = quote.open_interest
+
+    def flush(self, context, on_book):
+        """close the current interval and call back its `SyncBar`, i.e. at the end of a session when no tick
+        of a later interval will come
+
+        Returns
+        -------
+        sync_bar : SyncBar or None
+            None if no leg has ticks in the current interval
+
+        """
+        rows = [row for row, bar in enumerate(self.bars) if bar is not None]
+        if not rows:
+            return None
+        values = np.array([self.bars[row] for row in rows], dtype=np.float64)
+        cumulative = values[:, VOLUME:TURNOVER + 1].copy()
+        values[:, VOLUME:TURNOVER + 1] -= self.base[rows]
+        matrix = self.fill.copy()
+        matrix[rows] = values
+        updated = np.zeros(len(self.symbols), dtype=bool)
+        updated[rows] = True
+
+        self.base[rows] = cumulative
+        self.fill[rows, OPEN:CLOSE + 1] = values[:, CLOSE:CLOSE + 1]
+        self.fill[rows, VOLUME:TURNOVER + 1] = 0.0
+        self.fill[rows, OPEN_INTEREST] = values[:, OPEN_INTEREST]
+        for row in rows:
+            self.bars[row] = None
+
+        int_time = self.bar_minute // 60 * 10000000 + self.bar_minute % 60 * 100000
+        sync_bar = SyncBar(self.name, self.symbols, int_time, self.bar_index, matrix, updated)
+        self.bar_index += 1
+        on_book(context, SYNC_BAR, sync_bar)
+        return sync_bar
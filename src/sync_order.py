@@ -24,10 +24,19 @@ The following functions are provided:
     Should replace `Order.send_single_order`/`Order.cancel_single_order`.
     If there is pending cancel, orders will be buffered. Once cancel is finished, the buffered orders will
     be sent.
+6. SyncOrder.risk
+    Optional pre-trade risk engine, i.e. `risk.RiskEngine`. If set, each order is checked before sending
+    and the error code is returned if rejected.
+7. SyncOrder.rejected_orders
+    buffered orders not sent once cancel is finished, i.e. rejected by risk engine, with the returned
+    error code in "ret". Should be cleared by strategy after handling.
 """
-from my.sdp.api import Order, Logger, OrderStatus, Direction, OpenClose
+from my.sdp.api import Order, Logger
 from enum import IntEnum
 
+from consts import (SUCCEED, PARTED, CANCEL_REJECTED, INIT, DEAD, DIRECTION_NAMES, OPEN_CLOSE_NAMES,
+                    STATUS_NAMES)
+
 class SyncOrderRet(IntEnum):
     ORDER_NOT_FOUND = -1001
 
@@ -41,6 +50,10 @@ class SyncOrder(Order, Logger):
             self.info = self.nil
         self._active_orders = {}
         self._delayed_orders = {}
+        # symbol: number of active orders pending cancel
+        self._pending_cancels = {}
+        self.risk = None
+        self.rejected_orders = []
 
     @staticmethod
     def nil(*args, **kwargs):
@@ -64,7 +77,7 @@ class SyncOrder(Order, Logger):
             "open_close": open_close, "kwargs": kwargs,
         })
         self.info("Delay order: {} {} {} {} @ {}".format(
-            symbol, Direction(direction).name, OpenClose(open_close).name, size, price
+            symbol, DIRECTION_NAMES[direction], OPEN_CLOSE_NAMES[open_close], size, price
         ))
 
     @property
@@ -81,15 +94,24 @@ class SyncOrder(Order, Logger):
             "time_in_force": kwargs.get("time_in_force"),
             # additional fields
             "pending_cancel": False, "cum_amount": 0.0, "cum_qty": 0, "last_px": 0.0,
-            "last_qty": 0, "status": OrderStatus.INIT.value
+            "last_qty": 0, "status": INIT
         }
 
     def cancelling(self, symbol):
         """check if is cancelling orders of given symbol"""
-        if any([order['pending_cancel'] for order in self._active_orders.values() if order['symbol'] == symbol]):
-            return True
-        else:
-            return False
+        return self._pending_cancels.get(symbol, 0) > 0
+
+    def _count_pending_cancels(self):
+        """recount pending cancels of each symbol, i.e. after active orders are restored"""
+        self._pending_cancels = {}
+        for order in self._active_orders.values():
+            if order['pending_cancel']:
+                self._pending_cancels[order['symbol']] = self._pending_cancels.get(order['symbol'], 0) + 1
+
+    def _clear_pending_cancel(self, order):
+        if order["pending_cancel"]:
+            order["pending_cancel"] = False
+            self._pending_cancels[order["symbol"]] -= 1
 
     def clear_delayed_orders(self, symbol=None):
         """Clear delayed orders
@@ -115,39 +137,47 @@ class SyncOrder(Order, Logger):
         1. logging responses.
         2. update order status
         """
+        if self.risk is not None:
+            self.risk.on_response(response_type, response)
         self.info("Order Resp: {} {} {} {} {} @ {} {} {} {}".format(
-            response.order_id, response.symbol, Direction(response.direction).name,
-            OpenClose(response.open_close).name, response.exe_volume, response.exe_price,
-            OrderStatus(response.status).name, response.error_no, response.error_info
+            response.order_id, response.symbol, DIRECTION_NAMES[response.direction],
+            OPEN_CLOSE_NAMES[response.open_close], response.exe_volume, response.exe_price,
+            STATUS_NAMES[response.status], response.error_no, response.error_info
         ))
         # finish order with succeed/canceled/rejected/interrejected
-        if (response.status == OrderStatus.SUCCEED.value and response.exe_volume > 0) or response.status in (
-                OrderStatus.CANCELED.value, OrderStatus.REJECTED.value, OrderStatus.INTERREJECTED.value):
+        if (response.status == SUCCEED and response.exe_volume > 0) or response.status in DEAD:
             if response.order_id in self._active_orders:
-                self._active_orders.pop(response.order_id)
+                self._clear_pending_cancel(self._active_orders.pop(response.order_id))
         # update order according to response
         else:
             if response.order_id in self._active_orders:
                 order = self._active_orders[response.order_id]
-                if response.status == OrderStatus.PARTED.value and response.exe_volume > 0:
+                if response.status == PARTED and response.exe_volume > 0:
                     # volume filled needs update
                     order["cum_amount"] += response.exe_volume * response.exe_price
                     order["cum_qty"] += response.exe_volume
                     order["last_px"] = response.exe_price
                     order["last_qty"] = response.exe_volume
-                elif response.status == OrderStatus.CANCEL_REJECTED.value:
+                elif response.status == CANCEL_REJECTED:
                     # remove pending cancel
-                    if order["pending_cancel"]:
-                        order["pending_cancel"] = False
+                    self._clear_pending_cancel(order)
                 order["status"] = response.status
                 self._active_orders[response.order_id] = order
         if not self.cancelling(response.symbol):
             if response.symbol in self._delayed_orders:
                 for o in self._delayed_orders[response.symbol]:
-                    self.send_single_order(
+                    ret = self.send_single_order(
                         o["symbol"], o["price"], o["size"], o["direction"], o["open_close"],
                         kwargs=o["kwargs"]
                     )
+                    if ret <= 0:
+                        # the caller of the buffered order is gone, keep it visible to strategy
+                        o["ret"] = ret
+                        self.rejected_orders.append(o)
+                        self.log_debug("Delayed order rejected: {} {} {} {} @ {}, ret: {}".format(
+                            o["symbol"], DIRECTION_NAMES[o["direction"]], OPEN_CLOSE_NAMES[o["open_close"]],
+                            o["size"], o["price"], getattr(ret, 'name', ret))
+                        )
                 self.clear_delayed_orders(response.symbol)
 
     def send_single_order(self, symbol, price, size, direction, open_close, *args, **kwargs):
@@ -157,18 +187,29 @@ class SyncOrder(Order, Logger):
         elif self.cancelling(symbol):
             self._delay_order(symbol, price, size, direction, open_close, args, kwargs)
             return 0
+        if self.risk is not None:
+            ret = self.risk.check(symbol, price, size, direction, open_close)
+            if ret != 0:
+                self.info("Risk rejected: {} {} {} {} @ {}, ret: {}".format(
+                    symbol, DIRECTION_NAMES[direction], OPEN_CLOSE_NAMES[open_close], size, price, ret.name)
+                )
+                return ret
         order_id = Order.send_single_order(self, symbol, price, size, direction, open_close, kwargs=kwargs)
         self.info("Send order: {} {} {} {} {} @ {}".format(
-            order_id, symbol, Direction(direction).name, OpenClose(open_close).name, size, price)
+            order_id, symbol, DIRECTION_NAMES[direction], OPEN_CLOSE_NAMES[open_close], size, price)
         )
         if order_id > 0:
             self._record_order(order_id, symbol, price, size, direction, open_close, kwargs=kwargs)
+            if self.risk is not None:
+                self.risk.on_order(order_id, symbol, price, size, direction, open_close)
         return order_id
 
     def _record_cancel(self, order_id):
         """ record cancelling single order """
-        if not self._active_orders[order_id]["pending_cancel"]:
-            self._active_orders[order_id]["pending_cancel"] = True
+        order = self._active_orders[order_id]
+        if not order["pending_cancel"]:
+            order["pending_cancel"] = True
+            self._pending_cancels[order["symbol"]] = self._pending_cancels.get(order["symbol"], 0) + 1
 
     def cancel_single_order(self, order_id):
         """ cancel single order and recording cancel """